@@ -0,0 +1,58 @@
+"""
+SCORM Cloud web service client library.
+
+    from scormcloud import Configuration, ScormCloudService
+
+The names below are imported from their modules the first time they are
+used, so importing the package itself costs next to nothing.
+"""
+
+import importlib
+import sys
+
+_exports = {
+    'Configuration': 'client',
+    'ScormCloudService': 'client',
+    'ScormCloudUtilities': 'client',
+    'ServiceRequest': 'client',
+    'ScormCloudError': 'errors',
+    'ScormCloudServiceError': 'errors',
+    'ScormCloudTransportError': 'errors',
+    'ScormCloudConnectionError': 'errors',
+    'ScormCloudTimeoutError': 'errors',
+    'ScormCloudHTTPError': 'errors',
+    'ScormCloudCircuitOpenError': 'errors',
+    'ScormCloudCassetteError': 'errors',
+    'HttpTransport': 'transport',
+    'RetryPolicy': 'retry',
+    'CircuitBreaker': 'retry',
+    'ResponseCache': 'cache',
+    'Batch': 'batch',
+    'Coalescer': 'coalesce',
+    'RateLimiter': 'ratelimit',
+    'FileBackend': 'ratelimit',
+    'CassettePlayer': 'cassette',
+    'CassetteRecorder': 'cassette',
+}
+
+__all__ = sorted(_exports)
+
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError('module %r has no attribute %r' % (__name__,
+                                                                name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+
+# Module __getattr__ needs Python 3.7; import everything up front before that.
+if sys.version_info < (3, 7):
+    for _name in __all__:
+        __getattr__(_name)
@@ -0,0 +1,1223 @@
+"""
+asyncio versions of ScormCloudService and its service classes.
+
+Every method that talks to the SCORM Cloud is a coroutine; methods that only
+build signed URLs stay synchronous. Requests are signed with the same
+ServiceRequest code and responses are parsed with the same parsers and result
+classes as the blocking client, so results are identical. Failed calls are
+retried under the same RetryPolicy and CircuitBreaker rules, and raise the
+same ScormCloudTransportError subclasses.
+
+Requires Python 3.7+ and the aiohttp package.
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import time
+import uuid
+from timeit import default_timer
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .client import (AsyncImportResult, Configuration, CourseData,
+                     CourseService, DispatchService, ImportResult,
+                     InvitationService, RegistrationData,
+                     RegistrationService, ReportingService, ScormCloudService,
+                     ServiceRequest, UploadService, UploadToken,
+                     _stream_tags, _TimedElementStream)
+from .batch import BatchResult, BatchStats
+from .coalesce import Coalescer
+from .download import _replace
+from .errors import (ScormCloudConnectionError, ScormCloudHTTPError,
+                     ScormCloudTimeoutError, ScormCloudTransportError)
+from .invitations import InvitationSummary
+from .ratelimit import THROTTLE_STATUSES
+from .results import LaunchInfo, RegistrationDetail, RegistrationResult
+from .transport import filename_from_content_disposition
+
+_deadline = contextvars.ContextVar('scormcloud_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """
+    Context manager that bounds every SCORM Cloud call awaited inside it,
+    including calls made by service methods that need several round-trips,
+    to finish within the given number of seconds. Calls that run out of time
+    raise asyncio.TimeoutError. Nested deadlines can only shorten the
+    enclosing one.
+
+    Arguments:
+    seconds -- the time budget for all calls made inside the block
+    """
+    loop = asyncio.get_event_loop()
+    expires = loop.time() + seconds
+    current = _deadline.get()
+    if current is not None:
+        expires = min(expires, current)
+    token = _deadline.set(expires)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining():
+    expires = _deadline.get()
+    if expires is None:
+        return None
+    remaining = expires - asyncio.get_event_loop().time()
+    if remaining <= 0:
+        raise asyncio.TimeoutError('SCORM Cloud call deadline exceeded')
+    return remaining
+
+
+def transport_error(e):
+    """
+    Converts an exception raised by aiohttp into the matching
+    ScormCloudTransportError subclass, as retry.transport_error does for
+    the requests library.
+
+    Arguments:
+    e -- the aiohttp exception
+    """
+    if isinstance(e, aiohttp.ServerTimeoutError):
+        # aiohttp only tells connect timeouts apart from 3.10 on.
+        connect = isinstance(e, getattr(aiohttp, 'ConnectionTimeoutError',
+                                        ()))
+        return ScormCloudTimeoutError('Timed out %s the SCORM Cloud: %s' % (
+            'connecting to' if connect else 'waiting for', e), e,
+            connect=connect)
+    if isinstance(e, aiohttp.ClientResponseError):
+        return ScormCloudHTTPError('SCORM Cloud HTTP error: %s' % e,
+                                   e.status, e)
+    if isinstance(e, aiohttp.ClientConnectionError):
+        return ScormCloudConnectionError('Could not reach the SCORM Cloud: '
+                                         '%s' % e, e)
+    return ScormCloudTransportError('SCORM Cloud request failed: %s' % e, e)
+
+
+class AsyncHttpTransport(object):
+    """
+    Non-blocking pooled keep-alive HTTP transport built on aiohttp. The
+    underlying ClientSession is created on first use, inside the running
+    event loop; close it with close() when done.
+    """
+
+    def __init__(self, limit=100, limit_per_host=10, connect_timeout=30,
+                 read_timeout=300, verify=True):
+        """
+        Arguments:
+        limit -- the maximum number of open connections in total
+        limit_per_host -- the maximum number of open connections per host
+        connect_timeout -- seconds to wait for a connection to be established
+        read_timeout -- seconds to wait between bytes received from the server
+        verify -- whether to verify TLS certificates
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncHttpTransport requires the aiohttp package')
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.verify = verify
+        self._session = None
+
+    def __repr__(self):
+        return ('AsyncHttpTransport(limit=%s, limit_per_host=%s)' %
+                (self.limit, self.limit_per_host))
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host,
+                ssl=None if self.verify else False)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout,
+                                            sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=timeout,
+                cookie_jar=aiohttp.DummyCookieJar())
+        return self._session
+
+    @contextlib.asynccontextmanager
+    async def open(self, method, url, data=None, headers=None, verify=None):
+        """
+        Sends a request and yields the aiohttp response, releasing the
+        connection back to the pool when the block exits. Raises
+        aiohttp.ClientResponseError for error statuses; AsyncServiceRequest
+        turns aiohttp errors into ScormCloudTransportError subclasses.
+
+        Arguments:
+        method -- the HTTP method, for example GET or POST
+        url -- the full URL to request
+        data -- (optional) the request body
+        headers -- (optional) extra request headers
+        verify -- (optional) overrides TLS certificate verification for this
+            call
+        """
+        ssl = None
+        if verify is False:
+            ssl = False
+        logging.debug('%s %s', method, url)
+        async with self.session.request(method, url, data=data,
+                                        headers=headers, ssl=ssl) as response:
+            response.raise_for_status()
+            yield response
+
+    async def request(self, method, url, data=None, headers=None,
+                      verify=None):
+        """
+        Sends a request and returns the complete response body as bytes.
+        """
+        async with self.open(method, url, data=data, headers=headers,
+                             verify=verify) as response:
+            return await response.read()
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, data=None, **kwargs):
+        return await self.request('POST', url, data=data, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncCoalescer(Coalescer):
+    """
+    Coalescer for AsyncScormCloudService, for calls made on one event loop.
+    The shared request runs as a task of its own, so a caller that is
+    cancelled or times out does not cancel it for the others.
+    """
+
+    async def do(self, key, fn, event=None, deadline=None):
+        """
+        Returns the result of the coroutine function fn, or of the call in
+        flight under the same key if there is one. See Coalescer.do. A call
+        sharing another one is also held to the enclosing deadline block.
+        """
+        while True:
+            task = self._flights.get(key)
+            leader = task is None or task.done()
+            if leader:
+                task = self._flights[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(
+                    lambda done: self._landed(key, done))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+            if event is not None:
+                event.coalesced = not leader
+            timeout = None
+            if not leader:
+                timeout = _remaining()
+                if deadline is not None and (timeout is None or
+                                             deadline.remaining() < timeout):
+                    timeout = max(0.0, deadline.remaining())
+            try:
+                if timeout is None:
+                    return await asyncio.shield(task)
+                return await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.CancelledError:
+                # The shared call itself was cancelled, not this caller:
+                # make the call again.
+                if task.cancelled() and not leader:
+                    continue
+                raise
+            except asyncio.TimeoutError as e:
+                if not task.done() and deadline is not None and \
+                        deadline.expired:
+                    raise ScormCloudTimeoutError(
+                        'SCORM Cloud call deadline of %ss exceeded waiting '
+                        'for an identical call' % deadline.seconds, e) from e
+                raise
+
+    def _landed(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Retrieve the error so that it is not reported as unhandled
+            # when every caller has given up on the task.
+            task.exception()
+
+
+class AsyncBatch(object):
+    """
+    asyncio counterpart of Batch: runs many coroutine calls as tasks with a
+    cap on concurrency. Typically created with AsyncScormCloudService.batch:
+
+        batch = service.batch(max_workers=16)
+        async for result in batch.map(regsvc.exists, regids):
+            if result.ok:
+                ...
+        print(batch.stats)
+
+    The service's transport should allow at least max_workers connections
+    per host.
+    """
+
+    def __init__(self, max_workers=8, max_pending=None):
+        """
+        Arguments:
+        max_workers -- the maximum number of calls running at once
+        max_pending -- (optional) the maximum number of calls started but
+            not yet returned to the caller. Defaults to twice max_workers
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending or 2 * max_workers
+        self.stats = BatchStats()
+
+    async def map(self, fn, *iterables, **kwargs):
+        """
+        Async generator counterpart of Batch.map. fn must return an
+        awaitable, as the methods of the Async* services do. Results arrive
+        in completion order; an exception raised by one call is captured in
+        its result and does not stop the batch.
+
+        Arguments:
+        fn -- the coroutine function to run, for example a bound service
+            method
+        iterables -- one iterable per positional argument of fn
+        kwargs -- keyword arguments passed unchanged to every call
+        """
+        self.stats = stats = BatchStats()
+        arguments = enumerate(zip(*iterables))
+        semaphore = asyncio.Semaphore(self.max_workers)
+        pending = set()
+        try:
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.max_pending:
+                    try:
+                        index, args = next(arguments)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(_batch_call(
+                        semaphore, fn, index, args, kwargs)))
+                    stats.submitted += 1
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    stats._record(result)
+                    yield result
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            stats.finished = time.time()
+
+    async def run(self, fn, *iterables, **kwargs):
+        """
+        Like map, but waits for every call and returns the results as a list
+        in input order.
+        """
+        results = [result async for result in
+                   self.map(fn, *iterables, **kwargs)]
+        results.sort(key=lambda result: result.index)
+        return results
+
+
+async def _batch_call(semaphore, fn, index, args, kwargs):
+    async with semaphore:
+        started = time.time()
+        try:
+            value = await fn(*args, **kwargs)
+        except Exception as e:
+            return BatchResult(index, args, error=e,
+                               elapsed=time.time() - started)
+        return BatchResult(index, args, value=value,
+                           elapsed=time.time() - started)
+
+
+class AsyncServiceRequest(ServiceRequest):
+    """
+    ServiceRequest whose network calls are coroutines. URL construction,
+    signing and response parsing are inherited unchanged.
+    """
+
+    async def call_service(self, method, serviceurl=None, build=None):
+        """
+        Calls the specified web service method using any parameters set on the
+        ServiceRequest.
+
+        Arguments:
+        method -- the full name of the web service method to call.
+            For example: rustici.registration.createRegistration
+        serviceurl -- (optional) used to override the service host URL for a
+            single call
+        build -- (optional) a function that builds the result from the
+            parsed response; see ServiceRequest.call_service
+        """
+        instrumentation = self.service.instrumentation
+        if instrumentation is None:
+            response = await self._call(method, serviceurl)
+            return response if build is None else build(response)
+        self.event = event = instrumentation.start(method)
+        try:
+            response = await self._call(method, serviceurl)
+            if build is not None:
+                started = default_timer()
+                response = build(response)
+                event.model = default_timer() - started
+        except Exception as e:
+            instrumentation.finish(event, e)
+            raise
+        finally:
+            self.event = None
+        instrumentation.finish(event)
+        return response
+
+    async def _call(self, method, serviceurl=None):
+        key = self._cache_key(method, serviceurl)
+        if key is not None:
+            response = self.service.cache.get(key)
+            if self.event is not None:
+                self.event.cache = 'miss' if response is None else 'hit'
+            if response is not None:
+                return response
+        coalescer = self.service.coalescer
+        if coalescer is not None and coalescer.coalescable(method):
+            if self.deadline is None:
+                self.deadline = self.service.retry_policy.start()
+            return await coalescer.do(
+                self._coalesce_key(method, serviceurl),
+                lambda: self._fetch(method, serviceurl, key), self.event,
+                self.deadline)
+        return await self._fetch(method, serviceurl, key)
+
+    async def _fetch(self, method, serviceurl, key):
+        url = self.construct_url(method, serviceurl)
+        rawresponse = await self.send_post(url, None)
+        if self.event is not None:
+            self.event.response_bytes = len(rawresponse)
+        response = self.get_xml(rawresponse)
+        if key is not None:
+            self.service.cache.put(key, response)
+        return response
+
+    async def iter_elements(self, method, tag, serviceurl=None,
+                            chunk_size=65536):
+        """
+        Async generator counterpart of ServiceRequest.iter_elements.
+        """
+        instrumentation = self.service.instrumentation
+        event = None
+        if instrumentation is not None:
+            self.event = event = instrumentation.start(method, 'stream')
+        error = None
+        try:
+            url = self.construct_url(method, serviceurl)
+            async with self._open('GET', url) as response:
+                stream = self.service.parser.stream(_stream_tags(tag))
+                if event is not None:
+                    stream = _TimedElementStream(stream, event)
+                started = default_timer()
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    if event is not None:
+                        event.transfer += default_timer() - started
+                        event.response_bytes += len(chunk)
+                    for element in stream.feed(chunk):
+                        self._check_element(element)
+                        yield element
+                    started = default_timer()
+                if event is not None:
+                    event.transfer += default_timer() - started
+                for element in stream.close():
+                    self._check_element(element)
+                    yield element
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if event is not None:
+                self.event = None
+                instrumentation.finish(event, None if isinstance(
+                    error, GeneratorExit) else error)
+
+    async def send_post(self, url, postparams, headers=None):
+        method = 'GET' if postparams is None else 'POST'
+        return await self._retrying(
+            lambda: self._send(method, url, postparams, headers))
+
+    async def _send(self, method, url, postparams, headers):
+        if self.event is not None:
+            return await self._timed_request(method, url, postparams, headers)
+        return await self.service.transport.request(
+            method, url, data=postparams, headers=headers)
+
+    async def _retrying(self, attempt):
+        """
+        Awaits attempt(), retrying failures as allowed by the service's
+        retry policy, circuit breaker and rate limiter as ServiceRequest.send
+        does, and returns its result. Raises a ScormCloudTransportError
+        subclass if the call fails for good.
+
+        Arguments:
+        attempt -- a function returning a new coroutine for each attempt
+        """
+        service = self.service
+        policy = service.retry_policy
+        breaker = service.circuit_breaker
+        limiter = service.rate_limiter
+        appid = service.config.appid
+        if self.deadline is None:
+            self.deadline = policy.start()
+        self.attempts = 0
+        while True:
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                if limiter is not None:
+                    wait = limiter.reserve(appid, self.method,
+                                           self._time_left())
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                if self.deadline is not None and self.deadline.expired:
+                    raise ScormCloudTimeoutError('SCORM Cloud call deadline '
+                                                 'of %ss exceeded' %
+                                                 self.deadline.seconds)
+                self.attempts += 1
+                started = default_timer()
+                result = await self._bounded(attempt(), None if
+                                             self.deadline is None else
+                                             self.deadline.remaining())
+            except aiohttp.ClientError as e:
+                error = transport_error(e)
+                if self.event is not None:
+                    self._record_failure(started)
+                if breaker is not None:
+                    # An HTTP error response still shows that the service
+                    # is reachable.
+                    if error.retryable:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if limiter is not None and \
+                        getattr(error, 'status', None) in THROTTLE_STATUSES:
+                    limiter.record(appid, self.method, throttled=True)
+                if not policy.should_retry(self.method, error, self.attempts):
+                    raise error from e
+                delay = policy.backoff(self.attempts)
+                left = self._time_left()
+                if left is not None and delay >= left:
+                    raise error from e
+                logging.warning('%s failed (attempt %d), retrying in %.2fs: '
+                                '%s', self.method, self.attempts, delay, error)
+                await asyncio.sleep(delay)
+                continue
+            except asyncio.TimeoutError as e:
+                if breaker is not None:
+                    breaker.release()
+                if self.deadline is not None and self.deadline.expired:
+                    raise ScormCloudTimeoutError(
+                        'SCORM Cloud call deadline of %ss exceeded' %
+                        self.deadline.seconds, e) from e
+                raise
+            except BaseException:
+                # Cancelled, or interrupted before reaching the network.
+                if breaker is not None:
+                    breaker.release()
+                raise
+            if self.event is not None:
+                self.event.retries = self.attempts - 1
+            if breaker is not None:
+                breaker.record_success()
+            if limiter is not None:
+                # Without the header timing of instrumentation, the whole
+                # attempt stands in for the header latency.
+                limiter.record(appid, self.method, default_timer() - started)
+            return result
+
+    def _time_left(self):
+        """
+        Returns the seconds left before the call's retry policy deadline or
+        enclosing deadline block, whichever comes first, or None.
+        """
+        left = _remaining()
+        if self.deadline is not None:
+            remaining = self.deadline.remaining()
+            if left is None or remaining < left:
+                left = remaining
+        return left
+
+    @contextlib.asynccontextmanager
+    async def _open(self, method, url):
+        """
+        Opens a streamed response like AsyncHttpTransport.open, retrying
+        the request until the headers arrive as send_post does.
+        """
+        async with contextlib.AsyncExitStack() as stack:
+
+            async def attempt():
+                started = default_timer()
+                response = await stack.enter_async_context(
+                    self.service.transport.open(method, url))
+                if self.event is not None:
+                    self.event.wait += default_timer() - started
+                return response
+
+            response = await self._retrying(attempt)
+            try:
+                yield response
+            except aiohttp.ClientError as e:
+                raise transport_error(e) from e
+
+    async def _timed_request(self, method, url, data, headers):
+        event = self.event
+        event.request_bytes = len(url) + (len(data) if isinstance(
+            data, (bytes, str)) else 0)
+        started = default_timer()
+        async with self.service.transport.open(method, url, data=data,
+                                               headers=headers) as response:
+            received = default_timer()
+            body = await response.read()
+        event.wait += received - started
+        event.transfer += default_timer() - received
+        return body
+
+    async def download_file(self, method, pathToSave):
+        """
+        Calls the specified web service method and saves the returned resource
+        in the pathToSave directory. Returns the path to the saved resource.
+        """
+        instrumentation = self.service.instrumentation
+        if instrumentation is None:
+            url = self.construct_url(method)
+            return await self._bounded(self._download(url, pathToSave))
+        self.event = event = instrumentation.start(method, 'download')
+        try:
+            url = self.construct_url(method)
+            filepath = await self._bounded(self._download(url, pathToSave))
+        except Exception as e:
+            instrumentation.finish(event, e)
+            raise
+        finally:
+            self.event = None
+        event.response_bytes = os.path.getsize(filepath)
+        event.transfer = max(0.0, default_timer() - event._clock -
+                             event.sign - event.wait)
+        instrumentation.finish(event)
+        return filepath
+
+    async def _download(self, url, pathToSave):
+        async with self._open('GET', url) as response:
+            filename = filename_from_content_disposition(
+                response.headers.get('Content-Disposition'))
+            if self.parameters.get('path') is not None:
+                filename = os.path.split(self.parameters['path'])[1]
+            filepath = os.path.join(pathToSave, filename)
+            with open(filepath, 'wb') as f:
+                async for buffer in response.content.iter_chunked(65536):
+                    f.write(buffer)
+        return filepath
+
+    async def _stream(self, url, fileobj, buffer_size=65536, progress=None):
+        written = 0
+        async with self._open('GET', url) as response:
+            total = response.content_length
+            async for buffer in response.content.iter_chunked(buffer_size):
+                fileobj.write(buffer)
+                written += len(buffer)
+                if progress is not None:
+                    progress(written, total)
+        return written
+
+    async def _bounded(self, coro, limit=None):
+        try:
+            remaining = _remaining()
+        except asyncio.TimeoutError:
+            coro.close()
+            raise
+        for bound in (self.service.call_timeout, limit):
+            if bound is not None and (remaining is None or bound < remaining):
+                remaining = bound
+        if remaining is None:
+            return await coro
+        return await asyncio.wait_for(coro, remaining)
+
+
+class AsyncScormCloudService(ScormCloudService):
+    """
+    asyncio counterpart of ScormCloudService. The get_*_service methods
+    return services whose network methods are coroutines.
+    """
+
+    def __init__(self, configuration, transport=None, parser=None,
+                 call_timeout=None, cache=None, sinks=None, coalesce=None,
+                 rate_limiter=None, retry_policy=None, circuit_breaker=None):
+        """
+        Arguments:
+        configuration -- the Configuration for the SCORM Cloud application
+        transport -- (optional) the AsyncHttpTransport used to send requests
+        parser -- (optional) the XML parser backend for responses
+        call_timeout -- (optional) default time limit, in seconds, for each
+            individual attempt of a call. Use the deadline context manager
+            for a budget spanning several calls
+        cache -- (optional) a ResponseCache for the results of read-only
+            methods, or True for one with the default settings
+        sinks -- (optional) instrumentation sinks; see the instrumentation
+            module
+        coalesce -- (optional) an AsyncCoalescer that lets concurrent
+            identical read-only calls share one request, or True for one of
+            this service's own
+        rate_limiter -- (optional) a RateLimiter pacing the calls of this
+            service
+        retry_policy -- (optional) the RetryPolicy deciding which failed calls
+            are retried; see ScormCloudService
+        circuit_breaker -- (optional) a CircuitBreaker that makes calls fail
+            fast after repeated failures. It may be shared with blocking
+            services
+        """
+        ScormCloudService.__init__(
+            self, configuration, transport or AsyncHttpTransport(), parser,
+            retry_policy=retry_policy, circuit_breaker=circuit_breaker,
+            cache=cache, sinks=sinks,
+            coalesce=AsyncCoalescer() if coalesce is True else coalesce,
+            rate_limiter=rate_limiter)
+        self.call_timeout = call_timeout
+
+    @classmethod
+    def withconfig(cls, config, transport=None):
+        return cls(config, transport)
+
+    @classmethod
+    def withargs(cls, appid, secret, serviceurl, origin, transport=None):
+        return cls(Configuration(appid, secret, serviceurl, origin), transport)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """
+        Closes the pooled connections of the service's transport.
+        """
+        await self.transport.close()
+
+    def get_course_service(self):
+        return AsyncCourseService(self)
+
+    def get_dispatch_service(self):
+        return AsyncDispatchService(self)
+
+    def get_registration_service(self):
+        return AsyncRegistrationService(self)
+
+    def get_invitation_service(self):
+        return AsyncInvitationService(self)
+
+    def get_reporting_service(self):
+        return AsyncReportingService(self)
+
+    def get_upload_service(self):
+        return AsyncUploadService(self)
+
+    def request(self):
+        return AsyncServiceRequest(self)
+
+    def batch(self, max_workers=8, max_pending=None):
+        """
+        Returns an AsyncBatch that runs many calls concurrently as tasks.
+        See ScormCloudService.batch.
+        """
+        return AsyncBatch(max_workers, max_pending)
+
+    async def make_call(self, method):
+        return await self.request().call_service(method)
+
+
+class AsyncCourseService(CourseService):
+
+    async def exists(self, courseid):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        return await request.call_service('rustici.course.exists')
+
+    async def import_course(self, courseid, file_handle):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        url = request.construct_url('rustici.course.importCourse')
+        raw = await request.send_post(url, self._form(file_handle))
+        return ImportResult.list_from_result(request.get_xml(raw))
+
+    async def import_course_async(self, courseid, file_handle):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        url = request.construct_url('rustici.course.importCourseAsync')
+        raw = await request.send_post(url, self._form(file_handle))
+        return self._token_from_result(request.get_xml(raw))
+
+    @staticmethod
+    def _form(file_handle):
+        form = aiohttp.FormData()
+        form.add_field('file', file_handle,
+                       filename=os.path.basename(getattr(file_handle, 'name',
+                                                         'file')))
+        return form
+
+    async def get_async_import_result(self, token):
+        request = self.service.request()
+        request.parameters['token'] = token
+        url = request.construct_url('rustici.course.getAsyncImportResult')
+        raw = await request.send_post(url, b'')
+        return AsyncImportResult.result_from_xmldoc(request.get_xml(raw))
+
+    def import_tracker(self, **options):
+        """
+        Not available on the async service: ImportTracker polls from a
+        scheduler thread with blocking calls. Await get_async_import_result
+        instead, or use the tracker of a ScormCloudService.
+        """
+        raise TypeError('ImportTracker requires a blocking CourseService; '
+                        'use ScormCloudService(...).get_course_service()'
+                        '.import_tracker()')
+
+    async def import_uploaded_course(self, courseid, path):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        request.parameters['path'] = path
+        return await request.call_service('rustici.course.importCourse',
+                                          build=ImportResult.list_from_result)
+
+    async def delete_course(self, courseid):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        return await request.call_service('rustici.course.deleteCourse')
+
+    async def get_assets(self, courseid, pathToSave, path=None):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        if path is not None:
+            request.parameters['path'] = path
+        return await request.download_file('rustici.course.getAssets',
+                                           pathToSave)
+
+    async def get_course_list(self, courseIdFilterRegex=None):
+        request = self.service.request()
+        if courseIdFilterRegex is not None:
+            request.parameters['filter'] = courseIdFilterRegex
+        return await request.call_service('rustici.course.getCourseList',
+                                          build=CourseData.list_from_result)
+
+    async def iter_courses(self, courseIdFilterRegex=None):
+        request = self.service.request()
+        if courseIdFilterRegex is not None:
+            request.parameters['filter'] = courseIdFilterRegex
+        async for course in request.iter_elements(
+                'rustici.course.getCourseList', 'course'):
+            yield CourseData(course)
+
+    async def get_metadata(self, courseid):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        return await request.call_service('rustici.course.getMetadata')
+
+    async def get_attributes(self, courseid):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        xmldoc = await request.call_service('rustici.course.getAttributes')
+        return self._attributes_from_result(xmldoc)
+
+    async def update_attributes(self, courseid, attributePairs):
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        for (key, value) in attributePairs.items():
+            request.parameters[key] = value
+        xmldoc = await request.call_service('rustici.course.updateAttributes')
+        return self._attributes_from_result(xmldoc)
+
+
+class AsyncRegistrationService(RegistrationService):
+
+    async def test_registration_post(self, authtype, postbackurl, urlname,
+                                     passw):
+        request = self.service.request()
+        request.parameters['authtype'] = authtype
+        request.parameters['postbackurl'] = postbackurl
+        request.parameters['urlname'] = urlname
+        request.parameters['urlpass'] = passw
+        return await request.call_service(
+            'rustici.registration.testRegistrationPostUrl')
+
+    async def update_postback_info(self, regid, url, authtype='', user='',
+                                   password='', resultsformat='course'):
+        request = self.service.request()
+        request.parameters['regid'] = regid
+        request.parameters['url'] = url
+        request.parameters['authtype'] = authtype
+        request.parameters['name'] = user
+        request.parameters['password'] = password
+        request.parameters['resultsformat'] = resultsformat
+        return await request.call_service(
+            'rustici.registration.updatePostbackInfo')
+
+    async def create_registration(self, regid, courseid, userid, fname, lname,
+                                  postbackUrl=None, email=None,
+                                  learnerTags=None, courseTags=None,
+                                  registrationTags=None):
+        if regid is None:
+            regid = str(uuid.uuid1())
+        request = self.service.request()
+        request.parameters['appid'] = self.service.config.appid
+        request.parameters['courseid'] = courseid
+        request.parameters['regid'] = regid
+        if fname is not None:
+            request.parameters['fname'] = fname
+        if lname is not None:
+            request.parameters['lname'] = lname
+        request.parameters['learnerid'] = userid
+        if email is not None:
+            request.parameters['email'] = email
+        if learnerTags is not None:
+            request.parameters['learnerTags'] = learnerTags
+        if courseTags is not None:
+            request.parameters['courseTags'] = courseTags
+        if registrationTags is not None:
+            request.parameters['registrationTags'] = registrationTags
+        if postbackUrl is not None:
+            request.parameters['postbackurl'] = postbackUrl
+        xmldoc = await request.call_service(
+            'rustici.registration.createRegistration')
+        self._check_created(xmldoc)
+        return regid
+
+    async def get_registration_list(self, regIdFilterRegex=None,
+                                    courseIdFilterRegex=None):
+        request = self.service.request()
+        if regIdFilterRegex is not None:
+            request.parameters['filter'] = regIdFilterRegex
+        if courseIdFilterRegex is not None:
+            request.parameters['coursefilter'] = courseIdFilterRegex
+        return await request.call_service(
+            'rustici.registration.getRegistrationList',
+            build=RegistrationData.list_from_result)
+
+    async def iter_registrations(self, regIdFilterRegex=None,
+                                 courseIdFilterRegex=None):
+        request = self.service.request()
+        if regIdFilterRegex is not None:
+            request.parameters['filter'] = regIdFilterRegex
+        if courseIdFilterRegex is not None:
+            request.parameters['coursefilter'] = courseIdFilterRegex
+        async for reg in request.iter_elements(
+                'rustici.registration.getRegistrationList', 'registration'):
+            yield RegistrationData(reg)
+
+    async def get_registration_result(self, regid, resultsformat,
+                                      parsed=False):
+        request = self.service.request()
+        request.parameters['regid'] = regid
+        request.parameters['resultsformat'] = resultsformat
+        return await request.call_service(
+            'rustici.registration.getRegistrationResult',
+            build=RegistrationResult if parsed else None)
+
+    async def get_registration_detail(self, regid, parsed=False):
+        request = self.service.request()
+        request.parameters['regid'] = regid
+        return await request.call_service(
+            'rustici.registration.getRegistrationDetail',
+            build=RegistrationDetail if parsed else None)
+
+    async def get_launch_history(self, regid, parsed=False):
+        request = self.service.request()
+        request.parameters['regid'] = regid
+        return await request.call_service(
+            'rustici.registration.getLaunchHistory',
+            build=LaunchInfo.list_from_result if parsed else None)
+
+    async def get_launch_info(self, launchid, parsed=False):
+        request = self.service.request()
+        request.parameters['launchid'] = launchid
+        return await request.call_service(
+            'rustici.registration.getLaunchInfo',
+            build=LaunchInfo.result_from_xmldoc if parsed else None)
+
+    async def reset_registration(self, regid):
+        request = self.service.request()
+        request.parameters['regid'] = regid
+        return await request.call_service(
+            'rustici.registration.resetRegistration')
+
+    async def exists(self, regid):
+        request = self.service.request()
+        request.parameters['regid'] = regid
+        return await request.call_service('rustici.registration.exists')
+
+    async def reset_global_objectives(self, regid):
+        request = self.service.request()
+        request.parameters['regid'] = regid
+        return await request.call_service(
+            'rustici.registration.resetGlobalObjectives')
+
+    async def delete_registration(self, regid):
+        request = self.service.request()
+        request.parameters['regid'] = regid
+        return await request.call_service(
+            'rustici.registration.deleteRegistration')
+
+
+class AsyncInvitationService(InvitationService):
+
+    async def create_invitation(self, courseid, tags=None,
+                                publicInvitation='true', send='true',
+                                addresses=None, emailSubject=None,
+                                emailBody=None, creatingUserEmail=None,
+                                registrationCap=None, postbackUrl=None,
+                                authType=None, urlName=None, urlPass=None,
+                                resultsFormat=None, async_=False,
+                                **kwargs):
+        if 'async' in kwargs:
+            async_ = kwargs.pop('async')
+        if kwargs:
+            raise TypeError('create_invitation() got an unexpected keyword '
+                            'argument %r' % sorted(kwargs)[0])
+        request = self.service.request()
+        request.parameters['courseid'] = courseid
+        request.parameters['send'] = send
+        request.parameters['public'] = publicInvitation
+        optional = (('addresses', addresses), ('emailSubject', emailSubject),
+                    ('emailBody', emailBody),
+                    ('creatingUserEmail', creatingUserEmail),
+                    ('registrationCap', registrationCap),
+                    ('postbackUrl', postbackUrl), ('authType', authType),
+                    ('urlName', urlName), ('urlPass', urlPass),
+                    ('resultsFormat', resultsFormat), ('tags', tags))
+        for (key, value) in optional:
+            if value is not None:
+                request.parameters[key] = value
+        if async_:
+            return await request.call_service(
+                'rustici.invitation.createInvitationAsync')
+        return await request.call_service(
+            'rustici.invitation.createInvitation')
+
+    async def get_invitation_list(self, filter=None, coursefilter=None):
+        request = self.service.request()
+        if filter is not None:
+            request.parameters['filter'] = filter
+        if coursefilter is not None:
+            request.parameters['coursefilter'] = coursefilter
+        return await request.call_service(
+            'rustici.invitation.getInvitationList')
+
+    async def get_invitation_status(self, invitationId):
+        request = self.service.request()
+        request.parameters['invitationId'] = invitationId
+        return await request.call_service(
+            'rustici.invitation.getInvitationStatus')
+
+    async def get_invitation_info(self, invitationId, detail=None,
+                                  parsed=False):
+        request = self.service.request()
+        request.parameters['invitationId'] = invitationId
+        if detail is not None:
+            request.parameters['detail'] = detail
+        return await request.call_service(
+            'rustici.invitation.getInvitationInfo',
+            build=InvitationSummary.from_xmldoc if parsed else None)
+
+    async def iter_invitation_info(self, invitationId, detail='true'):
+        request = self.service.request()
+        request.parameters['invitationId'] = invitationId
+        if detail is not None:
+            request.parameters['detail'] = detail
+        summary = InvitationSummary()
+        async for wrapper in request.iter_elements(
+                'rustici.invitation.getInvitationInfo',
+                ('userInvitation', 'invitationInfo')):
+            summary._add_element(wrapper.element)
+        return summary
+
+    def engine(self, **options):
+        """
+        Not available on the async service: InvitationEngine makes blocking
+        calls from worker threads. Use the engine of a ScormCloudService.
+        """
+        raise TypeError('InvitationEngine requires a blocking '
+                        'InvitationService; use ScormCloudService('
+                        '...).get_invitation_service().engine()')
+
+    async def change_status(self, invitationId, enable, open=None):
+        request = self.service.request()
+        request.parameters['invitationId'] = invitationId
+        request.parameters['enable'] = enable
+        if open is not None:
+            request.parameters['open'] = open
+        return await request.call_service('rustici.invitation.changeStatus')
+
+
+class AsyncDispatchService(DispatchService):
+
+    async def get_dispatch_info(self, dispatchid):
+        request = self.service.request()
+        request.parameters['dispatchid'] = dispatchid
+        return await request.call_service(
+            'rustici.dispatch.getDispatchInfo')
+
+    async def get_destination_info(self, destinationid):
+        request = self.service.request()
+        request.parameters['destinationid'] = destinationid
+        return await request.call_service(
+            'rustici.dispatch.getDestinationInfo')
+
+    async def download_dispatches(self, dispatchid=None, tags=None,
+                                  destinationid=None, courseid=None,
+                                  destination='dispatch.zip',
+                                  buffer_size=65536, progress=None):
+        """
+        Async counterpart of DispatchService.download_dispatches. Paths are
+        written to a hidden temporary file that is renamed into place when
+        complete and removed if the download fails or is cancelled; unlike
+        the blocking version, an interrupted download is not resumed.
+
+        Arguments:
+        buffer_size -- the number of bytes read from the network at a time
+        progress -- (optional) callable invoked as progress(done, total)
+            after each buffer is written. total is None if the size is not
+            known
+        """
+        request = self.service.request()
+        if dispatchid is not None:
+            request.parameters['dispatchid'] = dispatchid
+        if destinationid is not None:
+            request.parameters['destinationid'] = destinationid
+        if tags is not None:
+            request.parameters['tags'] = tags
+        if courseid is not None:
+            request.parameters['courseid'] = courseid
+        url = request.construct_url('rustici.dispatch.downloadDispatches')
+        if hasattr(destination, 'write'):
+            size = await request._bounded(request._stream(
+                url, destination, buffer_size, progress))
+            return None, size
+        path = os.path.abspath(destination)
+        directory, filename = os.path.split(path)
+        partpath = os.path.join(directory, '.%s.%s.part' % (
+            filename, uuid.uuid4().hex[:16]))
+        try:
+            with open(partpath, 'wb') as f:
+                size = await request._bounded(request._stream(
+                    url, f, buffer_size, progress))
+            _replace(partpath, path)
+        except BaseException:
+            if os.path.exists(partpath):
+                os.remove(partpath)
+            raise
+        return path, size
+
+    async def download_dispatches_many(self, jobs, max_workers=4):
+        """
+        Async counterpart of DispatchService.download_dispatches_many.
+        """
+        return await self.service.batch(max_workers).run(self._download_job,
+                                                         jobs)
+
+
+class AsyncUploadService(UploadService):
+
+    async def get_upload_token(self):
+        xmldoc = await self.service.make_call('rustici.upload.getUploadToken')
+        return UploadToken.result_from_xmldoc(xmldoc)
+
+    async def get_upload_url(self, callbackurl):
+        token = await self.get_upload_token()
+        if token:
+            request = self.service.request()
+            request.parameters['tokenid'] = token.tokenid
+            request.parameters['redirecturl'] = callbackurl
+            return request.construct_url('rustici.upload.uploadFile')
+        else:
+            return None
+
+    async def delete_file(self, location):
+        locParts = location.split("/")
+        request = self.service.request()
+        request.parameters['file'] = locParts[len(locParts) - 1]
+        return await request.call_service('rustici.upload.deleteFiles')
+
+    async def get_upload_progress(self, token):
+        request = self.service.request()
+        request.parameters['token'] = token
+        return await request.call_service('rustici.upload.getUploadProgress')
+
+
+class AsyncReportingService(ReportingService):
+
+    async def get_reportage_date(self):
+        reportUrl = (self._get_reportage_service_url() +
+                     'Reportage/scormreports/api/getReportDate.php?appId=' +
+                     self.service.config.appid)
+        request = self.service.request()
+        reply = await request._bounded(
+            self.service.transport.get(reportUrl, verify=False))
+        return self._parse_reportage_date(reply.decode('utf8'))
+
+    async def get_reportage_auth(self, navperm, allowadmin):
+        request = self.service.request()
+        request.parameters['navpermission'] = navperm
+        request.parameters['admin'] = 'true' if allowadmin else 'false'
+        xmldoc = await request.call_service(
+            'rustici.reporting.getReportageAuth')
+        return self._auth_from_result(xmldoc)
+
+
+class PostbackASGIApp(object):
+    """
+    ASGI application serving a postback.PostbackReceiver, for example with
+    uvicorn. Posts are parsed on the default executor so large reports do
+    not block the event loop. Does not need aiohttp.
+    """
+
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await asyncio.get_event_loop().run_in_executor(
+                        None, self.receiver.close)
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        if scope['method'] != 'POST':
+            status, headers, body = 405, [('Allow', 'POST')], b''
+        else:
+            body = b''
+            more = True
+            while more:
+                message = await receive()
+                body += message.get('body', b'')
+                more = message.get('more_body', False)
+                if len(body) > self.receiver.max_body_size:
+                    break
+            request_headers = dict((k.decode('latin1').lower(),
+                                    v.decode('latin1'))
+                                   for (k, v) in scope['headers'])
+            status, headers, body = await asyncio.get_event_loop() \
+                .run_in_executor(None, self.receiver.handle,
+                                 request_headers, body)
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(k.lower().encode('latin1'),
+                                 v.encode('latin1')) for (k, v) in headers]})
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,186 @@
+import threading
+import time
+
+from six.moves import zip
+
+from .lazy import LazyModule
+
+futures = LazyModule('concurrent.futures')
+
+
+class BatchResult(object):
+    """
+    The outcome of a single call made by Batch.map. Exactly one of value and
+    error is meaningful: ok tells which.
+    """
+    __slots__ = ('index', 'args', 'value', 'error', 'elapsed')
+
+    def __init__(self, index, args, value=None, error=None, elapsed=0.0):
+        self.index = index
+        self.args = args
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return 'BatchResult(index=%d, args=%r, value=%r)' % (
+                self.index, self.args, self.value)
+        return 'BatchResult(index=%d, args=%r, error=%r)' % (
+            self.index, self.args, self.error)
+
+
+class BatchStats(object):
+    """
+    Running counters for a Batch.map call. Safe to read from another thread
+    while the batch is running.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.call_time = 0.0
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def _record(self, result):
+        with self._lock:
+            if result.ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self.call_time += result.elapsed
+
+    @property
+    def completed(self):
+        return self.succeeded + self.failed
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self):
+        """
+        Completed calls per second of wall-clock time.
+        """
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def error_rate(self):
+        """
+        The fraction of completed calls that raised an error.
+        """
+        completed = self.completed
+        return self.failed / float(completed) if completed else 0.0
+
+    @property
+    def mean_latency(self):
+        completed = self.completed
+        return self.call_time / completed if completed else 0.0
+
+    def __repr__(self):
+        return ('BatchStats(completed=%d, failed=%d, elapsed=%.2fs, '
+                'throughput=%.1f/s, error_rate=%.2f%%, mean_latency=%.3fs)' % (
+                    self.completed, self.failed, self.elapsed,
+                    self.throughput, self.error_rate * 100, self.mean_latency))
+
+
+class Batch(object):
+    """
+    Runs many service calls on a thread pool with a cap on concurrency.
+    Typically created with ScormCloudService.batch:
+
+        batch = service.batch(max_workers=16)
+        for result in batch.map(regsvc.get_registration_result, regids,
+                                resultsformat='course'):
+            if result.ok:
+                ...
+        print(batch.stats)
+
+    Each worker thread holds one pooled connection while its call is in
+    flight, so the service's transport should allow at least max_workers
+    connections per host.
+    """
+
+    def __init__(self, max_workers=8, max_pending=None):
+        """
+        Arguments:
+        max_workers -- the maximum number of calls running at once
+        max_pending -- (optional) the maximum number of calls submitted but
+            not yet returned to the caller. Bounds memory when the inputs are
+            a long or endless iterator. Defaults to twice max_workers
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending or 2 * max_workers
+        self.stats = BatchStats()
+
+    def map(self, fn, *iterables, **kwargs):
+        """
+        Calls fn once for each set of arguments taken from iterables, passing
+        kwargs to every call, and yields a BatchResult for each call as it
+        completes. Results arrive in completion order; use BatchResult.index
+        to match them to their inputs. An exception raised by one call is
+        captured in its result and does not stop the batch.
+
+        Arguments:
+        fn -- the callable to run, for example a bound service method
+        iterables -- one iterable per positional argument of fn
+        kwargs -- keyword arguments passed unchanged to every call
+        """
+        self.stats = stats = BatchStats()
+        arguments = enumerate(zip(*iterables))
+        pending = set()
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.max_pending:
+                    try:
+                        index, args = next(arguments)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.add(executor.submit(_call, fn, index, args,
+                                                kwargs))
+                    stats.submitted += 1
+                if not pending:
+                    break
+                done, pending = futures.wait(
+                    pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    stats._record(result)
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            stats.finished = time.time()
+
+    def run(self, fn, *iterables, **kwargs):
+        """
+        Like map, but waits for every call and returns the results as a list
+        in input order.
+        """
+        results = list(self.map(fn, *iterables, **kwargs))
+        results.sort(key=lambda result: result.index)
+        return results
+
+
+def _call(fn, index, args, kwargs):
+    started = time.time()
+    try:
+        value = fn(*args, **kwargs)
+    except Exception as e:
+        return BatchResult(index, args, error=e,
+                           elapsed=time.time() - started)
+    return BatchResult(index, args, value=value,
+                       elapsed=time.time() - started)
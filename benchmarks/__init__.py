@@ -0,0 +1,6 @@
+"""
+Benchmarks for the SCORM Cloud client library. Each module can be run with
+python -m, for example:
+
+    python -m scormcloud.benchmarks.parse
+"""
@@ -0,0 +1,745 @@
+"""
+A local stand-in for the SCORM Cloud web service, for benchmarks and for
+trying out integration code without an account.
+
+    with FakeCloud(registrations=500000) as cloud:
+        service = cloud.service()
+        for reg in service.get_registration_service().iter_registrations():
+            ...
+
+The server answers the rustici.* methods this library calls with responses
+shaped like the real service's. Signatures are checked the way the service
+checks them. The application's courses and registrations are synthetic:
+each one is generated from its index when it is listed or looked up, so
+lists of hundreds of thousands of registrations are streamed without being
+held in memory. Registrations created through the API are kept in memory
+and returned along with the synthetic ones.
+
+Run it on its own to point other code at it:
+
+    python -m scormcloud.benchmarks.fakeserver 8080 500000
+"""
+import heapq
+import itertools
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from hashlib import md5
+from xml.sax.saxutils import escape, quoteattr
+
+from six.moves import BaseHTTPServer, socketserver, urllib
+
+APPID = 'benchmarkapp'
+SECRET = 'a-secret-key-of-typical-length-0123456789'
+
+# Error codes of the real service.
+ERR_UNKNOWN_METHOD = '3'
+ERR_INVALID_SIGNATURE = '100'
+ERR_NOT_FOUND = '1'
+ERR_ALREADY_EXISTS = '1'
+
+# Number of list entries rendered per chunk of a streamed response.
+_CHUNK = 1000
+
+_DATE = '2020-01-%02dT%02d:%02d:00.000+0000'
+
+
+def _date(i):
+    return _DATE % (1 + i % 28, i % 24, i % 60)
+
+
+class FakeCloudError(Exception):
+    def __init__(self, code, msg):
+        Exception.__init__(self, msg)
+        self.code = code
+        self.msg = msg
+
+
+class FakeCloud(object):
+    """
+    A SCORM Cloud application served over HTTP on a local port, from a
+    background thread.
+    """
+
+    def __init__(self, registrations=1000, courses=50, activities=5,
+                 interactions=10, launches=3, latency=0.0, appid=APPID,
+                 secret=SECRET, verify=True, host='127.0.0.1', port=0):
+        """
+        Arguments:
+        registrations -- the number of synthetic registrations
+        courses -- the number of synthetic courses; registrations are spread
+            across them evenly
+        activities -- the number of child activities in activity and full
+            registration results
+        interactions -- the number of interactions per activity in full
+            registration results
+        launches -- the number of launches in each launch history
+        latency -- seconds the server waits before answering each call, to
+            stand in for the real service's processing time
+        appid -- the application id calls must be made with
+        secret -- the secret calls must be signed with
+        verify -- if False, signatures are not checked
+        host -- the interface to listen on
+        port -- the port to listen on. 0 picks a free port
+        """
+        self.registrations = registrations
+        self.courses = courses
+        self.activities = activities
+        self.interactions = interactions
+        self.launches = launches
+        self.latency = latency
+        self.appid = appid
+        self.secret = secret
+        self.verify = verify
+        self.calls = {}
+        self.created = {}
+        self.deleted = set()
+        self.invitations = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._server = _Server((host, port), _Handler)
+        self._server.cloud = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        """
+        The service URL to configure clients with.
+        """
+        return 'http://%s:%d/EngineWebServices' % (
+            self._server.server_address[0], self.port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='scormcloud-fakeserver')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def service(self, **options):
+        """
+        Returns a ScormCloudService configured for this server. options are
+        passed to the ScormCloudService constructor.
+        """
+        return _service(self, options)
+
+    # Requests
+
+    def check_signature(self, pairs):
+        """
+        Raises FakeCloudError unless the parameters carry the application id
+        and a valid signature: the md5 of the secret followed by each name
+        and value, ordered by lower-cased name.
+        """
+        params = dict(pairs)
+        if params.get('appid') != self.appid:
+            raise FakeCloudError(ERR_INVALID_SIGNATURE, 'Invalid appid')
+        if not self.verify:
+            return
+        signing = ''.join(key + value for (key, value) in
+                          sorted(((k, v) for (k, v) in pairs if k != 'sig'),
+                                 key=lambda kv: kv[0].lower()))
+        expected = md5((self.secret + signing).encode('utf8')).hexdigest()
+        if params.get('sig') != expected or 'ts' not in params:
+            raise FakeCloudError(ERR_INVALID_SIGNATURE,
+                                 'The security signature is invalid')
+
+    def dispatch(self, query):
+        """
+        Returns the response body for a call, as a string or an iterator of
+        strings.
+        """
+        pairs = urllib.parse.parse_qsl(query, keep_blank_values=True)
+        params = dict(pairs)
+        method = params.get('method', '')
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        try:
+            self.check_signature(pairs)
+            handler = METHODS.get(method)
+            if handler is None:
+                raise FakeCloudError(ERR_UNKNOWN_METHOD,
+                                     'Unknown method: %s' % method)
+            body = handler(self, params)
+        except FakeCloudError as e:
+            return ('<?xml version="1.0" encoding="utf-8" ?>\n'
+                    '<rsp stat="fail"><err code=%s msg=%s /></rsp>' %
+                    (quoteattr(e.code), quoteattr(e.msg)))
+        if isinstance(body, str):
+            return _OK + body + '</rsp>'
+        return itertools.chain([_OK], body, ['</rsp>'])
+
+    # Synthetic data
+
+    def _registration(self, regid):
+        created = self.created.get(regid)
+        if created is not None:
+            return created
+        if regid in self.deleted:
+            return None
+        match = re.match(r'^reg-(\d+)$', regid)
+        if match is None or int(match.group(1)) >= self.registrations:
+            return None
+        i = int(match.group(1))
+        return {'regid': regid, 'courseid': 'course-%d' % (i % self.courses),
+                'learnerid': 'learner-%d' % i, 'fname': 'First%d' % i,
+                'lname': 'Last%d' % i, 'email': 'learner-%d@example.com' % i,
+                'index': i}
+
+    def _get_registration(self, params):
+        registration = self._registration(params.get('regid', ''))
+        if registration is None:
+            raise FakeCloudError(ERR_NOT_FOUND,
+                                 'The registration was not found')
+        return registration
+
+    def _all_registrations(self, coursefilter=None):
+        """
+        Yields every registration, or those of the courses whose id matches
+        coursefilter. Synthetic registrations of other courses are skipped
+        without being generated.
+        """
+        regex = re.compile(coursefilter) if coursefilter else None
+        if regex is None:
+            indexes = range(self.registrations)
+        else:
+            indexes = _merge(range(c, self.registrations, self.courses)
+                             for c in range(self.courses)
+                             if regex.search('course-%d' % c))
+        for i in indexes:
+            regid = 'reg-%d' % i
+            if regid not in self.deleted:
+                yield self._registration(regid)
+        for registration in list(self.created.values()):
+            if regex is None or regex.search(registration['courseid']):
+                yield registration
+
+    def _course_exists(self, courseid):
+        match = re.match(r'^course-(\d+)$', courseid)
+        return match is not None and int(match.group(1)) < self.courses
+
+
+def _service(cloud, options):
+    from ..client import Configuration, ScormCloudService
+    return ScormCloudService(Configuration(
+        cloud.appid, cloud.secret, cloud.url, 'benchmark'), **options)
+
+
+_OK = '<?xml version="1.0" encoding="utf-8" ?>\n<rsp stat="ok">'
+
+
+def _registration_xml(reg):
+    i = reg.get('index', 0)
+    return (
+        '<registration id=%s courseid=%s><appId>%s</appId>'
+        '<registrationId>%s</registrationId><courseId>%s</courseId>'
+        '<courseTitle>Course %s</courseTitle>'
+        '<lastCourseVersionLaunched>0</lastCourseVersionLaunched>'
+        '<learnerId>%s</learnerId><learnerFirstName>%s</learnerFirstName>'
+        '<learnerLastName>%s</learnerLastName><email>%s</email>'
+        '<createDate>%s</createDate><firstAccessDate>%s</firstAccessDate>'
+        '<lastAccessDate>%s</lastAccessDate><completedDate>%s'
+        '</completedDate><instances><instance><instanceId>0</instanceId>'
+        '<courseVersion>0</courseVersion><updateDate>%s</updateDate>'
+        '</instance></instances></registration>' % (
+            quoteattr(reg['regid']), quoteattr(reg['courseid']), APPID,
+            escape(reg['regid']), escape(reg['courseid']),
+            escape(reg['courseid']), escape(reg['learnerid']),
+            escape(reg.get('fname') or ''), escape(reg.get('lname') or ''),
+            escape(reg.get('email') or ''), _date(i), _date(i + 1),
+            _date(i + 2), _date(i + 3) if i % 2 else '', _date(i + 2)))
+
+
+def _merge(ranges):
+    return heapq.merge(*list(ranges))
+
+
+def _chunks(items, render):
+    chunk = []
+    for item in items:
+        chunk.append(render(item))
+        if len(chunk) >= _CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _filter(pattern, field, items):
+    if not pattern:
+        return items
+    regex = re.compile(pattern)
+    return (item for item in items if regex.search(item[field]))
+
+
+def _registration_list(cloud, params):
+    registrations = _filter(params.get('filter'), 'regid',
+                            cloud._all_registrations(
+                                params.get('coursefilter')))
+    courseid = params.get('courseid')
+    if courseid:
+        registrations = (reg for reg in registrations
+                         if reg['courseid'] == courseid)
+    learnerid = params.get('learnerid')
+    if learnerid:
+        registrations = (reg for reg in registrations
+                         if reg['learnerid'] == learnerid)
+    return itertools.chain(['<registrationlist>'],
+                           _chunks(registrations, _registration_xml),
+                           ['</registrationlist>'])
+
+
+def _course_list(cloud, params):
+    courses = ({'courseid': 'course-%d' % i, 'index': i}
+               for i in range(cloud.courses))
+    courses = _filter(params.get('filter'), 'courseid', courses)
+    per_course = cloud.registrations // max(1, cloud.courses)
+
+    def render(course):
+        return ('<course id="%s" title="Course %d" versions="1" '
+                'registrations="%d" size="%d" />' % (
+                    course['courseid'], course['index'], per_course,
+                    1024 * (100 + course['index'])))
+
+    return itertools.chain(['<courselist>'], _chunks(courses, render),
+                           ['</courselist>'])
+
+
+def _course_exists(cloud, params):
+    return '<result>%s</result>' % (
+        'true' if cloud._course_exists(params.get('courseid', '')) else
+        'false')
+
+
+def _get_course(cloud, params):
+    courseid = params.get('courseid', '')
+    if not cloud._course_exists(courseid):
+        raise FakeCloudError(ERR_NOT_FOUND, 'The course was not found')
+    return courseid
+
+
+def _course_metadata(cloud, params):
+    courseid = _get_course(cloud, params)
+    children = ''.join(
+        '<object id="sco-%d"><metadata><title>Activity %d</title>'
+        '<description>Activity %d of %s</description><duration>0'
+        '</duration><typicaltime>0</typicaltime><keywords /></metadata>'
+        '<children /></object>' % (i, i, i, escape(courseid))
+        for i in range(cloud.activities))
+    return ('<package><metadata><title>%s</title><description>'
+            'Synthetic course</description><duration>0</duration>'
+            '<typicaltime>0</typicaltime><keywords /></metadata>'
+            '<object id=%s><metadata><title>%s</title></metadata>'
+            '<children>%s</children></object></package>' % (
+                escape(courseid), quoteattr(courseid), escape(courseid),
+                children))
+
+
+_ATTRIBUTES = (('alwaysFlowToFirstSco', 'false'), ('commCommitFrequency',
+               '10000'), ('commMaxFailedSubmissions', '2'),
+               ('courseStructureStartsOpen', 'false'),
+               ('finishCausesImmediateCommit', 'false'),
+               ('lookaheadSequencerMode', 'DISABLED'),
+               ('scoreRollupMode', 'SCORE_PROVIDED_BY_COURSE'),
+               ('showCourseStructure', 'false'), ('showNavBar', 'false'),
+               ('validateInteractionResponses', 'true'))
+
+
+def _course_attributes(cloud, params):
+    _get_course(cloud, params)
+    return '<attributes>%s</attributes>' % ''.join(
+        '<attribute name="%s" value="%s" />' % pair for pair in _ATTRIBUTES)
+
+
+def _delete_course(cloud, params):
+    _get_course(cloud, params)
+    return '<success />'
+
+
+def _registration_exists(cloud, params):
+    exists = cloud._registration(params.get('regid', '')) is not None
+    return '<result>%s</result>' % ('true' if exists else 'false')
+
+
+def _create_registration(cloud, params):
+    regid = params.get('regid', '')
+    if cloud._registration(regid) is not None:
+        raise FakeCloudError(ERR_ALREADY_EXISTS,
+                             'A registration with that id already exists')
+    if not cloud._course_exists(params.get('courseid', '')):
+        raise FakeCloudError(ERR_NOT_FOUND, 'The course was not found')
+    with cloud._lock:
+        cloud.created[regid] = {
+            'regid': regid, 'courseid': params['courseid'],
+            'learnerid': params.get('learnerid', ''),
+            'fname': params.get('fname'), 'lname': params.get('lname'),
+            'email': params.get('email'), 'index': len(cloud.created)}
+    return '<success />'
+
+
+def _delete_registration(cloud, params):
+    registration = cloud._get_registration(params)
+    with cloud._lock:
+        cloud.created.pop(registration['regid'], None)
+        cloud.deleted.add(registration['regid'])
+    return '<success />'
+
+
+def _reset_registration(cloud, params):
+    cloud._get_registration(params)
+    return '<success />'
+
+
+def _registration_detail(cloud, params):
+    return _registration_xml(cloud._get_registration(params))
+
+
+def _activity_xml(cloud, activityid, title, i, full, children=''):
+    complete = 'complete' if i % 3 else 'incomplete'
+    success = 'passed' if i % 3 else 'unknown'
+    extra = ''
+    if full:
+        interactions = ''.join(
+            '<interaction id="q%d"><objectives><objective id="obj-%d" />'
+            '</objectives><timestamp>%s</timestamp><correct_responses>'
+            '<response id="a" /></correct_responses><weighting>1'
+            '</weighting><learner_response>a</learner_response><result>'
+            'correct</result><latency>0000:00:05.00</latency><description>'
+            'Question %d</description><type>choice</type></interaction>' %
+            (n, n, _date(n), n) for n in range(cloud.interactions))
+        extra = (
+            '<objectives><objective id="obj-%d"><measurestatus>true'
+            '</measurestatus><normalizedmeasure>0.8</normalizedmeasure>'
+            '<progressstatus>true</progressstatus><satisfiedstatus>true'
+            '</satisfiedstatus></objective></objectives>'
+            '<runtime><completion_status>%s</completion_status><credit>'
+            'Credit</credit><entry>AbInitio</entry><exit>Unknown</exit>'
+            '<location>page-%d</location><mode>Normal</mode>'
+            '<progress_measure>1</progress_measure><score_raw>80</score_raw>'
+            '<score_max>100</score_max><score_min>0</score_min>'
+            '<score_scaled>0.8</score_scaled><success_status>%s'
+            '</success_status><suspend_data>%s</suspend_data><total_time>'
+            '0000:00:%02d.00</total_time><timetracked>0000:00:%02d.00'
+            '</timetracked><interactions>%s</interactions><objectives>'
+            '</objectives></runtime>' % (
+                i, complete, i, success, 'x' * 64, i % 60, i % 60,
+                interactions))
+    return ('<activity id=%s><title>%s</title><attempts>1</attempts>'
+            '<complete>%s</complete><success>%s</success><time>'
+            '0000:00:%02d.00</time><score>80</score><satisfied>true'
+            '</satisfied><completed>true</completed><suspended>false'
+            '</suspended><children>%s</children>%s</activity>' % (
+                quoteattr(activityid), escape(title), complete, success,
+                i % 60, children, extra))
+
+
+def _registration_result(cloud, params):
+    reg = cloud._get_registration(params)
+    i = reg.get('index', 0)
+    resultsformat = params.get('resultsformat', 'course')
+    head = ('<registrationreport format=%s regid=%s instanceid="0">' %
+            (quoteattr(resultsformat), quoteattr(reg['regid'])))
+    if resultsformat == 'course':
+        return head + (
+            '<complete>%s</complete><success>%s</success><totaltime>%d'
+            '</totaltime><score>%s</score></registrationreport>' % (
+                'complete' if i % 3 else 'incomplete',
+                'passed' if i % 3 else 'unknown', 60 + i % 3600,
+                i % 101 if i % 3 else 'unknown'))
+    full = resultsformat == 'full'
+    children = ''.join(_activity_xml(cloud, 'sco-%d' % n, 'Activity %d' % n,
+                                     i + n, full)
+                       for n in range(cloud.activities))
+    return head + _activity_xml(cloud, reg['courseid'], 'Course', i, False,
+                                children) + '</registrationreport>'
+
+
+def _launch_xml(launchid, i, log=False):
+    return ('<launch id=%s><completion>complete</completion><satisfaction>'
+            'passed</satisfaction><measure_status>1</measure_status>'
+            '<normalized_measure>0.8</normalized_measure>'
+            '<experienced_duration_tracked>%d</experienced_duration_tracked>'
+            '<launch_time>%s</launch_time><exit_time>%s</exit_time>'
+            '<update_dt>%s</update_dt>%s</launch>' % (
+                quoteattr(launchid), 1000 * (i + 1), _date(i), _date(i + 1),
+                _date(i + 1), '<log><entry>Launched</entry><entry>Exited'
+                '</entry></log>' if log else ''))
+
+
+def _launch_history(cloud, params):
+    reg = cloud._get_registration(params)
+    return '<launchhistory regid=%s>%s</launchhistory>' % (
+        quoteattr(reg['regid']), ''.join(
+            _launch_xml('%s-launch-%d' % (reg['regid'], n), n)
+            for n in range(cloud.launches)))
+
+
+def _launch_info(cloud, params):
+    return _launch_xml(params.get('launchid', ''), 0, log=True)
+
+
+def _postback_info(cloud, params):
+    reg = cloud._get_registration(params)
+    return ('<postbackinfo><id>%s</id><url>https://lms.example.com/postback'
+            '</url><login>cloud</login><password>s3cret</password><authtype>'
+            'form</authtype><resultsformat>course</resultsformat>'
+            '</postbackinfo>' % escape(reg['regid']))
+
+
+def _tags(cloud, params):
+    subject = params.get('courseid') or params.get('regid') or ''
+    return '<tags><tag>benchmark</tag><tag>%s</tag></tags>' % escape(subject)
+
+
+def _create_invitation(cloud, params):
+    _get_course(cloud, params)
+    invitationid = 'invitation-%d' % next(cloud._ids)
+    with cloud._lock:
+        cloud.invitations[invitationid] = [params['courseid'], 0]
+    return '<id>%s</id>' % invitationid
+
+
+def _get_invitation(cloud, params):
+    invitation = cloud.invitations.get(params.get('invitationId', ''))
+    if invitation is None:
+        raise FakeCloudError(ERR_NOT_FOUND, 'The invitation was not found')
+    return invitation
+
+
+def _invitation_status(cloud, params):
+    invitation = _get_invitation(cloud, params)
+    with cloud._lock:
+        invitation[1] += 1
+    return '<status>%s</status>' % ('complete' if invitation[1] > 1 else
+                                    'running')
+
+
+def _invitation_info(cloud, params):
+    invitationid = params['invitationId']
+    courseid = _get_invitation(cloud, params)[0]
+    detail = params.get('detail') == 'true'
+
+    def render(n):
+        report = ''
+        if detail:
+            report = ('<registrationreport format="course" regid="%s-%d" '
+                      'instanceid="0"><complete>%s</complete><success>%s'
+                      '</success><totaltime>60</totaltime><score>%s</score>'
+                      '</registrationreport>' % (
+                          invitationid, n,
+                          'complete' if n % 3 else 'incomplete',
+                          'passed' if n % 3 else 'unknown',
+                          80 if n % 3 else 'unknown'))
+        return ('<userInvitation><email>learner-%d@example.com</email>'
+                '<url>https://cloud.example.com/%s/%d</url><isStarted>%s'
+                '</isStarted><registrationId>%s-%d</registrationId>%s'
+                '</userInvitation>' % (n, invitationid, n,
+                                       'true' if n % 2 else 'false',
+                                       invitationid, n, report))
+
+    return ('<invitationInfo><id>%s</id><body>Welcome</body><courseId>%s'
+            '</courseId><subject>Invitation</subject><url>https://'
+            'cloud.example.com/%s</url><allowLaunch>true</allowLaunch>'
+            '<allowNewRegistrations>true</allowNewRegistrations><public>'
+            'true</public><created>true</created><createdDate>%s'
+            '</createdDate><userInvitations>%s</userInvitations>'
+            '</invitationInfo>' % (invitationid, courseid, invitationid,
+                                   _date(0), ''.join(render(n)
+                                                     for n in range(25))))
+
+
+def _invitation_list(cloud, params):
+    return '<invitationlist>%s</invitationlist>' % ''.join(
+        '<invitationInfo><id>%s</id><courseId>%s</courseId>'
+        '</invitationInfo>' % (invitationid, invitation[0])
+        for (invitationid, invitation) in sorted(cloud.invitations.items()))
+
+
+def _upload_token(cloud, params):
+    return ('<token><server>%s</server><id>token-%d</id></token>' % (
+        cloud.url.rsplit('/', 1)[0], next(cloud._ids)))
+
+
+def _success(cloud, params):
+    return '<success />'
+
+
+def _pong(cloud, params):
+    return '<pong />'
+
+
+METHODS = {
+    'rustici.debug.ping': _pong,
+    'rustici.debug.authPing': _pong,
+    'rustici.course.getCourseList': _course_list,
+    'rustici.course.exists': _course_exists,
+    'rustici.course.getMetadata': _course_metadata,
+    'rustici.course.getAttributes': _course_attributes,
+    'rustici.course.updateAttributes': _course_attributes,
+    'rustici.course.deleteCourse': _delete_course,
+    'rustici.registration.getRegistrationList': _registration_list,
+    'rustici.registration.exists': _registration_exists,
+    'rustici.registration.createRegistration': _create_registration,
+    'rustici.registration.deleteRegistration': _delete_registration,
+    'rustici.registration.resetRegistration': _reset_registration,
+    'rustici.registration.resetGlobalObjectives': _reset_registration,
+    'rustici.registration.getRegistrationDetail': _registration_detail,
+    'rustici.registration.getRegistrationResult': _registration_result,
+    'rustici.registration.getLaunchHistory': _launch_history,
+    'rustici.registration.getLaunchInfo': _launch_info,
+    'rustici.registration.getPostbackInfo': _postback_info,
+    'rustici.registration.updatePostbackInfo': _success,
+    'rustici.tagging.getCourseTags': _tags,
+    'rustici.tagging.getRegistrationTags': _tags,
+    'rustici.invitation.createInvitation': _create_invitation,
+    'rustici.invitation.createInvitationAsync': _create_invitation,
+    'rustici.invitation.getInvitationStatus': _invitation_status,
+    'rustici.invitation.getInvitationInfo': _invitation_info,
+    'rustici.invitation.getInvitationList': _invitation_list,
+    'rustici.invitation.changeStatus': _success,
+    'rustici.upload.getUploadToken': _upload_token,
+}
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading a streamed list drop the connection.
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(self, request,
+                                                   client_address)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this small responses
+    # wait for the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._respond(urllib.parse.urlsplit(self.path).query)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        query = urllib.parse.urlsplit(self.path).query
+        content_type = self.headers.get('Content-Type') or ''
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            query = '&'.join(part for part in (query, body.decode('utf8'))
+                             if part)
+        self._respond(query)
+
+    def _respond(self, query):
+        cloud = self.server.cloud
+        if cloud.latency:
+            time.sleep(cloud.latency)
+        body = cloud.dispatch(query)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        if isinstance(body, str):
+            data = body.encode('utf8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in body:
+            data = chunk.encode('utf8')
+            if data:
+                self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class FakeCloudProcess(object):
+    """
+    Runs a FakeCloud with the default credentials in a child process, so
+    that generating responses does not compete with the code under test for
+    the interpreter lock.
+    """
+
+    def __init__(self, registrations=1000, host='127.0.0.1'):
+        self.registrations = registrations
+        self.host = host
+        self.appid = APPID
+        self.secret = SECRET
+        self.port = None
+        self._process = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d/EngineWebServices' % (self.host, self.port)
+
+    def service(self, **options):
+        return _service(self, options)
+
+    def start(self, timeout=30.0):
+        probe = socket.socket()
+        probe.bind((self.host, 0))
+        self.port = probe.getsockname()[1]
+        probe.close()
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', __name__, str(self.port),
+             str(self.registrations), self.host],
+            stdout=subprocess.PIPE)
+        # main prints one line once the server is listening.
+        self._process.stdout.readline()
+        if self._process.poll() is not None:
+            raise RuntimeError('the fake server exited with status %d' %
+                               self._process.returncode)
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(port=8080, registrations=1000, host='127.0.0.1'):
+    cloud = FakeCloud(registrations=int(registrations), port=int(port),
+                      host=host)
+    print('Serving %d registrations at %s (appid %s, secret %s)' % (
+        cloud.registrations, cloud.url, cloud.appid, cloud.secret))
+    sys.stdout.flush()
+    try:
+        cloud._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,103 @@
+"""
+Measures how long importing the library takes in a fresh interpreter, with
+python -X importtime, and fails if it is over budget or if one of the
+dependencies that should only be imported on first use was imported:
+
+    python -m scormcloud.benchmarks.importtime
+    python -m scormcloud.benchmarks.importtime --scale 2    # slower machine
+
+Each module is imported several times over in new processes and the fastest
+run counts. Bytecode is written by a first, uncounted run, so the times are
+those of an installed package rather than of compiling it.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+PACKAGE = __package__.rsplit('.', 1)[0]
+
+# Cumulative import time budgets in milliseconds.
+BUDGETS = (
+    (PACKAGE, 2.0),
+    (PACKAGE + '.client', 30.0),
+)
+
+# Modules that must not be imported until they are used.
+DEFERRED = ('requests', 'lxml.etree', 'xml.dom.minidom',
+            'xml.etree.ElementTree', 'http.cookiejar', 'cookielib',
+            'http.client', 'httplib', 'ssl', 'email.message', 'uuid',
+            'concurrent.futures', 'opentelemetry')
+
+
+def _run(args, timing=False):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    command = [sys.executable] + (['-X', 'importtime'] if timing else []) + \
+        args
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               universal_newlines=True)
+    out, err = process.communicate()
+    if process.returncode:
+        raise RuntimeError('%s failed:\n%s' % (' '.join(command), err))
+    return out, err
+
+
+def import_time(module):
+    """
+    Returns the cumulative time, in milliseconds, of importing module and
+    the packages it is in, from one -X importtime run.
+    """
+    err = _run(['-c', 'import ' + module], timing=True)[1]
+    total = 0
+    for line in err.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line.split('|')
+        name = fields[2][1:]
+        if name.startswith(' ') or not fields[1].strip().isdigit():
+            continue
+        if name == module or module.startswith(name + '.'):
+            total += int(fields[1])
+    return total / 1000.0
+
+
+def loaded_deferred(module):
+    """
+    Returns the DEFERRED modules that importing module loads and a bare
+    interpreter does not.
+    """
+    check = ('import sys; before = set(sys.modules); import %s; '
+             'print(" ".join(m for m in %r if m in sys.modules '
+             'and m not in before))' % (module, DEFERRED))
+    return _run(['-c', check])[0].split()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=7,
+                        help='imports per module; the fastest one counts')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiplies every budget')
+    options = parser.parse_args(argv)
+
+    failures = []
+    print('%-32s %10s %10s' % ('module', 'ms', 'budget'))
+    for (module, budget) in BUDGETS:
+        budget *= options.scale
+        _run(['-c', 'import ' + module])
+        elapsed = min(import_time(module) for _ in range(options.repeat))
+        print('%-32s %10.2f %10.2f' % (module, elapsed, budget))
+        if elapsed > budget:
+            failures.append('%s took %.2f ms to import (budget %.2f ms)' % (
+                module, elapsed, budget))
+        for name in loaded_deferred(module):
+            failures.append('importing %s imported %s' % (module, name))
+    for message in failures:
+        print('REGRESSION ' + message)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
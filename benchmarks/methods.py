@@ -0,0 +1,231 @@
+"""
+Per-method benchmarks against a local FakeCloud server.
+
+For each service method, measures calls per second, median and 99th
+percentile latency, the time spent parsing responses and the peak memory
+allocated by one call. The results are compared with the stored baselines
+and the run fails if any case regressed by more than the tolerance:
+
+    python -m scormcloud.benchmarks.methods
+    python -m scormcloud.benchmarks.methods --save    # record new baselines
+    python -m scormcloud.benchmarks.methods registration.getRegistrationList
+
+Baselines depend on the machine, so record them on the machine the
+comparison runs on before relying on the result.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tracemalloc
+from timeit import default_timer
+
+from .fakeserver import FakeCloudProcess
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'baselines.json')
+
+# Throughput and median latency must stay within the tolerance of the
+# baseline; the 99th percentile and peak memory are noisier and get twice
+# the tolerance.
+METRICS = (('calls_per_second', -1, 1), ('p50_ms', 1, 1), ('p99_ms', 1, 2),
+           ('peak_kb', 1, 2))
+
+
+class TimedParser(object):
+    """
+    Wraps a parser backend and adds up the time spent in parse.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.name = parser.name
+        self.elapsed = 0.0
+
+    def parse(self, raw):
+        started = default_timer()
+        try:
+            return self.parser.parse(raw)
+        finally:
+            self.elapsed += default_timer() - started
+
+    def stream(self, tags):
+        return self.parser.stream(tags)
+
+
+def _cases(list_size):
+    """
+    Returns (name, calls, setup) for each benchmark. setup takes the service
+    and returns a function of the call number that makes one call.
+    """
+    counter = itertools.count()
+
+    def course(fn):
+        return lambda service: (lambda i: fn(
+            service.get_course_service(), 'course-%d' % (i % 50)))
+
+    def registration(fn):
+        return lambda service: (lambda i: fn(
+            service.get_registration_service(), 'reg-%d' % (i % 1000)))
+
+    def create(service):
+        regsvc = service.get_registration_service()
+        return lambda i: regsvc.create_registration(
+            'bench-%d' % next(counter), 'course-%d' % (i % 50),
+            'bench-learner-%d' % i, 'Bench', 'Learner')
+
+    def registration_list(service):
+        regsvc = service.get_registration_service()
+        return lambda i: regsvc.get_registration_list(
+            courseIdFilterRegex='^course-%d$' % (i % 50))
+
+    def large_list(service):
+        return lambda i: service.get_registration_service() \
+            .get_registration_list()
+
+    def large_stream(service):
+        return lambda i: sum(1 for _ in service.get_registration_service()
+                             .iter_registrations())
+
+    return (
+        ('debug.authPing', 200,
+         lambda service: lambda i: service.get_debug_service().authping()),
+        ('course.exists', 200, course(lambda cs, c: cs.exists(c))),
+        ('course.getCourseList', 200,
+         lambda service: lambda i: service.get_course_service()
+         .get_course_list()),
+        ('course.getMetadata', 200, course(lambda cs, c: cs.get_metadata(c))),
+        ('course.getAttributes', 200,
+         course(lambda cs, c: cs.get_attributes(c))),
+        ('registration.exists', 200,
+         registration(lambda rs, r: rs.exists(r))),
+        ('registration.createRegistration', 200, create),
+        ('registration.getRegistrationResult[course]', 200,
+         registration(lambda rs, r: rs.get_registration_result(
+             r, 'course', parsed=True))),
+        ('registration.getRegistrationResult[full]', 100,
+         registration(lambda rs, r: rs.get_registration_result(
+             r, 'full', parsed=True).find_activity('sco-0'))),
+        ('registration.getRegistrationDetail', 200,
+         registration(lambda rs, r: rs.get_registration_detail(
+             r, parsed=True))),
+        ('registration.getLaunchHistory', 200,
+         registration(lambda rs, r: rs.get_launch_history(r, parsed=True))),
+        ('registration.getRegistrationList', 50, registration_list),
+        ('registration.getRegistrationList[%d]' % list_size, 1, large_list),
+        ('registration.iter_registrations[%d]' % list_size, 1,
+         large_stream),
+    )
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(service, call, calls, repeat=3):
+    """
+    Makes calls calls, repeat times over, and returns the metrics of the
+    case from the best round, as timeit does, to filter out noise from the
+    rest of the machine.
+    """
+    parser = service.parser
+    call(0)
+    rounds = []
+    for _ in range(repeat):
+        parser.elapsed = 0.0
+        latencies = []
+        started = default_timer()
+        for i in range(calls):
+            before = default_timer()
+            call(i)
+            latencies.append(default_timer() - before)
+        elapsed = default_timer() - started
+        latencies.sort()
+        rounds.append({'calls_per_second': calls / elapsed,
+                       'p50_ms': _percentile(latencies, 0.5) * 1000.0,
+                       'p99_ms': _percentile(latencies, 0.99) * 1000.0,
+                       'parse_ms': parser.elapsed * 1000.0 / calls})
+    tracemalloc.start()
+    call(calls)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    metrics = {'peak_kb': peak / 1024.0}
+    for name in rounds[0]:
+        best = max if name == 'calls_per_second' else min
+        metrics[name] = best(r[name] for r in rounds)
+    return metrics
+
+
+def compare(results, baselines, tolerance):
+    """
+    Returns a list of messages, one per metric that regressed beyond the
+    tolerance.
+    """
+    regressions = []
+    for (name, metrics) in sorted(results.items()):
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        for (metric, direction, scale) in METRICS:
+            old, new = baseline.get(metric), metrics[metric]
+            if not old:
+                continue
+            change = (new - old) / old * direction
+            if change > tolerance * scale:
+                regressions.append('%s: %s %.2f -> %.2f (%+.0f%%)' % (
+                    name, metric, old, new, change * 100 * direction))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('cases', nargs='*',
+                        help='names of the cases to run (default: all)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baselines')
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional regression (default 0.25)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='rounds per case; the best one counts')
+    parser.add_argument('--list-size', type=int, default=100000,
+                        help='registrations in the large list cases')
+    options = parser.parse_args(argv)
+
+    cases = [case for case in _cases(options.list_size)
+             if not options.cases or case[0] in options.cases]
+    results = {}
+    print('%-48s %10s %9s %9s %9s %10s' % ('method', 'calls/s', 'p50 ms',
+                                            'p99 ms', 'parse ms', 'peak KB'))
+    with FakeCloudProcess(options.list_size) as cloud:
+        service = cloud.service()
+        service.parser = TimedParser(service.parser)
+        for (name, calls, setup) in cases:
+            metrics = results[name] = measure(service, setup(service), calls,
+                                             options.repeat)
+            print('%-48s %10.1f %9.2f %9.2f %9.2f %10.1f' % (
+                name, metrics['calls_per_second'], metrics['p50_ms'],
+                metrics['p99_ms'], metrics['parse_ms'], metrics['peak_kb']))
+
+    baselines = {}
+    if os.path.exists(options.baselines):
+        with open(options.baselines) as f:
+            baselines = json.load(f)
+    if options.save:
+        for (name, metrics) in results.items():
+            baselines[name] = dict((metric, round(value, 3))
+                                   for (metric, value) in metrics.items())
+        with open(options.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Saved baselines to %s' % options.baselines)
+        return 0
+    regressions = compare(results, baselines, options.tolerance)
+    for message in regressions:
+        print('REGRESSION ' + message)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
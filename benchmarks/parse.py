@@ -0,0 +1,66 @@
+"""
+Compares the time and peak memory of parsing a large getRegistrationList
+response the way get_xml used to (minidom and lxml, both on every call)
+with each single-pass parser backend.
+"""
+import sys
+import time
+import tracemalloc
+from xml.dom import minidom
+
+from .. import parsing
+from ..client import RegistrationData
+
+
+def registration_list_payload(count):
+    parts = ['<?xml version="1.0" encoding="utf-8" ?>'
+             '<rsp stat="ok"><registrationlist>']
+    for i in range(count):
+        parts.append(
+            '<registration id="reg-%d" courseid="course-%d">'
+            '<appId>app</appId><registrationId>reg-%d</registrationId>'
+            '<courseId>course-%d</courseId><learnerId>learner-%d</learnerId>'
+            '<learnerFirstName>First</learnerFirstName>'
+            '<learnerLastName>Last</learnerLastName>'
+            '<createDate>2020-01-01T00:00:00.000+0000</createDate>'
+            '</registration>' % (i, i % 50, i, i % 50, i))
+    parts.append('</registrationlist></rsp>')
+    return ''.join(parts).encode('utf8')
+
+
+def legacy_parse(raw):
+    xmldoc = minidom.parseString(raw)
+    parsing.lxml_etree.XML(raw)
+    return xmldoc
+
+
+def measure(parse, raw):
+    started = time.time()
+    regs = RegistrationData.list_from_result(parse(raw))
+    elapsed = time.time() - started
+    del regs
+    # tracemalloc only sees memory allocated through Python, so the peak for
+    # lxml excludes the libxml2 tree itself.
+    tracemalloc.start()
+    regs = RegistrationData.list_from_result(parse(raw))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(regs)
+
+
+def main(count=50000):
+    raw = registration_list_payload(count)
+    candidates = [('minidom', parsing.MinidomParser().parse),
+                  ('etree', parsing.ElementTreeParser().parse)]
+    if parsing.lxml_etree is not None:
+        candidates.insert(0, ('legacy (minidom + lxml)', legacy_parse))
+        candidates.append(('lxml', parsing.LxmlParser().parse))
+    print('%d registrations, %.1f MB response' % (count, len(raw) / 1e6))
+    for name, parse in candidates:
+        elapsed, peak, found = measure(parse, raw)
+        print('%-24s %8.3f s %10.1f MB peak %8d records' %
+              (name, elapsed, peak / 1e6, found))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,101 @@
+"""
+Compares the memory held by many CourseData and RegistrationData records
+with the dictionary-backed classes they replaced, and the cost of building
+them from a parsed getCourseList response.
+"""
+import sys
+import time
+import tracemalloc
+
+from .. import parsing
+from ..client import CourseData, RegistrationData
+
+
+class LegacyCourseData(object):
+    courseId = ""
+    numberOfVersions = 1
+    numberOfRegistrations = 0
+    title = ""
+
+    def __init__(self, courseDataElement):
+        if courseDataElement is not None:
+            self.courseId = courseDataElement.attributes['id'].value
+            self.numberOfVersions = (courseDataElement.attributes['versions']
+                                     .value)
+            self.numberOfRegistrations = (courseDataElement
+                                          .attributes['registrations'].value)
+            self.title = courseDataElement.attributes['title'].value
+
+
+class LegacyRegistrationData(object):
+    courseId = ""
+    registrationId = ""
+
+    def __init__(self, regDataElement):
+        if regDataElement is not None:
+            self.courseId = regDataElement.attributes['courseid'].value
+            self.registrationId = regDataElement.attributes['id'].value
+
+
+def course_list_payload(count):
+    parts = ['<?xml version="1.0" encoding="utf-8" ?>'
+             '<rsp stat="ok"><courselist>']
+    for i in range(count):
+        parts.append('<course id="course-%d" title="Course %d" versions="%d" '
+                     'registrations="%d" />' % (i, i, i % 3, i * 7))
+    parts.append('</courselist></rsp>')
+    return ''.join(parts).encode('utf8')
+
+
+def registration_list_payload(count):
+    parts = ['<?xml version="1.0" encoding="utf-8" ?>'
+             '<rsp stat="ok"><registrationlist>']
+    for i in range(count):
+        parts.append('<registration id="reg-%d" courseid="course-%d" />' %
+                     (i, i % 50))
+    parts.append('</registrationlist></rsp>')
+    return ''.join(parts).encode('utf8')
+
+
+def measure(cls, elements):
+    started = time.time()
+    records = [cls(element) for element in elements]
+    elapsed = time.time() - started
+    del records
+    # The traced size includes the field values; the object size is what
+    # the record itself costs on top of them.
+    tracemalloc.start()
+    records = [cls(element) for element in elements]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    overhead = object_size(records[0])
+    del records
+    return elapsed, size, overhead
+
+
+def object_size(record):
+    size = sys.getsizeof(record)
+    if hasattr(record, '__dict__'):
+        size += sys.getsizeof(record.__dict__)
+    return size
+
+
+def main(count=200000):
+    parser = parsing.get_default_parser()
+    cases = [('course', course_list_payload,
+              [('legacy CourseData', LegacyCourseData),
+               ('CourseData', CourseData)]),
+             ('registration', registration_list_payload,
+              [('legacy RegistrationData', LegacyRegistrationData),
+               ('RegistrationData', RegistrationData)])]
+    print('%d records per class, %s parser' % (count, parser.name))
+    for (tag, payload, classes) in cases:
+        elements = parser.parse(payload(count)).getElementsByTagName(tag)
+        for (name, cls) in classes:
+            elapsed, size, overhead = measure(cls, elements)
+            print('%-24s %8.3f s %8.1f MB total %6d bytes/object' %
+                  (name, elapsed, size / 1e6, overhead))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
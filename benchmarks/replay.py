@@ -0,0 +1,87 @@
+"""
+Throughput of everything above the transport, from recorded traffic.
+
+Records the per-method benchmark cases against a local FakeCloud server
+into a cassette, then replays the same calls from the cassette with no
+network at all. Replayed numbers only measure signing, parsing and result
+building, so they are stable from run to run:
+
+    python -m scormcloud.benchmarks.replay
+    python -m scormcloud.benchmarks.replay --cassette cases.cassette
+    python -m scormcloud.benchmarks.replay --latency    # recorded timing
+
+An existing cassette given with --cassette is replayed without recording
+it again.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from ..cassette import CassettePlayer, CassetteRecorder
+from ..client import Configuration, ScormCloudService
+from .fakeserver import APPID, SECRET, FakeCloudProcess
+from .methods import TimedParser, _cases, measure
+
+
+def record(path, cases, list_size, repeat):
+    with FakeCloudProcess(list_size) as cloud:
+        with CassetteRecorder(path) as recorder:
+            service = cloud.service(transport=recorder)
+            service.parser = TimedParser(service.parser)
+            for (name, calls, setup) in cases:
+                measure(service, setup(service), calls, repeat)
+    return recorder.calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('cases', nargs='*',
+                        help='names of the cases to run (default: all)')
+    parser.add_argument('--cassette',
+                        help='the cassette to record to or replay')
+    parser.add_argument('--latency', action='store_true',
+                        help='replay with the recorded latencies')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='rounds per case; the best one counts')
+    parser.add_argument('--list-size', type=int, default=100000,
+                        help='registrations in the large list cases')
+    options = parser.parse_args(argv)
+
+    def cases():
+        # Fresh cases for each run, so that the calls that generate new ids
+        # generate the same ones when replayed.
+        return [case for case in _cases(options.list_size)
+                if not options.cases or case[0] in options.cases]
+
+    path = options.cassette
+    if path is None:
+        (handle, path) = tempfile.mkstemp(suffix='.cassette')
+        os.close(handle)
+    try:
+        if options.cassette is None or not os.path.exists(path):
+            calls = record(path, cases(), options.list_size, options.repeat)
+            print('Recorded %d calls, %.1f KB, to %s' % (
+                calls, os.path.getsize(path) / 1024.0, path))
+        print('%-48s %10s %9s %9s %9s %10s' % (
+            'method', 'calls/s', 'p50 ms', 'p99 ms', 'parse ms', 'peak KB'))
+        with CassettePlayer(path, options.latency) as player:
+            service = ScormCloudService(
+                Configuration(APPID, SECRET, 'http://replay.invalid/api'),
+                transport=player)
+            service.parser = TimedParser(service.parser)
+            for (name, calls, setup) in cases():
+                metrics = measure(service, setup(service), calls,
+                                  options.repeat)
+                print('%-48s %10.1f %9.2f %9.2f %9.2f %10.1f' % (
+                    name, metrics['calls_per_second'], metrics['p50_ms'],
+                    metrics['p99_ms'], metrics['parse_ms'],
+                    metrics['peak_kb']))
+    finally:
+        if options.cassette is None:
+            os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
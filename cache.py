@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Parameters added by signing. They differ on every call and never change the
+# result, so they are left out of cache keys.
+SIGNING_FIELDS = frozenset(['appid', 'origin', 'ts', 'applib', 'sig',
+                            'method'])
+
+# Seconds that the result of each read-only method stays cached. Only methods
+# listed here are cached.
+DEFAULT_TTLS = {
+    'rustici.course.exists': 60,
+    'rustici.course.getCourseList': 30,
+    'rustici.course.getMetadata': 300,
+    'rustici.course.getAttributes': 300,
+    'rustici.registration.exists': 60,
+    'rustici.invitation.getInvitationInfo': 60,
+}
+
+_REGISTRATION_WRITE = [('rustici.registration.', 'regid')]
+_REGISTRATION_COUNT = [('rustici.registration.', 'regid'),
+                       ('rustici.registration.getRegistrationList', None),
+                       ('rustici.course.getCourseList', None)]
+_COURSE_WRITE = [('rustici.course.', 'courseid'),
+                 ('rustici.course.getCourseList', None)]
+
+# The cached entries each write method makes stale, as (method prefix,
+# parameter) pairs: an entry is dropped if its method starts with the prefix
+# and it has the same value for the parameter as the write call. A parameter
+# of None drops every entry of the method.
+INVALIDATIONS = {
+    'rustici.course.importCourse': _COURSE_WRITE,
+    'rustici.course.importCourseAsync': _COURSE_WRITE,
+    'rustici.course.deleteCourse': _COURSE_WRITE,
+    'rustici.course.updateAttributes': _COURSE_WRITE,
+    'rustici.registration.createRegistration': _REGISTRATION_COUNT,
+    'rustici.registration.deleteRegistration': _REGISTRATION_COUNT,
+    'rustici.registration.resetRegistration': _REGISTRATION_WRITE,
+    'rustici.registration.resetGlobalObjectives': _REGISTRATION_WRITE,
+    'rustici.registration.updatePostbackInfo': _REGISTRATION_WRITE,
+    'rustici.invitation.createInvitation': [
+        ('rustici.invitation.getInvitationList', None)],
+    'rustici.invitation.createInvitationAsync': [
+        ('rustici.invitation.getInvitationList', None)],
+    'rustici.invitation.changeStatus': [
+        ('rustici.invitation.', 'invitationId')],
+}
+
+
+class ResponseCache(object):
+    """
+    Bounded, thread-safe LRU cache of parsed responses to read-only web
+    service methods, used by ScormCloudService when given one:
+
+        service = ScormCloudService(config, cache=ResponseCache())
+
+    Entries are keyed by application, method and call parameters, and expire
+    after the time to live of their method. Successful calls to write
+    methods such as deleteCourse or resetRegistration drop the entries they
+    make stale.
+
+    Cached results are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_entries=10000, ttls=None):
+        """
+        Arguments:
+        max_entries -- the maximum number of cached responses. The least
+            recently used entry is evicted when the cache is full
+        ttls -- (optional) a dictionary of method name to time to live in
+            seconds, replacing DEFAULT_TTLS. Methods not listed are not
+            cached
+        """
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return ('ResponseCache(entries=%d, hits=%d, misses=%d, '
+                'evictions=%d)' % (len(self), self.hits, self.misses,
+                                   self.evictions))
+
+    @property
+    def stats(self):
+        """
+        A dictionary of the cache counters.
+        """
+        return {'entries': len(self), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations}
+
+    def cacheable(self, method):
+        return method in self.ttls
+
+    @staticmethod
+    def key(appid, method, parameters):
+        """
+        Returns the cache key for a call, leaving out the signing fields.
+        """
+        return (appid, method, tuple(sorted(
+            (k, v) for (k, v) in parameters.items()
+            if k not in SIGNING_FIELDS)))
+
+    def get(self, key, default=None):
+        """
+        Returns the cached result for key, or default if there is none or it
+        has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[0] <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            # Move the entry to the most recently used end.
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """
+        Caches value under key for the time to live of the key's method.
+        """
+        ttl = self.ttls.get(key[1])
+        if not ttl:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, appid, method, parameters):
+        """
+        Drops the entries made stale by a successful call to method with
+        parameters. Does nothing for methods that are not writes.
+        """
+        rules = INVALIDATIONS.get(method)
+        if not rules:
+            return
+        with self._lock:
+            stale = []
+            for key in self._entries:
+                if key[0] != appid:
+                    continue
+                for (prefix, param) in rules:
+                    if not key[1].startswith(prefix):
+                        continue
+                    if param is None or (param in parameters and
+                                         (param, parameters[param]) in key[2]):
+                        stale.append(key)
+                        break
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,363 @@
+"""
+Record and replay of SCORM Cloud traffic.
+
+A CassetteRecorder is a transport that passes calls on to a real transport
+and writes every request and response to a cassette file. A
+CassettePlayer is a transport that answers calls from a cassette without
+touching the network:
+
+    recorder = CassetteRecorder('production.cassette')
+    service = ScormCloudService(config, transport=recorder)
+    ...     # run the integration against the real service
+    recorder.close()
+
+    player = CassettePlayer('production.cassette')
+    service = ScormCloudService(config, transport=player)
+    ...     # the same calls get the same responses, offline
+
+Every ServiceRequest of the service then goes through the cassette: the
+signing, retries, parsing and result building above the transport all run
+as usual.
+
+Calls are matched by HTTP method, by their query parameters other than the
+timestamp, signature and application credentials, and by their Range
+header and request body. A cassette recorded with one application
+therefore replays under another, at any time. A call made several times
+with the same parameters gets its recorded responses in order, starting
+over once they run out.
+
+By default the player serves responses as fast as they can be
+decompressed, which gives deterministic throughput benchmarks of
+everything above the transport. With latency=True, the player waits as
+long as the service took to send the headers and the body. A number
+scales the recorded times instead.
+
+A cassette starts with a magic line. Then come the distinct response
+bodies, each compressed with zlib, then a compressed JSON index of the
+calls, then the offset of the index. The player memory-maps the file and
+decompresses bodies as they are read, so neither large cassettes nor
+large streamed responses cost much memory.
+"""
+import datetime
+import hashlib
+import io
+import json
+import mmap
+import struct
+import threading
+import time
+import zlib
+from timeit import default_timer
+
+import six
+from six.moves import urllib
+
+from .errors import ScormCloudCassetteError
+from .lazy import LazyModule
+from .transport import get_default_transport
+
+requests = LazyModule('requests')
+
+MAGIC = b'SCORMCLOUD-CASSETTE 1\n'
+
+_TRAILER = struct.Struct('>Q')
+
+# Query parameters that differ from one call to the next, or between
+# applications, without changing the response.
+VOLATILE_PARAMETERS = frozenset(['ts', 'sig', 'appid', 'origin', 'applib'])
+
+# Response headers that describe the recorded connection or encoding rather
+# than the decoded body the player serves.
+_DROPPED_HEADERS = frozenset(['connection', 'content-encoding', 'date',
+                              'keep-alive', 'set-cookie',
+                              'transfer-encoding'])
+
+
+def call_key(method, url, data=None, headers=None):
+    """
+    Returns the key that a call is recorded and looked up under.
+
+    Arguments:
+    method -- the HTTP method
+    url -- the full, signed URL
+    data -- (optional) the request body. Only bodies given as bytes, text
+        or a dictionary are part of the key
+    headers -- (optional) the request headers
+    """
+    query = urllib.parse.urlsplit(url).query
+    params = sorted((name, value) for (name, value) in
+                    urllib.parse.parse_qsl(query, keep_blank_values=True)
+                    if name not in VOLATILE_PARAMETERS)
+    key = '%s %s' % (method, urllib.parse.urlencode(params))
+    if headers and headers.get('Range'):
+        key += ' range=' + headers['Range']
+    if isinstance(data, dict):
+        data = urllib.parse.urlencode(sorted(data.items()))
+    if isinstance(data, six.text_type):
+        data = data.encode('utf8')
+    if isinstance(data, bytes):
+        key += ' body=' + hashlib.sha1(data).hexdigest()
+    return key
+
+
+class CassetteRecorder(object):
+    """
+    Transport that sends calls through another transport and records them.
+    Responses are read in full before they are returned, streamed ones
+    included. HTTP error responses are recorded as well; calls that get no
+    response at all are not.
+
+    The cassette is only complete once close is called.
+    """
+
+    def __init__(self, path, transport=None, level=6):
+        """
+        Arguments:
+        path -- the cassette file to write
+        transport -- (optional) the transport that sends the calls. Defaults
+            to the process-wide pooled HttpTransport
+        level -- the zlib compression level of the response bodies
+        """
+        self.path = path
+        self.transport = transport or get_default_transport()
+        self.level = level
+        self.calls = 0
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._offset = len(MAGIC)
+        self._bodies = {}
+        self._index = []
+        self._lock = threading.Lock()
+
+    @property
+    def connect_timeout(self):
+        return self.transport.connect_timeout
+
+    @property
+    def read_timeout(self):
+        return self.transport.read_timeout
+
+    def request(self, method, url, data=None, files=None, headers=None,
+                stream=False, timeout=None, verify=None):
+        """
+        Sends the call through the wrapped transport, records the response
+        and returns a copy of it. Takes the same arguments as
+        HttpTransport.request.
+        """
+        key = call_key(method, url, data, headers)
+        started = default_timer()
+        try:
+            response = self.transport.request(
+                method, url, data=data, files=files, headers=headers,
+                stream=stream, timeout=timeout, verify=verify)
+        except requests.HTTPError as e:
+            if e.response is not None:
+                self._record(key, e.response, _body_of(e.response),
+                             default_timer() - started)
+            raise
+        try:
+            body = response.content
+        finally:
+            response.close()
+        (wait, headers) = self._record(key, response, body,
+                                       default_timer() - started)
+        return _response(url, response.status_code, headers,
+                         io.BytesIO(body), wait)
+
+    def _record(self, key, response, body, duration):
+        headers = _kept_headers(response.headers, body)
+        wait = duration
+        if getattr(response, 'elapsed', None) is not None:
+            wait = min(duration, response.elapsed.total_seconds())
+        digest = hashlib.sha1(body).digest()
+        with self._lock:
+            if self._file is None:
+                raise ScormCloudCassetteError('Cassette %s is closed' %
+                                              self.path)
+            stored = self._bodies.get(digest)
+            if stored is None:
+                compressed = zlib.compress(body, self.level)
+                self._file.write(compressed)
+                stored = self._bodies[digest] = (self._offset,
+                                                 len(compressed), len(body))
+                self._offset += len(compressed)
+            self._index.append((key, response.status_code, headers,
+                                round(wait, 6), round(duration, 6)) + stored)
+            self.calls += 1
+        return wait, headers
+
+    def close(self):
+        """
+        Writes the index of the recorded calls and closes the cassette.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            index = zlib.compress(json.dumps(self._index).encode('utf8'),
+                                  self.level)
+            self._file.write(index)
+            self._file.write(_TRAILER.pack(self._offset))
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CassettePlayer(object):
+    """
+    Transport that answers calls with the responses recorded in a cassette.
+    A call that was not recorded raises ScormCloudCassetteError. A player
+    may be shared between threads.
+    """
+    connect_timeout = 10
+    read_timeout = 120
+
+    def __init__(self, path, latency=False):
+        """
+        Arguments:
+        path -- the cassette file to replay
+        latency -- False to serve responses at once, True to take as long
+            as the recorded calls did, or a factor to scale the recorded
+            times by
+        """
+        self.path = path
+        self.latency = 1.0 if latency is True else float(latency or 0)
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC or \
+                len(self._map) < len(MAGIC) + _TRAILER.size:
+            self._map.close()
+            raise ScormCloudCassetteError('%s is not a cassette' % path)
+        end = len(self._map) - _TRAILER.size
+        offset = _TRAILER.unpack(self._map[end:])[0]
+        self._calls = {}
+        for call in json.loads(zlib.decompress(
+                self._map[offset:end]).decode('utf8')):
+            self._calls.setdefault(call[0], []).append(call)
+        self._played = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(calls) for calls in self._calls.values())
+
+    def request(self, method, url, data=None, files=None, headers=None,
+                stream=False, timeout=None, verify=None):
+        """
+        Returns the next recorded response to the call. Raises
+        requests.HTTPError for recorded HTTP error responses, as
+        HttpTransport does. Takes the same arguments as
+        HttpTransport.request.
+        """
+        key = call_key(method, url, data, headers)
+        calls = self._calls.get(key)
+        if not calls:
+            raise ScormCloudCassetteError('No recorded response for %s' % key)
+        with self._lock:
+            played = self._played.get(key, 0)
+            self._played[key] = played + 1
+        (_, status, headers, wait, duration, offset, length, size) = \
+            calls[played % len(calls)]
+        wait *= self.latency
+        transfer = max(0.0, duration * self.latency - wait)
+        if wait:
+            time.sleep(wait)
+        if transfer and not stream:
+            time.sleep(transfer)
+            transfer = 0.0
+        body = _Body(self._map, offset, length, size, transfer)
+        response = _response(url, status, headers, body, wait)
+        response.raise_for_status()
+        return response
+
+    def rewind(self):
+        """
+        Starts every call over from its first recorded response.
+        """
+        with self._lock:
+            self._played = {}
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _Body(object):
+    """
+    The raw stream of a replayed response. The body is decompressed as it
+    is read, so streaming a large response does not hold all of it in
+    memory. Reading takes the recorded transfer time, spread evenly over
+    the body.
+    """
+    feed_size = 65536
+
+    def __init__(self, data, offset, length, size, transfer):
+        self._data = data
+        self._position = offset
+        self._end = offset + length
+        self._inflater = zlib.decompressobj()
+        self._pending = b''
+        self._start = 0
+        self._delay = transfer / size if size else 0.0
+
+    def read(self, size=-1):
+        available = len(self._pending) - self._start
+        if (size is None or size < 0 or available < size) and \
+                self._position < self._end:
+            parts = [self._pending[self._start:]]
+            while (size is None or size < 0 or available < size) and \
+                    self._position < self._end:
+                feed = self._data[self._position:min(
+                    self._end, self._position + self.feed_size)]
+                self._position += len(feed)
+                parts.append(self._inflater.decompress(feed))
+                available += len(parts[-1])
+            self._pending = b''.join(parts)
+            self._start = 0
+        if size is None or size < 0:
+            size = available
+        chunk = self._pending[self._start:self._start + size]
+        self._start += len(chunk)
+        if chunk and self._delay:
+            time.sleep(len(chunk) * self._delay)
+        return chunk
+
+    def close(self):
+        pass
+
+
+def _response(url, status, headers, raw, wait):
+    response = requests.Response()
+    response.status_code = status
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    response.url = url
+    response.elapsed = datetime.timedelta(seconds=wait)
+    response.raw = raw
+    return response
+
+
+def _kept_headers(headers, body):
+    kept = dict((name, value) for (name, value) in headers.items()
+                if name.lower() not in _DROPPED_HEADERS)
+    if 'content-length' in (name.lower() for name in kept):
+        kept = dict((name, value) for (name, value) in kept.items()
+                    if name.lower() != 'content-length')
+        kept['Content-Length'] = str(len(body))
+    return kept
+
+
+def _body_of(response):
+    try:
+        return response.content or b''
+    except Exception:
+        # The body of a streamed error response is gone once it is closed.
+        return b''
+
@@ -1,24 +1,35 @@
-import cgi
 import datetime
 import logging
 import os
 import re
-import sys
-from six.moves import urllib
-import urllib2
-import ssl
-import uuid
-import requests
-from xml.dom import minidom
-import lxml.etree as etree
-import shutil
-import logging
-
-# Smartly import hashlib and fall back on md5
-try:
-    from hashlib import md5
-except ImportError:
-    from md5 import md5
+import time
+from timeit import default_timer
+
+import six
+
+from .batch import Batch
+from .cache import ResponseCache
+from .coalesce import Coalescer
+from .download import Downloader
+from .multipart import MultipartEncoder
+from .errors import (ScormCloudCircuitOpenError, ScormCloudConnectionError,
+                     ScormCloudError, ScormCloudHTTPError,
+                     ScormCloudServiceError, ScormCloudTimeoutError,
+                     ScormCloudTransportError)
+from .instrumentation import Instrumentation
+from .invitations import InvitationEngine, InvitationSummary
+from .lazy import LazyModule
+from .parsing import get_default_parser
+from .polling import ImportTracker
+from .ratelimit import THROTTLE_STATUSES
+from .records import Record, parse_bool, parse_int, parse_number
+from .results import LaunchInfo, RegistrationDetail, RegistrationResult
+from .retry import CircuitBreaker, RetryPolicy, transport_error
+from .signing import UrlSigner
+from .transport import HttpTransport, get_default_transport
+
+requests = LazyModule('requests')
+uuid = LazyModule('uuid')
 
 class Configuration(object):
     """
@@ -42,12 +53,44 @@ class ScormCloudService(object):
     service areas, like the RegistrationService.
     """
 
-    def __init__(self, configuration):
+    def __init__(self, configuration, transport=None, parser=None,
+                 retry_policy=None, circuit_breaker=None, cache=None,
+                 sinks=None, coalesce=None, rate_limiter=None):
+        """
+        Arguments:
+        configuration -- the Configuration for the SCORM Cloud application
+        transport -- (optional) the HttpTransport used to send requests. If
+            not provided, a process-wide pooled transport is shared
+        parser -- (optional) the XML parser backend for responses
+        retry_policy -- (optional) the RetryPolicy deciding which failed calls
+            are retried. Defaults to up to 3 attempts for idempotent methods
+        circuit_breaker -- (optional) a CircuitBreaker that makes calls fail
+            fast after repeated transport failures
+        cache -- (optional) a ResponseCache for the results of read-only
+            methods such as course.exists and course.getMetadata. Pass
+            True for a cache with the default settings
+        sinks -- (optional) instrumentation sinks, called with a CallEvent
+            after every call. See the instrumentation module
+        coalesce -- (optional) a Coalescer that lets concurrent identical
+            read-only calls share one request. Pass True for a Coalescer of
+            this service's own
+        rate_limiter -- (optional) a RateLimiter pacing the calls of this
+            service, shared with other services and processes as needed
+        """
         self.config = configuration
+        self.transport = transport or get_default_transport()
+        self.parser = parser or get_default_parser()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+        self.cache = ResponseCache() if cache is True else cache
+        self.instrumentation = Instrumentation(sinks) if sinks else None
+        self.coalescer = Coalescer() if coalesce is True else coalesce
+        self.rate_limiter = rate_limiter
+        self._signer = None
         self.__handler_cache = {}
 
     @classmethod
-    def withconfig(cls, config):
+    def withconfig(cls, config, transport=None):
         """
         Named constructor that creates a ScormCloudService with the specified
         Configuration object.
@@ -55,11 +98,13 @@ class ScormCloudService(object):
         Arguments:
         config -- the Configuration object holding the required configuration
             values for the SCORM Cloud API
+        transport -- (optional) the HttpTransport used to send requests. If
+            not provided, a process-wide pooled transport is shared
         """
-        return cls(config)
+        return cls(config, transport)
 
     @classmethod
-    def withargs(cls, appid, secret, serviceurl, origin):
+    def withargs(cls, appid, secret, serviceurl, origin, transport=None):
         """
         Named constructor that creates a ScormCloudService with the specified
         configuration values.
@@ -72,8 +117,40 @@ class ScormCloudService(object):
             example, http://cloud.scorm.com/EngineWebServices
         origin -- the origin string for the application software using the
             API/Python client library
+        transport -- (optional) the HttpTransport used to send requests. If
+            not provided, a process-wide pooled transport is shared
+        """
+        return cls(Configuration(appid, secret, serviceurl, origin), transport)
+
+    def add_sink(self, sink):
+        """
+        Attaches an instrumentation sink: a callable invoked with the
+        CallEvent of every subsequent call.
         """
-        return cls(Configuration(appid, secret, serviceurl, origin))
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation()
+        self.instrumentation.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        """
+        Detaches an instrumentation sink. Calls are no longer timed once the
+        last sink is removed.
+        """
+        if self.instrumentation is not None:
+            self.instrumentation.sinks.remove(sink)
+            if not self.instrumentation.sinks:
+                self.instrumentation = None
+
+    @property
+    def signer(self):
+        """
+        The UrlSigner for the current configuration, rebuilt whenever the
+        configuration changes.
+        """
+        signer = self._signer
+        if signer is None or not signer.matches(self.config):
+            signer = self._signer = UrlSigner(self.config)
+        return signer
 
     def get_course_service(self):
         """
@@ -130,6 +207,24 @@ class ScormCloudService(object):
         """
         return self.request().call_service(method)
 
+    def batch(self, max_workers=8, max_pending=None):
+        """
+        Returns a Batch that runs many calls concurrently on a thread pool.
+        For example:
+
+            regsvc = service.get_registration_service()
+            for result in service.batch(16).map(regsvc.exists, regids):
+                ...
+
+        Arguments:
+        max_workers -- the maximum number of calls running at once. The
+            service's transport should allow at least this many connections
+            per host
+        max_pending -- (optional) the maximum number of calls submitted but
+            not yet consumed by the caller
+        """
+        return Batch(max_workers, max_pending)
+
     def get_lrsaccount_service(self):
         return LrsAccountService(self)
 
@@ -184,13 +279,33 @@ class DispatchService(object):
 
     def get_destination_info(self, destinationid):
         request = self.service.request()
-        request.parameters['destinationid'] = dispatchid
+        request.parameters['destinationid'] = destinationid
 
         result = request.call_service('rustici.dispatch.getDestinationInfo')
 
         return result
 
-    def download_dispatches(self, dispatchid=None, tags=None, destinationid=None, courseid=None):
+    def download_dispatches(self, dispatchid=None, tags=None, destinationid=None, courseid=None,
+                            destination='dispatch.zip', **options):
+        """
+        Downloads a zip of the dispatch packages matching the given filters,
+        streaming it to destination in chunks so memory use stays bounded
+        however large the zip is. Returns a (path, size) tuple with the path
+        the zip was saved to (None when destination is a file object) and
+        its size in bytes.
+
+        Arguments:
+        dispatchid -- (optional) the dispatch to download
+        tags -- (optional) comma-delimited tags the dispatches must have
+        destinationid -- (optional) the destination whose dispatches to
+            download
+        courseid -- (optional) the course whose dispatches to download
+        destination -- the path to save the zip to, or a writable binary
+            file object. Paths are written to a temporary file and renamed
+            into place when complete. Defaults to dispatch.zip in the
+            current directory
+        options -- (optional) buffer_size and progress; see Downloader
+        """
         request = self.service.request()
         if dispatchid is not None:
             request.parameters['dispatchid'] = dispatchid
@@ -201,13 +316,31 @@ class DispatchService(object):
         if courseid is not None:
             request.parameters['courseid'] = courseid
 
-        url = request.construct_url('rustici.dispatch.downloadDispatches')
-        r = request.send_post(url, None)
+        downloader = Downloader(request, **options)
+        method = 'rustici.dispatch.downloadDispatches'
+        if hasattr(destination, 'write'):
+            return None, downloader.download_to(method, destination)
+        directory, filename = os.path.split(os.path.abspath(destination))
+        path = downloader.download(method, directory, filename)
+        return path, os.path.getsize(path)
 
-        with open("dispatch.zip", "w") as f:
-            f.write(r)
+    def download_dispatches_many(self, jobs, max_workers=4):
+        """
+        Runs several download_dispatches calls concurrently, for example one
+        per destination or tag set, each into its own file. Returns a list
+        of BatchResult objects in the order of jobs; the value of each
+        successful result is the (path, size) tuple from
+        download_dispatches.
 
-        return "success"
+        Arguments:
+        jobs -- an iterable of dictionaries of download_dispatches keyword
+            arguments, each with its own destination
+        max_workers -- the maximum number of downloads running at once
+        """
+        return self.service.batch(max_workers).run(self._download_job, jobs)
+
+    def _download_job(self, job):
+        return self.download_dispatches(**job)
 
 class ApplicationService(object):
     """
@@ -224,7 +357,7 @@ class ApplicationService(object):
         try:
             result = request.call_service('rustici.application.createApplication')
             result = ApplicationCallbackData.list_from_result(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed to create application')
 
         return result
@@ -236,7 +369,7 @@ class ApplicationService(object):
         try:
             result = request.call_service('rustici.application.getAppList')
             result = ApplicationCallbackData.list_from_list(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed to get list')
 
         return result
@@ -249,7 +382,7 @@ class ApplicationService(object):
         try:
             result = request.call_service('rustici.application.getAppInfo')
             result = ApplicationCallbackData.list_from_result(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed to get info')
 
         return result
@@ -264,7 +397,7 @@ class ApplicationService(object):
         try:
             result = request.call_service('rustici.application.updateApplication')
             result = ApplicationCallbackData.list_from_result(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed to update')
 
         return result
@@ -284,7 +417,7 @@ class LrsAccountService(object):
         try:
             result = request.call_service('rustici.lrsaccount.getAppLrsAuthCallbackUrl')
             lrs = LrsCallbackData.list_from_result(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed')
 
         return lrs
@@ -296,7 +429,7 @@ class LrsAccountService(object):
         try:
             result = request.call_service('rustici.lrsaccount.resetAppLrsAuthCallbackUrl')
             success = LrsCallbackData.get_success(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed')
 
         return success
@@ -309,7 +442,7 @@ class LrsAccountService(object):
         try:
             result = request.call_service('rustici.lrsaccount.setAppLrsAuthCallbackUrl');
             success = LrsCallbackData.get_success(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed')
 
         return success
@@ -326,7 +459,7 @@ class LrsAccountService(object):
         try:
             result = request.call_service('rustici.lrsaccount.editActivityProvider')
             success = ActivityProviderCallbackData.activity_provider_from_result(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed')
 
         return success
@@ -338,7 +471,7 @@ class LrsAccountService(object):
         try:
             result = request.call_service('rustici.lrsaccount.listActivityProviders')
             success = ActivityProviderCallbackData.activity_providers_from_result(result)
-        except urllib.error.HTTPError:
+        except ScormCloudHTTPError:
             logging.exception('failed')
         except KeyError:
             logging.exception('key error fail')
@@ -359,19 +492,7 @@ class UploadService(object):
         file.
         """
         xmldoc = self.service.make_call('rustici.upload.getUploadToken')
-        serverNodes = xmldoc.getElementsByTagName('server')
-        tokenidNodes = xmldoc.getElementsByTagName('id')
-        server = None
-        for s in serverNodes:
-            server = s.childNodes[0].nodeValue
-        tokenid = None
-        for t in tokenidNodes:
-            tokenid = t.childNodes[0].nodeValue
-        if server and tokenid:
-            token = UploadToken(server,tokenid)
-            return token
-        else:
-            return None
+        return UploadToken.result_from_xmldoc(xmldoc)
 
     def get_upload_url(self, callbackurl):
         """
@@ -420,28 +541,54 @@ class CourseService(object):
 
         return result
 
-    def import_course(self, courseid, file_handle):
+    def import_course(self, courseid, file_handle, **options):
+        """
+        Uploads and imports a SCORM PIF (zip file). The file is streamed from
+        file_handle while it is sent, so memory use does not grow with the
+        size of the package. Returns a list of ImportResult objects.
+
+        Arguments:
+        courseid -- the unique identifier for the course
+        file_handle -- the open binary file to upload
+        options -- (optional) chunk_size, progress and max_bytes_per_second;
+            see MultipartEncoder
+        """
         request = self.service.request()
         request.parameters['courseid'] = courseid
 
-        files = { 'file': file_handle }
-
         url = request.construct_url('rustici.course.importCourse')
-        res = requests.post(url, files=files)
+        res = self._upload(request, url, file_handle, options)
 
         xmldoc = request.get_xml(res.content)
         return ImportResult.list_from_result(xmldoc)
 
-    def import_course_async(self, courseid, file_handle):
+    def import_course_async(self, courseid, file_handle, **options):
+        """
+        Uploads a SCORM PIF (zip file) and starts importing it in the
+        background. Returns the token to pass to get_async_import_result.
+        Takes the same arguments as import_course.
+        """
         request = self.service.request()
         request.parameters['courseid'] = courseid
 
-        files = { 'file': file_handle }
-
         url = request.construct_url('rustici.course.importCourseAsync')
-        res = requests.post(url, files=files)
+        res = self._upload(request, url, file_handle, options)
 
         xmldoc = request.get_xml(res.content)
+        return self._token_from_result(xmldoc)
+
+    @staticmethod
+    def _upload(request, url, file_handle, options):
+        body = MultipartEncoder(files=[('file', file_handle, None, None)],
+                                **options)
+        headers = {'Content-Type': body.content_type}
+        if body.length is None:
+            # Unknown size: send with chunked transfer encoding.
+            return request.send(url, iter(body), headers=headers)
+        return request.send(url, body, headers=headers)
+
+    @staticmethod
+    def _token_from_result(xmldoc):
         return xmldoc.getElementsByTagName('id')[0].childNodes[0].nodeValue
 
     def get_async_import_result(self, token):
@@ -449,11 +596,22 @@ class CourseService(object):
         request.parameters['token'] = token
 
         url = request.construct_url('rustici.course.getAsyncImportResult')
-        res = requests.post(url)
+        res = request.send(url, http_method='POST')
 
         xmldoc = request.get_xml(res.content)
         return AsyncImportResult.result_from_xmldoc(xmldoc)
 
+    def import_tracker(self, **options):
+        """
+        Returns an ImportTracker that polls the results of many
+        import_course_async tokens on one background scheduler.
+
+        Arguments:
+        options -- (optional) max_polls_per_second, min_interval,
+            max_interval and max_errors; see ImportTracker
+        """
+        return ImportTracker(self, **options)
+
     def import_uploaded_course(self, courseid, path):
         """
         Imports a SCORM PIF (zip file) from an existing zip file on the SCORM
@@ -466,9 +624,8 @@ class CourseService(object):
         request = self.service.request()
         request.parameters['courseid'] = courseid
         request.parameters['path'] = path
-        result = request.call_service('rustici.course.importCourse')
-        ir = ImportResult.list_from_result(result)
-        return ir
+        return request.call_service('rustici.course.importCourse',
+                                    build=ImportResult.list_from_result)
 
     def delete_course(self, courseid):
         """
@@ -481,7 +638,7 @@ class CourseService(object):
         request.parameters['courseid'] = courseid
         return request.call_service('rustici.course.deleteCourse')
 
-    def get_assets(self, courseid, pathToSave, path=None):
+    def get_assets(self, courseid, pathToSave, path=None, **options):
         """
         Downloads a file from a course by path. If no path is provided, all the
         course files will be downloaded contained in a zip file.
@@ -492,12 +649,17 @@ class CourseService(object):
             If not provided or is None, the file will be saved at the location of this file.
         path -- the path (relative to the course root) of the file to download.
             If not provided or is None, all course files will be downloaded.
+        options -- (optional) download options such as buffer_size, segments
+            and progress; see ServiceRequest.download_file
+
+        Returns the path to the downloaded file.
         """
         request = self.service.request()
         request.parameters['courseid'] = courseid
         if (path is not None):
             request.parameters['path'] = path
-        request.download_file('rustici.course.getAssets', pathToSave)
+        return request.download_file('rustici.course.getAssets', pathToSave,
+                                     **options)
 
     def get_course_list(self, courseIdFilterRegex=None):
         """
@@ -511,9 +673,25 @@ class CourseService(object):
         request = self.service.request()
         if courseIdFilterRegex is not None:
             request.parameters['filter'] = courseIdFilterRegex
-        result = request.call_service('rustici.course.getCourseList')
-        courses = CourseData.list_from_result(result)
-        return courses
+        return request.call_service('rustici.course.getCourseList',
+                                    build=CourseData.list_from_result)
+
+    def iter_courses(self, courseIdFilterRegex=None):
+        """
+        Like get_course_list, but yields the CourseData elements one at a
+        time while the response is still being received, so memory use stays
+        flat however many courses there are.
+
+        Arguments:
+        courseIdFilterRegex -- (optional) Regular expression to filter courses
+            by ID
+        """
+        request = self.service.request()
+        if courseIdFilterRegex is not None:
+            request.parameters['filter'] = courseIdFilterRegex
+        for course in request.iter_elements('rustici.course.getCourseList',
+                                            'course'):
+            yield CourseData(course)
 
     def get_preview_url(self, courseid, redirecturl, versionid=None, stylesheeturl=None):
         """
@@ -584,12 +762,7 @@ class CourseService(object):
         request = self.service.request()
         request.parameters['courseid'] = courseid
         xmldoc = request.call_service('rustici.course.getAttributes')
-
-        attrNodes = xmldoc.getElementsByTagName('attribute')
-        atts = {}
-        for an in attrNodes:
-            atts[an.attributes['name'].value] = an.attributes['value'].value
-        return atts
+        return self._attributes_from_result(xmldoc)
 
     def update_attributes(self, courseid, attributePairs):
         """
@@ -604,7 +777,10 @@ class CourseService(object):
         for (key, value) in attributePairs.items():
             request.parameters[key] = value
         xmldoc = request.call_service('rustici.course.updateAttributes')
+        return self._attributes_from_result(xmldoc)
 
+    @staticmethod
+    def _attributes_from_result(xmldoc):
         attrNodes = xmldoc.getElementsByTagName('attribute')
         atts = {}
         for an in attrNodes:
@@ -620,8 +796,8 @@ class PostbackService(object):
         request.parameters['appid'] = appid
         request.parameters['regid'] = regid
 
-        xmldoc = request.call_service('rustici.registration.getPostbackInfo')
-        pbd = PostbackData(xmldoc)
+        pbd = request.call_service('rustici.registration.getPostbackInfo',
+                                   build=PostbackData.result_from_xmldoc)
 
         logging.debug('postback registration id: %s', pbd.registrationId)
         
@@ -690,11 +866,15 @@ class RegistrationService(object):
         if postbackUrl is not None:
             request.parameters['postbackurl'] = postbackUrl
         xmldoc = request.call_service('rustici.registration.createRegistration')
+        self._check_created(xmldoc)
+        return regid
+
+    @staticmethod
+    def _check_created(xmldoc):
         successNodes = xmldoc.getElementsByTagName('success')
         if successNodes.length == 0:
             raise ScormCloudError("Create Registration failed.  " +
                                   xmldoc.err.attributes['msg'])
-        return regid
 
     def get_launch_url(self, regid, redirecturl, cssUrl=None, courseTags=None,
                        learnerTags=None, registrationTags=None):
@@ -714,18 +894,40 @@ class RegistrationService(object):
             launched registration
         """
         request = self.service.request()
-        request.parameters['regid'] = regid
-        request.parameters['redirecturl'] = redirecturl + '?regid=' + regid
+        request.parameters = self._launch_parameters(
+            regid, redirecturl, cssUrl, courseTags, learnerTags,
+            registrationTags)
+        url = request.construct_url('rustici.registration.launch')
+        return url
+
+    def get_launch_urls(self, regids, redirecturl, cssUrl=None,
+                        courseTags=None, learnerTags=None,
+                        registrationTags=None):
+        """
+        Gets the launch URLs for many registrations at once, in the same order
+        as regids. Takes the same arguments as get_launch_url, except for a
+        list of registration identifiers instead of a single one.
+        """
+        return self.service.signer.sign_many(
+            'rustici.registration.launch',
+            (self._launch_parameters(regid, redirecturl, cssUrl, courseTags,
+                                     learnerTags, registrationTags)
+             for regid in regids))
+
+    @staticmethod
+    def _launch_parameters(regid, redirecturl, cssUrl, courseTags,
+                           learnerTags, registrationTags):
+        parameters = {'regid': regid,
+                      'redirecturl': redirecturl + '?regid=' + regid}
         if cssUrl is not None:
-            request.parameters['cssurl'] = cssUrl
+            parameters['cssurl'] = cssUrl
         if courseTags is not None:
-            request.parameters['coursetags'] = courseTags
+            parameters['coursetags'] = courseTags
         if learnerTags is not None:
-            request.parameters['learnertags'] = learnerTags
+            parameters['learnertags'] = learnerTags
         if registrationTags is not None:
-            request.parameters['registrationTags'] = registrationTags
-        url = request.construct_url('rustici.registration.launch')
-        return url
+            parameters['registrationTags'] = registrationTags
+        return parameters
 
     def get_registration_list(self, regIdFilterRegex=None,
                               courseIdFilterRegex=None):
@@ -745,12 +947,33 @@ class RegistrationService(object):
         if courseIdFilterRegex is not None:
             request.parameters['coursefilter'] = courseIdFilterRegex
 
-        result = request.call_service(
-            'rustici.registration.getRegistrationList')
-        regs = RegistrationData.list_from_result(result)
-        return regs
+        return request.call_service(
+            'rustici.registration.getRegistrationList',
+            build=RegistrationData.list_from_result)
+
+    def iter_registrations(self, regIdFilterRegex=None,
+                           courseIdFilterRegex=None):
+        """
+        Like get_registration_list, but yields the RegistrationData elements
+        one at a time while the response is still being received, so memory
+        use stays flat however many registrations there are.
+
+        Arguments:
+        regIdFilterRegex -- (optional) the regular expression used to filter the
+            list by registration ID
+        courseIdFilterRegex -- (optional) the regular expression used to filter
+            the list by course ID
+        """
+        request = self.service.request()
+        if regIdFilterRegex is not None:
+            request.parameters['filter'] = regIdFilterRegex
+        if courseIdFilterRegex is not None:
+            request.parameters['coursefilter'] = courseIdFilterRegex
+        for reg in request.iter_elements(
+                'rustici.registration.getRegistrationList', 'registration'):
+            yield RegistrationData(reg)
 
-    def get_registration_result(self, regid, resultsformat):
+    def get_registration_result(self, regid, resultsformat, parsed=False):
         """
         Gets information about the specified registration.
 
@@ -758,14 +981,17 @@ class RegistrationService(object):
         regid -- the unique identifier for the registration
         resultsformat -- (optional) can be "course", "activity", or "full" to
             determine the level of detail returned. The default is "course"
+        parsed -- if True, return a lazily parsed RegistrationResult instead
+            of the XML document
         """
         request = self.service.request()
         request.parameters['regid'] = regid
         request.parameters['resultsformat'] = resultsformat
         return request.call_service(
-            'rustici.registration.getRegistrationResult')
+            'rustici.registration.getRegistrationResult',
+            build=RegistrationResult if parsed else None)
 
-    def get_registration_detail(self, regid):
+    def get_registration_detail(self, regid, parsed=False):
         """
         This method will return some detail for the registration specified with
         the given appid and registrationid, including information regarding
@@ -773,13 +999,16 @@ class RegistrationService(object):
 
         Arguments:
         regid -- the unique identifier for the registration
+        parsed -- if True, return a RegistrationDetail instead of the XML
+            document
         """
         request = self.service.request()
         request.parameters['regid'] = regid
         return request.call_service(
-            'rustici.registration.getRegistrationDetail')
+            'rustici.registration.getRegistrationDetail',
+            build=RegistrationDetail if parsed else None)
 
-    def get_launch_history(self, regid):
+    def get_launch_history(self, regid, parsed=False):
         """
         Retrieves a list of LaunchInfo objects describing each launch. These
         LaunchInfo objects do not contain the full launch history log; use
@@ -787,15 +1016,21 @@ class RegistrationService(object):
 
         Arguments:
         regid -- the unique identifier for the registration
+        parsed -- if True, return the list of LaunchInfo objects instead of
+            the XML document
         """
         request = self.service.request()
         request.parameters['regid'] = regid
-        return request.call_service('rustici.registration.getLaunchHistory')
+        return request.call_service(
+            'rustici.registration.getLaunchHistory',
+            build=LaunchInfo.list_from_result if parsed else None)
 
-    def get_launch_info(self, launchid):
+    def get_launch_info(self, launchid, parsed=False):
         request = self.service.request()
         request.parameters['launchid'] = launchid
-        return request.call_service('rustici.registration.getLaunchInfo')
+        return request.call_service(
+            'rustici.registration.getLaunchInfo',
+            build=LaunchInfo.result_from_xmldoc if parsed else None)
 
     def reset_registration(self, regid):
         """
@@ -851,7 +1086,22 @@ class InvitationService(object):
 
 
     def create_invitation(self,courseid,tags=None,publicInvitation='true',send='true',addresses=None,emailSubject=None,emailBody=None,creatingUserEmail=None,
-                          registrationCap=None,postbackUrl=None,authType=None,urlName=None,urlPass=None,resultsFormat=None,async=False):
+                          registrationCap=None,postbackUrl=None,authType=None,urlName=None,urlPass=None,resultsFormat=None,async_=False,
+                          **kwargs):
+        """
+        Creates an invitation to a course and returns the result document.
+        With async_=True the invitation is created in the background by
+        createInvitationAsync; follow it with get_invitation_status or an
+        InvitationEngine.
+
+        The async_ argument used to be named async, a reserved word since
+        Python 3.7. async= is still accepted as a keyword argument.
+        """
+        if 'async' in kwargs:
+            async_ = kwargs.pop('async')
+        if kwargs:
+            raise TypeError('create_invitation() got an unexpected keyword '
+                            'argument %r' % sorted(kwargs)[0])
         request = self.service.request()
 
         request.parameters['courseid'] = courseid
@@ -881,7 +1131,7 @@ class InvitationService(object):
         if tags is not None:
             request.parameters['tags'] = tags
 
-        if async:
+        if async_:
             data = request.call_service('rustici.invitation.createInvitationAsync')
         else:
             data = request.call_service('rustici.invitation.createInvitation')
@@ -903,13 +1153,62 @@ class InvitationService(object):
         data = request.call_service('rustici.invitation.getInvitationStatus')
         return data
 
-    def get_invitation_info(self, invitationId,detail=None):
+    def get_invitation_info(self, invitationId,detail=None,parsed=False):
+        """
+        Gets information about an invitation.
+
+        Arguments:
+        invitationId -- the identifier of the invitation
+        detail -- (optional) 'true' to include each learner's registration
+            report
+        parsed -- if True, return an InvitationSummary instead of the XML
+            document
+        """
         request = self.service.request()
         request.parameters['invitationId'] = invitationId
         if detail is not None:
             request.parameters['detail'] = detail
-        data = request.call_service('rustici.invitation.getInvitationInfo')
-        return data
+        return request.call_service(
+            'rustici.invitation.getInvitationInfo',
+            build=InvitationSummary.from_xmldoc if parsed else None)
+
+    def iter_invitation_info(self, invitationId, detail='true'):
+        """
+        Streams getInvitationInfo and returns an InvitationSummary, counting
+        the learner invitations as they arrive instead of building the whole
+        document.
+
+        Arguments:
+        invitationId -- the identifier of the invitation
+        detail -- 'true' (the default) to include each learner's
+            registration report in the counts
+        """
+        request = self.service.request()
+        request.parameters['invitationId'] = invitationId
+        if detail is not None:
+            request.parameters['detail'] = detail
+        return InvitationSummary.from_elements(request.iter_elements(
+            'rustici.invitation.getInvitationInfo',
+            ('userInvitation', 'invitationInfo')))
+
+    @staticmethod
+    def _id_from_result(xmldoc):
+        """
+        Returns the invitation id in the result of createInvitation or
+        createInvitationAsync.
+        """
+        return xmldoc.getElementsByTagName('id')[0].firstChild.nodeValue
+
+    def engine(self, **options):
+        """
+        Returns an InvitationEngine that creates, tracks and summarizes many
+        invitations concurrently.
+
+        Arguments:
+        options -- (optional) max_workers, max_polls_per_second,
+            min_interval, max_interval and max_errors; see InvitationEngine
+        """
+        return InvitationEngine(self, **options)
 
     def change_status(self, invitationId,enable,open=None):
         request = self.service.request()
@@ -937,12 +1236,11 @@ class ReportingService(object):
         reportUrl = (self._get_reportage_service_url() +
                      'Reportage/scormreports/api/getReportDate.php?appId=' +
                      self.service.config.appid)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        cloudsocket = urllib.request.urlopen(reportUrl, None, 2000, context=ctx)
-        reply = cloudsocket.read()
-        cloudsocket.close()
+        reply = self.service.transport.get(reportUrl, verify=False).text
+        return self._parse_reportage_date(reply)
+
+    @staticmethod
+    def _parse_reportage_date(reply):
         d = datetime.datetime
         return d.strptime(reply,"%Y-%m-%d %H:%M:%S")
 
@@ -964,6 +1262,10 @@ class ReportingService(object):
         request.parameters['navpermission'] = navperm
         request.parameters['admin'] = 'true' if allowadmin else 'false'
         xmldoc = request.call_service('rustici.reporting.getReportageAuth')
+        return self._auth_from_result(xmldoc)
+
+    @staticmethod
+    def _auth_from_result(xmldoc):
         token = xmldoc.getElementsByTagName('auth')
         if token.length > 0:
             return token[0].childNodes[0].nodeValue
@@ -1152,24 +1454,14 @@ class TagSettings(object):
         return tagUrlStr
 
 
-class ScormCloudError(Exception):
-    def __init__(self, msg, json=None):
-        self.msg = msg
-        self.json = json
-    def __str__(self):
-        return repr(self.msg)
+class AsyncImportResult(Record):
+    __slots__ = _fields = ('status', 'message', 'progress', 'import_results')
 
-class AsyncImportResult(object):
     def __init__(self, status, message, progress, import_results):
         self.status = status
         self.message = message
-        self.progress = progress
-        self.import_results = import_results
-
-    def __repr__(self):
-        return ("AsyncImportResult(status='{}', message='{}', progress='{}', " +
-                "import_results={})").format(self.status, self.message,
-                        self.progress, self.import_results)
+        self.progress = parse_number(progress)
+        self.import_results = tuple(import_results)
 
     @classmethod
     def result_from_xmldoc(cls, xmldoc):
@@ -1182,29 +1474,26 @@ class AsyncImportResult(object):
         return cls(status, message, progress, import_results)
 
 
-class ImportResult(object):
-    wasSuccessful = False
-    title = ""
-    message = ""
-    parserWarnings = []
+class ImportResult(Record):
+    __slots__ = _fields = ('wasSuccessful', 'title', 'message',
+                           'parserWarnings')
 
-    def __init__(self, importResultElement):
+    def __init__(self, importResultElement=None):
+        self.wasSuccessful = False
+        self.title = ""
+        self.message = ""
+        self.parserWarnings = ()
         if importResultElement is not None:
-            self.wasSuccessful = (importResultElement.attributes['successful']
-                                 .value == 'true')
+            self.wasSuccessful = parse_bool(
+                importResultElement.attributes['successful'].value)
             self.title = (importResultElement.getElementsByTagName("title")[0]
                          .childNodes[0].nodeValue)
             self.message = (importResultElement
                            .getElementsByTagName("message")[0]
                            .childNodes[0].nodeValue)
             xmlpw = importResultElement.getElementsByTagName("warning")
-            for pw in xmlpw:
-                self.parserWarnings.append(pw.childNodes[0].nodeValue)
-
-    def __repr__(self):
-        return ("ImportResult(wasSuccessful={}, title='{}', message='{}', " +
-                "parserWarnings={})").format(self.wasSuccessful, self.title,
-                        self.message, self.parserWarnings)
+            self.parserWarnings = tuple(pw.childNodes[0].nodeValue
+                                        for pw in xmlpw)
 
     @classmethod
     def list_from_result(cls, xmldoc):
@@ -1221,19 +1510,21 @@ class ImportResult(object):
             allResults.append(cls(ir))
         return allResults
 
-class CourseData(object):
-    courseId = ""
-    numberOfVersions = 1
-    numberOfRegistrations = 0
-    title = ""
+class CourseData(Record):
+    __slots__ = _fields = ('courseId', 'numberOfVersions',
+                           'numberOfRegistrations', 'title')
 
-    def __init__(self, courseDataElement):
+    def __init__(self, courseDataElement=None):
+        self.courseId = ""
+        self.numberOfVersions = 1
+        self.numberOfRegistrations = 0
+        self.title = ""
         if courseDataElement is not None:
             self.courseId = courseDataElement.attributes['id'].value
-            self.numberOfVersions = (courseDataElement.attributes['versions']
-                                    .value)
-            self.numberOfRegistrations = (courseDataElement
-                                        .attributes['registrations'].value)
+            self.numberOfVersions = parse_int(
+                courseDataElement.attributes['versions'].value, 1)
+            self.numberOfRegistrations = parse_int(
+                courseDataElement.attributes['registrations'].value, 0)
             self.title = courseDataElement.attributes['title'].value;
 
     @classmethod
@@ -1251,36 +1542,89 @@ class CourseData(object):
             allResults.append(cls(course))
         return allResults
 
-class UploadToken(object):
-    server = ""
-    tokenid = ""
+class UploadToken(Record):
+    __slots__ = _fields = ('server', 'tokenid')
+
     def __init__(self, server, tokenid):
         self.server = server
         self.tokenid = tokenid
 
-class PostbackData(object):
-    registrationId = ""
+    @classmethod
+    def result_from_xmldoc(cls, xmldoc):
+        """
+        Returns the UploadToken described by the result of
+        rustici.upload.getUploadToken, or None if it has no token.
+
+        Arguments:
+        xmldoc -- the raw result of the API method
+        """
+        serverNodes = xmldoc.getElementsByTagName('server')
+        tokenidNodes = xmldoc.getElementsByTagName('id')
+        server = None
+        for s in serverNodes:
+            server = s.childNodes[0].nodeValue
+        tokenid = None
+        for t in tokenidNodes:
+            tokenid = t.childNodes[0].nodeValue
+        if server and tokenid:
+            return cls(server, tokenid)
+        else:
+            return None
+
+class PostbackData(Record):
+    __slots__ = _fields = ('registrationId', 'url', 'login', 'password',
+                           'authtype', 'resultsformat')
+
+    def __init__(self, postbackInfoElement=None):
+        for name in self._fields:
+            setattr(self, name, "")
+        if postbackInfoElement is not None:
+            for (name, tag) in (('registrationId', 'id'), ('url', 'url'),
+                                ('login', 'login'), ('password', 'password'),
+                                ('authtype', 'authtype'),
+                                ('resultsformat', 'resultsformat')):
+                nodes = postbackInfoElement.getElementsByTagName(tag)
+                if nodes and nodes[0].firstChild is not None:
+                    setattr(self, name, nodes[0].firstChild.nodeValue)
+
+    def __repr__(self):
+        # Never show the password.
+        return 'PostbackData(registrationId=%r, url=%r, authtype=%r)' % (
+            self.registrationId, self.url, self.authtype)
+
+    @classmethod
+    def result_from_xmldoc(cls, xmldoc):
+        """
+        Returns the PostbackData described by the result of
+        rustici.registration.getPostbackInfo.
+
+        Arguments:
+        xmldoc -- the raw result of the API method
+        """
+        infos = xmldoc.getElementsByTagName("postbackinfo")
+        return cls(infos[0] if infos else None)
 
     @classmethod
     def list_from_result(cls, xmldoc):
         """
-        Returns a list of RegistrationData objects by parsing the result of an
-        API method that returns registration elements.
+        Returns a list of PostbackData objects by parsing the result of an
+        API method that returns postbackinfo elements.
 
         Arguments:
         data -- the raw result of the API method
         """
         allResults = [];
-        regs = xmldoc.getElementsByTagName("registration")
-        for reg in regs:
-            allResults.append(cls(reg))
+        infos = xmldoc.getElementsByTagName("postbackinfo")
+        for info in infos:
+            allResults.append(cls(info))
         return allResults
 
-class RegistrationData(object):
-    courseId = ""
-    registrationId = ""
+class RegistrationData(Record):
+    __slots__ = _fields = ('courseId', 'registrationId')
 
-    def __init__(self, regDataElement):
+    def __init__(self, regDataElement=None):
+        self.courseId = ""
+        self.registrationId = ""
         if regDataElement is not None:
             self.courseId = regDataElement.attributes['courseid'].value
             self.registrationId = regDataElement.attributes['id'].value
@@ -1352,17 +1696,21 @@ class ActivityProviderCallbackData(object):
 
         return ret
 
-class ActivityProviderData(object):
+class ActivityProviderData(Record):
+    __slots__ = _fields = ('id', 'allowedEndpoints', 'permissionsLevel')
+
     def __init__(self, id, allowedEndpoints, permissionsLevel):
         self.id = id
         self.allowedEndpoints = allowedEndpoints
         self.permissionsLevel = permissionsLevel
 
-class ApplicationCallbackData(object):
+class ApplicationCallbackData(Record):
+    __slots__ = _fields = ('lrsUrl',)
+
     success = False
-    lrsUrl = ""
 
-    def __init__(self, applicationDataElement):
+    def __init__(self, applicationDataElement=None):
+        self.lrsUrl = ""
         if applicationDataElement is not None:
             self.lrsUrl = applicationDataElement.childNodes[0].nodeValue
 
@@ -1424,7 +1772,9 @@ class ApplicationCallbackData(object):
 
         return ret
 
-class app_summary_data(object):
+class app_summary_data(Record):
+    __slots__ = _fields = ('appId', 'name')
+
     def __init__(self, appId, name):
         self.appId = appId
         self.name = name
@@ -1448,7 +1798,7 @@ class SuperUserData(object):
             for reg in li:
                 for s in reg.getElementsByTagName("applicationid"):
                     allResults.append(s.firstChild.nodeValue)
-        except urllib.error.HTTPError:
+        except IndexError:
             logging.exception('failed')
 
         if len(allResults) > 0:
@@ -1456,11 +1806,13 @@ class SuperUserData(object):
 
         return ret
 
-class LrsCallbackData(object):
+class LrsCallbackData(Record):
+    __slots__ = _fields = ('lrsUrl',)
+
     success = False
-    lrsUrl = ""
 
-    def __init__(self, lrsDataElement):
+    def __init__(self, lrsDataElement=None):
+        self.lrsUrl = ""
         if lrsDataElement is not None:
             #self.wasSuccessful = (importResultElement.attributes['successful']
             self.lrsUrl = lrsDataElement.childNodes[0].nodeValue
@@ -1510,8 +1862,12 @@ class ServiceRequest(object):
         self.service = service
         self.parameters = dict()
         self.file_ = None
+        self.method = None
+        self.deadline = None
+        self.attempts = 0
+        self.event = None
 
-    def call_service(self, method, serviceurl=None):
+    def call_service(self, method, serviceurl=None, build=None):
         """
         Calls the specified web service method using any parameters set on the
         ServiceRequest.
@@ -1521,40 +1877,170 @@ class ServiceRequest(object):
             For example: rustici.registration.createRegistration
         serviceurl -- (optional) used to override the service host URL for a
             single call
-        """
+        build -- (optional) a function that builds the result from the
+            parsed response, for example CourseData.list_from_result. Its
+            return value is returned instead of the document, and the time
+            it takes is reported to instrumentation sinks as model time
+        """
+        instrumentation = self.service.instrumentation
+        if instrumentation is None:
+            response = self._call(method, serviceurl)
+            return response if build is None else build(response)
+        self.event = event = instrumentation.start(method)
+        try:
+            response = self._call(method, serviceurl)
+            if build is not None:
+                started = default_timer()
+                response = build(response)
+                event.model = default_timer() - started
+        except Exception as e:
+            instrumentation.finish(event, e)
+            raise
+        finally:
+            self.event = None
+        instrumentation.finish(event)
+        return response
+
+    def _call(self, method, serviceurl=None):
+        key = self._cache_key(method, serviceurl)
+        if key is not None:
+            response = self.service.cache.get(key)
+            if self.event is not None:
+                self.event.cache = 'miss' if response is None else 'hit'
+            if response is not None:
+                return response
+        coalescer = self.service.coalescer
+        if coalescer is not None and coalescer.coalescable(method):
+            # Started here rather than in send, so that a call waiting for
+            # an identical one is held to its deadline too.
+            if self.deadline is None:
+                self.deadline = self.service.retry_policy.start()
+            return coalescer.do(
+                self._coalesce_key(method, serviceurl),
+                lambda: self._fetch(method, serviceurl, key), self.event,
+                self.deadline)
+        return self._fetch(method, serviceurl, key)
+
+    def _fetch(self, method, serviceurl, key):
         postparams = None
         #if self.file_ is not None:
             # TODO: Implement file upload
         url = self.construct_url(method, serviceurl)
         rawresponse = self.send_post(url, postparams)
+        if self.event is not None:
+            self.event.response_bytes = len(rawresponse)
         response = self.get_xml(rawresponse)
+        if key is not None:
+            self.service.cache.put(key, response)
         return response
 
+    def iter_elements(self, method, tag, serviceurl=None, chunk_size=65536):
+        """
+        Calls the specified web service method and yields the elements with
+        the given tag name as the response streams in, instead of parsing
+        the whole response first. Each element is a minidom-compatible
+        wrapper that is only valid until the next one is requested.
 
-    def download_file(self, method, pathToSave):
-      """
-      Calls the specified web service method using any parameters set on the
-      ServiceRequest.  Assumes that the resource returned is meant to be downloaded.
-      Returns the absolute path to the saved resource
-
-       Arguments:
-       method -- the full name of the web service method to call.
-           For example: rustici.registration.createRegistration
-       pathToSave -- the absolute path where the file should be saved once downloaded.
-      """
-      url = self.construct_url(method)
-      u = urllib2.urlopen(url)
-      filename = cgi.parse_header(u.headers.get("Content-Disposition"))[1]['filename']
-      if 'path' in self.parameters and self.parameters['path'] is not None:
-        filename = os.path.split(self.parameters['path'])[1]
-      filepath = os.path.join(pathToSave, filename)
-      with open(filepath, 'wb') as f:
-        while True:
-          buffer = u.read(8192)
-          if not buffer:
-            break
-          f.write(buffer)
-      return filepath
+        Arguments:
+        method -- the full name of the web service method to call
+        tag -- the tag name of the elements to yield, or a tuple of names
+        serviceurl -- (optional) used to override the service host URL for a
+            single call
+        chunk_size -- the number of bytes read from the network at a time
+        """
+        instrumentation = self.service.instrumentation
+        if instrumentation is not None:
+            self.event = event = instrumentation.start(method, 'stream')
+        error = None
+        try:
+            url = self.construct_url(method, serviceurl)
+            response = self.send(url, stream=True)
+            try:
+                stream = self.service.parser.stream(_stream_tags(tag))
+                chunks = response.iter_content(chunk_size)
+                if instrumentation is not None:
+                    chunks, stream = _timed_stream(chunks, stream, event)
+                for chunk in chunks:
+                    for element in stream.feed(chunk):
+                        self._check_element(element)
+                        yield element
+                for element in stream.close():
+                    self._check_element(element)
+                    yield element
+            except requests.RequestException as e:
+                raise transport_error(e)
+            finally:
+                response.close()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if instrumentation is not None:
+                self.event = None
+                instrumentation.finish(event, None if isinstance(
+                    error, GeneratorExit) else error)
+
+    @staticmethod
+    def _check_element(element):
+        if element.tagName == 'err':
+            raise ScormCloudServiceError(element.getAttribute('code'),
+                                         element.getAttribute('msg'))
+
+    def _cache_key(self, method, serviceurl=None):
+        """
+        Returns the response cache key for a call to method, or None if the
+        result of the call is not cached.
+        """
+        cache = self.service.cache
+        if cache is None or serviceurl is not None or \
+                not cache.cacheable(method):
+            return None
+        return cache.key(self.service.config.appid, method, self.parameters)
+
+    def _coalesce_key(self, method, serviceurl=None):
+        return (serviceurl,) + ResponseCache.key(self.service.config.appid,
+                                                 method, self.parameters)
+
+
+    def download_file(self, method, pathToSave, **options):
+        """
+        Calls the specified web service method using any parameters set on the
+        ServiceRequest.  Assumes that the resource returned is meant to be downloaded.
+        Returns the absolute path to the saved resource
+
+        The file is streamed to a temporary file and renamed into place when
+        complete; interrupted downloads resume where they stopped. See
+        Downloader for details.
+
+        Arguments:
+        method -- the full name of the web service method to call.
+            For example: rustici.registration.createRegistration
+        pathToSave -- the absolute path where the file should be saved once downloaded.
+        options -- (optional) buffer_size, segments, min_segment_size, resume
+            and progress, passed to the Downloader
+        """
+        filename = None
+        if 'path' in self.parameters and self.parameters['path'] is not None:
+            filename = os.path.split(self.parameters['path'])[1]
+        downloader = Downloader(self, **options)
+        instrumentation = self.service.instrumentation
+        if instrumentation is None:
+            return downloader.download(method, pathToSave, filename)
+        self.event = event = instrumentation.start(method, 'download')
+        try:
+            filepath = downloader.download(method, pathToSave, filename)
+        except Exception as e:
+            instrumentation.finish(event, e)
+            raise
+        finally:
+            self.event = None
+        event.response_bytes = os.path.getsize(filepath)
+        # Time not spent signing or waiting for headers went to reading and
+        # writing the body.
+        event.transfer = max(0.0, default_timer() - event._clock -
+                             event.sign - event.wait)
+        instrumentation.finish(event)
+        return filepath
 
     def construct_url(self, method, serviceurl=None):
         """
@@ -1566,19 +2052,15 @@ class ServiceRequest(object):
         serviceurl -- (optional) used to override the service host URL for a
             single call
         """
-        params = {'method': method}
-
-        #          'appid': self.service.config.appid,
-        #          'origin': self.service.config.origin,
-        #          'ts': datetime.datetime.utcnow().strftime('yyyyMMddHHmmss'),
-        #          'applib': 'python'}
-        for k, v in self.parameters.items():
-            params[k] = v
-        url = self.service.config.serviceurl
-        if serviceurl is not None:
-            url = serviceurl
-        url = (ScormCloudUtilities.clean_cloud_host_url(url) + '?' +
+        self.method = method
+        if self.event is not None:
+            started = default_timer()
+        params = dict(self.parameters)
+        params['method'] = method
+        url = (self.service.signer.base_url(serviceurl) + '?' +
                self._encode_and_sign(params))
+        if self.event is not None:
+            self.event.sign += default_timer() - started
         return url
 
     def get_xml(self, raw):
@@ -1589,25 +2071,142 @@ class ServiceRequest(object):
         Arguments:
         raw -- the raw response string from an API method call
         """
-        xmldoc = minidom.parseString(raw)
-        x = etree.XML(raw)
-        
+        if self.event is not None:
+            started = default_timer()
+            xmldoc = self.service.parser.parse(raw)
+            self.event.parse += default_timer() - started
+        else:
+            xmldoc = self.service.parser.parse(raw)
+
         if logging.root.isEnabledFor(logging.DEBUG):
-            logging.debug(etree.tostring(x, pretty_print=True).decode('utf8'))
+            logging.debug(xmldoc.toprettyxml())
 
         rsp = xmldoc.documentElement
         if rsp.attributes['stat'].value != 'ok':
-            err = rsp.firstChild
-            raise Exception('SCORM Cloud Error: %s - %s' %
-                            (err.attributes['code'].value,
-                             err.attributes['msg'].value))
+            err = rsp.getElementsByTagName('err')[0]
+            raise ScormCloudServiceError(err.attributes['code'].value,
+                                         err.attributes['msg'].value)
+        if self.service.cache is not None and self.method is not None:
+            self.service.cache.invalidate(self.service.config.appid,
+                                          self.method, self.parameters)
         return xmldoc
 
     def send_post(self, url, postparams):
-        cloudsocket = urllib.request.urlopen(url, postparams, 2000)
-        reply = cloudsocket.read()
-        cloudsocket.close()
-        return reply
+        """
+        Sends the request over the service's pooled transport and returns the
+        raw response body. As with urlopen, the request is sent as a GET when
+        there is no request body.
+
+        Arguments:
+        url -- the full, signed URL for the call
+        postparams -- the request body, or None
+        """
+        return self.send(url, postparams).content
+
+    def send(self, url, data=None, files=None, headers=None, stream=False,
+             http_method=None):
+        """
+        Sends the request over the service's transport, retrying failures as
+        allowed by the service's retry policy and circuit breaker, and
+        returns the requests Response. Raises a ScormCloudTransportError
+        subclass if the call fails for good.
+
+        Arguments:
+        url -- the full, signed URL for the call
+        data -- (optional) the request body
+        files -- (optional) files to send as a multipart body
+        headers -- (optional) extra request headers
+        stream -- if True, the response body is not read in advance. The
+            caller must close the response
+        http_method -- (optional) the HTTP method. Defaults to GET when there
+            is no request body and POST otherwise
+        """
+        service = self.service
+        policy = service.retry_policy
+        breaker = service.circuit_breaker
+        limiter = service.rate_limiter
+        if http_method is None:
+            http_method = 'GET' if data is None and files is None else 'POST'
+        if self.deadline is None:
+            self.deadline = policy.start()
+        self.attempts = 0
+        while True:
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                if limiter is not None:
+                    limiter.acquire(service.config.appid, self.method,
+                                    None if self.deadline is None else
+                                    self.deadline.remaining())
+                timeout = policy.timeout(service.transport, self.deadline)
+                self.attempts += 1
+                started = default_timer()
+                response = service.transport.request(
+                    http_method, url, data=data, files=files,
+                    headers=headers, stream=stream, timeout=timeout)
+            except requests.RequestException as e:
+                error = transport_error(e)
+                if self.event is not None:
+                    self._record_failure(started)
+                if breaker is not None:
+                    # An HTTP error response still shows that the service
+                    # is reachable.
+                    if error.retryable:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if limiter is not None and \
+                        getattr(error, 'status', None) in THROTTLE_STATUSES:
+                    limiter.record(service.config.appid, self.method,
+                                   throttled=True)
+                if not policy.should_retry(self.method, error, self.attempts):
+                    raise error
+                delay = policy.backoff(self.attempts)
+                if (self.deadline is not None and
+                        delay >= self.deadline.remaining()):
+                    raise error
+                logging.warning('%s failed (attempt %d), retrying in %.2fs: '
+                                '%s', self.method, self.attempts, delay, error)
+                time.sleep(delay)
+                continue
+            except BaseException:
+                if breaker is not None:
+                    breaker.release()
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            if limiter is not None:
+                limiter.record(service.config.appid, self.method,
+                               _header_latency(response, started))
+            if self.event is not None:
+                self._record_attempt(response, started, url, data)
+            return response
+
+    def _record_attempt(self, response, started, url, data):
+        """
+        Adds the timings of the successful attempt to the current event.
+        requests measures the time until the headers were parsed as
+        elapsed; the rest of the attempt went to reading the body, if it
+        was not streamed.
+        """
+        event = self.event
+        attempt = default_timer() - started
+        wait = _header_latency(response, started, attempt)
+        event.wait += wait
+        event.transfer += attempt - wait
+        event.retries = self.attempts - 1
+        event.request_bytes = len(url) + (len(data) if isinstance(
+            data, (bytes, six.text_type)) else 0)
+
+    def _record_failure(self, started):
+        """
+        Adds a failed attempt to the current event: its time counts as
+        waiting for the service, and the event's retries count the attempts
+        so far, so that calls that fail for good report them too.
+        """
+        event = self.event
+        event.wait += default_timer() - started
+        event.retries = self.attempts - 1
 
     def _encode_and_sign(self, dictionary):
         """
@@ -1617,21 +2216,67 @@ class ServiceRequest(object):
         Arguments:
         dictionary -- the dictionary containing the key/value parameter pairs
         """
-        dictionary['appid'] = self.service.config.appid
-        dictionary['origin'] = self.service.config.origin;
-        dictionary['ts'] = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
-        dictionary['applib'] = "python"
-        signing = ''
-        values = list()
-        secret = self.service.config.secret
-        for key in sorted(list(dictionary.keys()), key=str.lower):
-            signing += key + dictionary[key]
-            values.append(key + '=' + urllib.parse.quote_plus(dictionary[key]))
-
-        sig = md5(secret.encode('utf8') + signing.encode('utf8')).hexdigest()
-        values.append('sig=' + sig)
-
-        return '&'.join(values)
+        return self.service.signer.encode_and_sign(dictionary)
+
+
+def _header_latency(response, started, attempt=None):
+    """
+    Returns the seconds from sending an attempt until its response headers
+    arrived, as measured by requests, capped at the whole attempt.
+    """
+    if attempt is None:
+        attempt = default_timer() - started
+    if getattr(response, 'elapsed', None) is not None:
+        return min(attempt, response.elapsed.total_seconds())
+    return attempt
+
+
+def _timed_stream(chunks, stream, event):
+    """
+    Wraps the chunk iterator and ElementStream of iter_elements so that
+    reading the body counts as transfer time and feeding it to the parser
+    as parse time.
+    """
+    def timed_chunks():
+        iterator = iter(chunks)
+        while True:
+            started = default_timer()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                event.transfer += default_timer() - started
+                return
+            event.transfer += default_timer() - started
+            event.response_bytes += len(chunk)
+            yield chunk
+    return timed_chunks(), _TimedElementStream(stream, event)
+
+
+class _TimedElementStream(object):
+    # ElementStream parses each chunk as it is fed and only wraps the
+    # finished elements lazily, so timing feed and close is enough.
+
+    def __init__(self, stream, event):
+        self.stream = stream
+        self.event = event
+
+    def feed(self, data):
+        started = default_timer()
+        elements = self.stream.feed(data)
+        self.event.parse += default_timer() - started
+        return elements
+
+    def close(self):
+        started = default_timer()
+        elements = self.stream.close()
+        self.event.parse += default_timer() - started
+        return elements
+
+
+def _stream_tags(tag):
+    if isinstance(tag, tuple):
+        return tag + ('err',)
+    return (tag, 'err')
 
 
 class ScormCloudUtilities(object):
@@ -0,0 +1,140 @@
+"""
+Coalescing of concurrent identical calls.
+
+When a ScormCloudService is given a Coalescer, a read-only call made while
+an identical call (same application, service URL, method and parameters)
+is already in flight does not send a request of its own. It waits for the
+one in flight and gets the same parsed response:
+
+    service = ScormCloudService(config, coalesce=True)
+
+Only calls that overlap in time are coalesced; combine with a
+ResponseCache to also reuse results afterwards. Shared responses must not
+be modified by callers, as with cached ones.
+"""
+
+import threading
+
+from .errors import ScormCloudTimeoutError
+
+# Method name prefixes of the read-only methods, the only ones coalesced.
+READ_PREFIXES = ('get', 'exists', 'list')
+
+# Read methods whose every call returns something new, such as a token,
+# that callers must not share.
+UNSHARED_METHODS = frozenset([
+    'rustici.reporting.getReportageAuth',
+    'rustici.upload.getUploadToken',
+])
+
+
+def coalescable(method):
+    """
+    Returns True if concurrent calls to the web service method may share
+    one request.
+
+    Arguments:
+    method -- the full name of the web service method
+    """
+    if method in UNSHARED_METHODS:
+        return False
+    return method.rsplit('.', 1)[-1].startswith(READ_PREFIXES)
+
+
+class _Flight(object):
+    __slots__ = ('done', 'result', 'error', 'abandoned', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+        self.waiters = 0
+
+
+class Coalescer(object):
+    """
+    Shares in-flight calls between threads. A Coalescer may be shared by
+    several ScormCloudService objects; calls are only coalesced when their
+    keys match, and keys include the application id.
+    """
+
+    def __init__(self):
+        #: Calls that sent a request.
+        self.calls = 0
+        #: Calls that shared the request of another call.
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s(calls=%d, coalesced=%d, in_flight=%d)' % (
+            self.__class__.__name__, self.calls, self.coalesced,
+            len(self._flights))
+
+    @property
+    def stats(self):
+        """
+        A dictionary of the coalescing counters.
+        """
+        return {'calls': self.calls, 'coalesced': self.coalesced,
+                'in_flight': len(self._flights)}
+
+    coalescable = staticmethod(coalescable)
+
+    def do(self, key, fn, event=None, deadline=None):
+        """
+        Returns the result of fn, or the result of the call in flight under
+        the same key if there is one. If that call fails with an Exception,
+        the error is raised to every caller that shared it. If it is
+        interrupted by anything else, such as KeyboardInterrupt, the callers
+        that shared it make the call again themselves.
+
+        Arguments:
+        key -- the hashable key of the call
+        fn -- the function making the call, taking no arguments
+        event -- (optional) the CallEvent of the call, marked as coalesced
+            if the call shares another one
+        deadline -- (optional) the Deadline of the call. A call sharing
+            another raises ScormCloudTimeoutError if it expires first
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    self.calls += 1
+                    leader = True
+                else:
+                    flight.waiters += 1
+                    self.coalesced += 1
+                    leader = False
+            if event is not None:
+                event.coalesced = not leader
+            if leader:
+                break
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline.remaining())
+            if not flight.done.wait(timeout):
+                raise ScormCloudTimeoutError(
+                    'SCORM Cloud call deadline of %ss exceeded waiting for '
+                    'an identical call' % deadline.seconds)
+            if flight.abandoned:
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            flight.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
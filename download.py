@@ -0,0 +1,324 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+
+from .errors import ScormCloudError, ScormCloudHTTPError
+from .lazy import LazyModule
+from .retry import transport_error
+from .transport import filename_from_content_disposition
+
+requests = LazyModule('requests')
+
+_content_range = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+if hasattr(os, 'replace'):
+    _replace = os.replace
+else:
+    _replace = os.rename
+
+
+class Downloader(object):
+    """
+    Streams a file returned by a SCORM Cloud web service method to disk.
+
+    The body is written to a hidden .part file next to the destination and
+    renamed into place only once it is complete, so a partially downloaded
+    file never appears under its final name. If the download is interrupted,
+    either within this call or by the process dying, the next download of the
+    same resource resumes from the end of the .part file with an HTTP Range
+    request. The ETag or Last-Modified value of the response is kept next to
+    the .part file and sent back as If-Range, so that a resource that
+    changed in the meantime is downloaded again from the start instead of
+    being spliced onto the old part. A .part file left by another process
+    without such a validator is not resumed. Large files can optionally be
+    fetched as several ranges in parallel when the server supports it; a
+    range whose connection drops is retried from where it stopped.
+    """
+
+    def __init__(self, request, buffer_size=65536, segments=1,
+                 min_segment_size=8 * 1024 * 1024, resume=True, progress=None):
+        """
+        Arguments:
+        request -- the ServiceRequest holding the call's parameters
+        buffer_size -- the number of bytes read from the network at a time
+        segments -- the number of ranges to download in parallel when the
+            server advertises range support. 1 disables parallel download
+        min_segment_size -- parallel download is only used when every
+            segment would be at least this many bytes
+        resume -- if True, resume from an existing .part file instead of
+            starting over
+        progress -- (optional) callable invoked as progress(done, total)
+            after each buffer is written. total is None if the size is not
+            known
+        """
+        self.request = request
+        self.buffer_size = buffer_size
+        self.segments = segments
+        self.min_segment_size = min_segment_size
+        self.resume = resume
+        self.progress = progress
+        self._lock = threading.Lock()
+        self._done = 0
+        self._total = None
+
+    def download(self, method, directory, filename=None):
+        """
+        Downloads the resource returned by method into directory and returns
+        the path to the saved file.
+
+        Arguments:
+        method -- the full name of the web service method to call
+        directory -- the directory in which to save the file
+        filename -- (optional) the name to save the file under. Defaults to
+            the name given by the server in the Content-Disposition header
+        """
+        partpath = os.path.join(directory, self._part_name(method))
+        validatorpath = partpath[:-len('.part')] + '.validator'
+        offset = 0
+        validator = None
+        if self.resume and os.path.exists(partpath):
+            validator = _read_validator(validatorpath)
+            if validator is not None:
+                offset = os.path.getsize(partpath)
+        attempts = 0
+        policy = self.request.service.retry_policy
+        while True:
+            attempts += 1
+            try:
+                response = self._open(method, offset, validator=validator)
+            except ScormCloudHTTPError as e:
+                if e.status != 416 or not offset:
+                    raise
+                # The .part file is no shorter than the resource; it cannot
+                # be trusted, so start over.
+                offset = 0
+                continue
+            try:
+                if filename is None:
+                    filename = filename_from_content_disposition(
+                        response.headers.get('Content-Disposition'))
+                    if filename is None:
+                        raise ScormCloudError('The response to %s has no '
+                                              'filename' % method)
+                total = self._total_size(response, offset)
+                if offset and response.status_code == 206 and \
+                        validator is not None and \
+                        _validator(response) != validator:
+                    # The server ignored If-Range and the resource changed
+                    # since the .part file was started; fetch all of it.
+                    offset = 0
+                    validator = None
+                    continue
+                if offset and response.status_code != 206:
+                    # The server ignored the Range header, or the resource
+                    # changed; start over.
+                    offset = 0
+                if offset == 0:
+                    validator = _validator(response)
+                    _save_validator(validatorpath, validator)
+                self._total = total
+                self._done = offset
+                if (offset == 0 and self._can_split(response, total)):
+                    response.close()
+                    self._download_segments(method, partpath, total,
+                                            validator)
+                else:
+                    self._write(response, partpath, offset)
+            except requests.RequestException as e:
+                # Includes ChunkedEncodingError, raised when the connection
+                # drops in the middle of the body.
+                error = transport_error(e)
+                if not self.resume or not policy.should_retry(
+                        method, error, attempts):
+                    raise error
+                offset = os.path.getsize(partpath)
+                logging.warning('Download of %s interrupted at %d bytes, '
+                                'resuming: %s', method, offset, error)
+                continue
+            finally:
+                response.close()
+            break
+        if total is not None and os.path.getsize(partpath) != total:
+            raise ScormCloudError('Download of %s is incomplete: %d of %d '
+                                  'bytes' % (method,
+                                             os.path.getsize(partpath), total))
+        filepath = os.path.join(directory, filename)
+        _replace(partpath, filepath)
+        _save_validator(validatorpath, None)
+        return filepath
+
+    def download_to(self, method, fileobj):
+        """
+        Streams the resource returned by method into an open binary file
+        object and returns the number of bytes written. The data is written
+        as it arrives; there is no temporary file and no resume.
+
+        Arguments:
+        method -- the full name of the web service method to call
+        fileobj -- the writable binary file object
+        """
+        response = self._open(method, 0)
+        try:
+            self._total = self._total_size(response, 0)
+            self._done = 0
+            written = 0
+            for buffer in response.iter_content(self.buffer_size):
+                fileobj.write(buffer)
+                written += len(buffer)
+                self._advance(len(buffer))
+        except requests.RequestException as e:
+            raise transport_error(e)
+        finally:
+            response.close()
+        return written
+
+    def _part_name(self, method):
+        key = method + '&' + '&'.join(
+            '%s=%s' % item for item in sorted(self.request.parameters.items()))
+        return '.scormcloud-%s.part' % hashlib.sha1(
+            key.encode('utf8')).hexdigest()[:16]
+
+    def _open(self, method, start, end=None, validator=None, request=None):
+        headers = None
+        if start or end is not None:
+            headers = {'Range': 'bytes=%d-%s' % (
+                start, '' if end is None else end)}
+            if validator is not None:
+                headers['If-Range'] = validator
+        if request is None:
+            request = self.request
+        url = request.construct_url(method)
+        return request.send(url, headers=headers, stream=True)
+
+    def _segment_request(self):
+        """
+        Returns a ServiceRequest with the call's parameters for one segment,
+        so that segments do not share attempt counts or instrumentation.
+        """
+        request = self.request.service.request()
+        request.parameters = dict(self.request.parameters)
+        request.deadline = self.request.deadline
+        return request
+
+    @staticmethod
+    def _total_size(response, offset):
+        match = _content_range.match(response.headers.get('Content-Range', ''))
+        if response.status_code == 206 and match:
+            if match.group(3) != '*':
+                return int(match.group(3))
+            return None
+        length = response.headers.get('Content-Length')
+        if length is None or response.headers.get('Content-Encoding'):
+            return None
+        return int(length)
+
+    def _can_split(self, response, total):
+        return (self.segments > 1 and total is not None and
+                response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                and total >= self.segments * self.min_segment_size)
+
+    def _write(self, response, partpath, offset):
+        mode = 'ab' if offset else 'wb'
+        with open(partpath, mode) as f:
+            for buffer in response.iter_content(self.buffer_size):
+                f.write(buffer)
+                self._advance(len(buffer))
+
+    def _download_segments(self, method, partpath, total, validator=None):
+        with open(partpath, 'wb') as f:
+            f.truncate(total)
+        size = total // self.segments
+        bounds = [(i * size, total - 1 if i == self.segments - 1
+                   else (i + 1) * size - 1) for i in range(self.segments)]
+        errors = []
+        # The next byte to write of each segment.
+        positions = [start for (start, _) in bounds]
+        threads = [threading.Thread(target=self._download_segment,
+                                    args=(method, partpath, i, end,
+                                          validator, positions, errors))
+                   for (i, (_, end)) in enumerate(bounds)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            # Keep the part of the file that is complete from its start, so
+            # that the next download resumes from there.
+            complete = total
+            for (position, (_, end)) in zip(positions, bounds):
+                if position <= end:
+                    complete = position
+                    break
+            with open(partpath, 'r+b') as f:
+                f.truncate(complete)
+            raise errors[0]
+
+    def _download_segment(self, method, partpath, index, end, validator,
+                          positions, errors):
+        request = self._segment_request()
+        policy = request.service.retry_policy
+        attempts = 0
+        try:
+            while positions[index] <= end:
+                attempts += 1
+                response = self._open(method, positions[index], end,
+                                      validator, request)
+                try:
+                    if response.status_code != 206:
+                        raise ScormCloudError('Server ignored the range '
+                                              'request for %s' % method)
+                    with open(partpath, 'r+b') as f:
+                        f.seek(positions[index])
+                        for buffer in response.iter_content(self.buffer_size):
+                            f.write(buffer)
+                            positions[index] += len(buffer)
+                            self._advance(len(buffer))
+                except requests.RequestException as e:
+                    error = transport_error(e)
+                    if not policy.should_retry(method, error, attempts):
+                        raise error
+                    logging.warning('Segment of %s interrupted at byte %d, '
+                                    'resuming: %s', method, positions[index],
+                                    error)
+                finally:
+                    response.close()
+        except Exception as e:
+            errors.append(e)
+
+    def _advance(self, count):
+        if self.progress is None:
+            return
+        with self._lock:
+            self._done += count
+            done = self._done
+        self.progress(done, self._total)
+
+
+def _validator(response):
+    """
+    Returns the strong ETag of a response, or else its Last-Modified date,
+    for use in an If-Range header. Weak ETags cannot be used there.
+    """
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def _read_validator(path):
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+
+def _save_validator(path, validator):
+    if validator is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, 'w') as f:
+        f.write(validator)
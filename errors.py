@@ -0,0 +1,80 @@
+class ScormCloudError(Exception):
+    def __init__(self, msg, json=None):
+        self.msg = msg
+        self.json = json
+    def __str__(self):
+        return repr(self.msg)
+
+    #: Whether repeating the failed call might succeed.
+    retryable = False
+
+
+class ScormCloudServiceError(ScormCloudError):
+    """
+    The SCORM Cloud answered the call with an error response
+    (stat="fail"). The code attribute holds the service error code.
+    """
+
+    def __init__(self, code, message):
+        ScormCloudError.__init__(self, 'SCORM Cloud Error: %s - %s' %
+                                 (code, message))
+        self.code = code
+        self.message = message
+
+
+class ScormCloudTransportError(ScormCloudError):
+    """
+    The call did not get a usable response from the SCORM Cloud: the
+    connection failed or was reset, or the server returned an HTTP error
+    status. Transport errors are generally worth retrying.
+    """
+    retryable = True
+
+    def __init__(self, msg, cause=None):
+        ScormCloudError.__init__(self, msg)
+        self.cause = cause
+
+
+class ScormCloudConnectionError(ScormCloudTransportError):
+    """
+    The connection could not be established or was dropped mid-call.
+    """
+
+
+class ScormCloudTimeoutError(ScormCloudTransportError):
+    """
+    The call ran out of time, either waiting on the network or because its
+    deadline expired. The connect attribute is True when the request never
+    reached the server, so retrying is safe even for non-idempotent calls.
+    """
+
+    def __init__(self, msg, cause=None, connect=False):
+        ScormCloudTransportError.__init__(self, msg, cause)
+        self.connect = connect
+
+
+class ScormCloudHTTPError(ScormCloudTransportError):
+    """
+    The server answered with an HTTP error status, held in the status
+    attribute. Only throttling (429) and server-side (5xx) statuses are
+    retryable.
+    """
+
+    def __init__(self, msg, status, cause=None):
+        ScormCloudTransportError.__init__(self, msg, cause)
+        self.status = status
+        self.retryable = status == 429 or status >= 500
+
+
+class ScormCloudCircuitOpenError(ScormCloudError):
+    """
+    The call was refused without being sent because the circuit breaker is
+    open after repeated failures.
+    """
+
+
+class ScormCloudCassetteError(ScormCloudError):
+    """
+    A CassettePlayer has no recorded response for the call, or the cassette
+    file is not valid.
+    """
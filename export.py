@@ -0,0 +1,329 @@
+"""
+Bulk export of registration results to columnar files.
+
+    stats = export_results(service, 'results', format='parquet')
+
+Results are fetched concurrently, parsed straight into per-course column
+buffers and written out a row group at a time, partitioned by course into
+course_id=<id> directories, with every character of the id other than
+letters, digits, '.', '_' and '-' percent-escaped. At most row_group_size
+rows per course, and max_buffered_rows in all, are held in memory, and at
+most max_open_files files are open at once; a course whose file had to be
+closed continues in a new part-<n> file. CSV needs nothing beyond the
+standard library; Parquet and Arrow IPC need pyarrow.
+"""
+
+import array
+import collections
+import csv
+import logging
+import math
+import os
+import re
+import time
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import six
+
+from .records import Record, parse_number
+
+# (name, kind) of each exported column. Numeric columns are buffered in
+# arrays of doubles, with NaN for missing values.
+COLUMNS = (
+    ('registration_id', 'string'),
+    ('course_id', 'string'),
+    ('complete', 'string'),
+    ('success', 'string'),
+    ('score', 'double'),
+    ('total_seconds', 'double'),
+)
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+_duration = re.compile(r'^(\d+):(\d+):(\d+(?:\.\d*)?)$')
+_unsafe = re.compile(r'[^A-Za-z0-9._-]')
+
+
+class ExportStats(Record):
+    __slots__ = _fields = ('rows', 'errors', 'row_groups', 'files',
+                           'elapsed')
+
+    def __init__(self):
+        self.rows = 0
+        self.errors = 0
+        self.row_groups = 0
+        self.files = 0
+        self.elapsed = 0.0
+
+
+def partition_name(courseid):
+    """
+    Returns the name of the directory holding a course's results. The id is
+    percent-escaped, so that no two ids share a directory.
+    """
+    return 'course_id=' + _unsafe.sub(
+        lambda match: ''.join('%%%02X' % byte for byte in
+                              bytearray(match.group().encode('utf8'))),
+        courseid)
+
+
+def parse_seconds(value):
+    """
+    Returns a registration's total time in seconds, from either the plain
+    number of seconds of the course results format or the HHHH:MM:SS.SS
+    time of the activity formats, or None.
+    """
+    seconds = parse_number(value)
+    if seconds is not None:
+        return float(seconds)
+    match = _duration.match(value or '')
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600.0 + int(minutes) * 60.0 + float(seconds)
+
+
+class ColumnBuffer(object):
+    """
+    Accumulates rows column by column: strings in lists, numbers in arrays
+    of doubles.
+    """
+
+    def __init__(self):
+        self.columns = [array.array('d') if kind == 'double' else []
+                        for (_, kind) in COLUMNS]
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def append(self, row):
+        for (column, value) in zip(self.columns, row):
+            if isinstance(column, array.array):
+                column.append(float('nan') if value is None else value)
+            else:
+                column.append(value)
+
+
+class CsvPartitionWriter(object):
+    extension = 'csv'
+
+    def __init__(self, path):
+        if six.PY2:
+            self._file = open(path, 'wb')
+        else:
+            self._file = open(path, 'w', newline='', encoding='utf8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for (name, _) in COLUMNS])
+
+    def write(self, buffer):
+        rows = zip(*[[_csv_value(v) for v in column]
+                     if isinstance(column, array.array) else column
+                     for column in buffer.columns])
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+def _csv_value(value):
+    if math.isnan(value):
+        return ''
+    return repr(value)
+
+
+class ArrowPartitionWriter(object):
+    extension = 'arrow'
+
+    def __init__(self, path):
+        if pyarrow is None:
+            raise ImportError('Arrow and Parquet export require the pyarrow '
+                              'package')
+        self.schema = pyarrow.schema([
+            (name, pyarrow.float64() if kind == 'double' else pyarrow.string())
+            for (name, kind) in COLUMNS])
+        self._writer = self._open(path)
+
+    def _open(self, path):
+        return pyarrow.ipc.new_file(path, self.schema)
+
+    def _batch(self, buffer):
+        arrays = [pyarrow.array(column, type=field.type,
+                                from_pandas=isinstance(column, array.array))
+                  for (column, field) in zip(buffer.columns, self.schema)]
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def write(self, buffer):
+        self._writer.write_batch(self._batch(buffer))
+
+    def close(self):
+        self._writer.close()
+
+
+class ParquetPartitionWriter(ArrowPartitionWriter):
+    extension = 'parquet'
+
+    def _open(self, path):
+        return pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, buffer):
+        self._writer.write_table(
+            pyarrow.Table.from_batches([self._batch(buffer)]))
+
+
+_WRITERS = {'csv': CsvPartitionWriter, 'arrow': ArrowPartitionWriter,
+            'parquet': ParquetPartitionWriter}
+
+
+class ResultExporter(object):
+    """
+    Fetches registration results concurrently and writes them to
+    partitioned columnar files.
+    """
+
+    def __init__(self, service, directory, format='csv', resultsformat='course',
+                 max_workers=8, row_group_size=10000, max_open_files=64,
+                 max_buffered_rows=None):
+        """
+        Arguments:
+        service -- the ScormCloudService to export from
+        directory -- the output directory; one course_id=<id> subdirectory
+            is created per course
+        format -- 'csv', 'parquet' or 'arrow' (Arrow IPC file)
+        resultsformat -- the results format requested for each registration
+        max_workers -- the number of results fetched at once
+        row_group_size -- the number of rows buffered per course before they
+            are written out as one row group
+        max_open_files -- the number of partition files kept open at once.
+            When a course needs one more, the least recently written file is
+            closed and that course continues in a new part file
+        max_buffered_rows -- the number of rows buffered across all courses
+            before the largest buffers are written out early. Defaults to
+            ten row groups
+        """
+        if format not in _WRITERS:
+            raise ValueError('format must be one of %s' % ', '.join(FORMATS))
+        if format != 'csv' and pyarrow is None:
+            raise ImportError('%s export requires the pyarrow package' %
+                              format)
+        self.service = service
+        self.directory = directory
+        self.format = format
+        self.resultsformat = resultsformat
+        self.max_workers = max_workers
+        self.row_group_size = row_group_size
+        self.max_open_files = max_open_files
+        self.max_buffered_rows = (row_group_size * 10
+                                  if max_buffered_rows is None
+                                  else max_buffered_rows)
+        self._buffers = {}
+        self._buffered = 0
+        self._writers = collections.OrderedDict()
+        self._parts = {}
+
+    def export(self, registrations=None):
+        """
+        Exports the results of the given registrations, or of every
+        registration of the application, and returns an ExportStats.
+
+        Arguments:
+        registrations -- (optional) an iterable of RegistrationData. Defaults
+            to streaming the full registration list
+        """
+        stats = ExportStats()
+        started = time.time()
+        regsvc = self.service.get_registration_service()
+        if registrations is None:
+            registrations = regsvc.iter_registrations()
+        pairs = ((reg.registrationId, reg.courseId) for reg in registrations)
+        resultsformat = self.resultsformat
+
+        def fetch(pair):
+            return regsvc.get_registration_result(pair[0], resultsformat,
+                                                  parsed=True)
+
+        batch = self.service.batch(self.max_workers,
+                                   max_pending=self.max_workers * 4)
+        try:
+            for outcome in batch.map(fetch, pairs):
+                regid, courseid = outcome.args[0]
+                if not outcome.ok:
+                    stats.errors += 1
+                    logging.warning('export: could not fetch result for %s: '
+                                    '%s', regid, outcome.error)
+                    continue
+                result = outcome.value
+                self._append(courseid, (
+                    regid, courseid, result.complete, result.success,
+                    None if result.score is None else float(result.score),
+                    parse_seconds(result.totaltime)), stats)
+                stats.rows += 1
+            for courseid in list(self._buffers):
+                self._flush(courseid, stats)
+        finally:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers = collections.OrderedDict()
+            self._buffers = {}
+            self._buffered = 0
+            self._parts = {}
+        stats.elapsed = time.time() - started
+        return stats
+
+    def _append(self, courseid, row, stats):
+        buffer = self._buffers.get(courseid)
+        if buffer is None:
+            buffer = self._buffers[courseid] = ColumnBuffer()
+        buffer.append(row)
+        self._buffered += 1
+        if len(buffer) >= self.row_group_size:
+            self._flush(courseid, stats)
+        elif self._buffered >= self.max_buffered_rows:
+            # Write out the largest buffers until half the limit is free,
+            # so that many small courses do not trigger a flush per row.
+            for courseid in sorted(self._buffers, reverse=True,
+                                   key=lambda c: len(self._buffers[c])):
+                self._flush(courseid, stats)
+                if self._buffered <= self.max_buffered_rows // 2:
+                    break
+
+    def _flush(self, courseid, stats):
+        buffer = self._buffers.pop(courseid, None)
+        if buffer is None or not len(buffer):
+            return
+        self._buffered -= len(buffer)
+        # Re-inserting keeps the writers in least recently written order.
+        writer = self._writers.pop(courseid, None)
+        if writer is None:
+            writer = self._open(courseid, stats)
+        self._writers[courseid] = writer
+        writer.write(buffer)
+        stats.row_groups += 1
+
+    def _open(self, courseid, stats):
+        while self._writers and len(self._writers) >= self.max_open_files:
+            self._writers.popitem(last=False)[1].close()
+        cls = _WRITERS[self.format]
+        partition = os.path.join(self.directory, partition_name(courseid))
+        if not os.path.isdir(partition):
+            os.makedirs(partition)
+        part = self._parts.get(courseid, 0)
+        self._parts[courseid] = part + 1
+        stats.files += 1
+        return cls(os.path.join(partition, 'part-%d.%s' % (part,
+                                                          cls.extension)))
+
+
+def export_results(service, directory, format='csv', registrations=None,
+                   **options):
+    """
+    Exports registration results to partitioned files in directory and
+    returns an ExportStats. See ResultExporter for the options.
+    """
+    exporter = ResultExporter(service, directory, format, **options)
+    return exporter.export(registrations)
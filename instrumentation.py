@@ -0,0 +1,376 @@
+"""
+Per-call instrumentation.
+
+When sinks are attached to a ScormCloudService, every call_service,
+iter_elements and download_file call produces a CallEvent recording where
+its time went:
+
+    sign      building and signing the URL
+    wait      sending the request until the response headers arrived:
+              DNS, connect, TLS and server time of the attempt that
+              succeeded
+    transfer  reading the response body
+    parse     parsing the XML
+    model     building result objects from the parsed document
+
+together with the request and response sizes, the number of retries,
+whether the response cache was hit and whether the call was coalesced with
+an identical one. A sink is any callable taking the event:
+
+    histogram = HistogramSink()
+    service = ScormCloudService(config, sinks=[histogram])
+    ...
+    print(histogram.report())
+
+Sinks are called on the calling thread once the call is over, so they
+should be quick. Without sinks the request path only checks for them.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from timeit import default_timer
+
+from .records import Record
+
+PHASES = ('sign', 'wait', 'transfer', 'parse', 'model')
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class CallEvent(Record):
+    """
+    The timings and sizes of one call. Phase times are in seconds; a phase
+    that did not happen is 0. elapsed is the wall time of the whole call,
+    which also covers retry backoff and any time between phases.
+    """
+    _fields = ('method', 'kind', 'started', 'elapsed', 'sign', 'wait',
+               'transfer', 'parse', 'model', 'request_bytes',
+               'response_bytes', 'retries', 'cache', 'coalesced', 'error')
+    __slots__ = _fields + ('_clock',)
+
+    def __init__(self, method, kind='call'):
+        """
+        Arguments:
+        method -- the web service method called
+        kind -- 'call' for call_service, 'stream' for iter_elements or
+            'download' for download_file
+        """
+        self.method = method
+        self.kind = kind
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.sign = 0.0
+        self.wait = 0.0
+        self.transfer = 0.0
+        self.parse = 0.0
+        self.model = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        #: 'hit' or 'miss' for cacheable methods, None otherwise.
+        self.cache = None
+        #: Whether the call shared the request of an identical call in
+        #: flight instead of sending its own.
+        self.coalesced = False
+        #: The exception class name if the call failed.
+        self.error = None
+        self._clock = default_timer()
+
+    @property
+    def network(self):
+        return self.wait + self.transfer
+
+
+class Instrumentation(object):
+    """
+    The sinks of a service. Created by ScormCloudService when sinks are
+    given or added.
+    """
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    def start(self, method, kind='call'):
+        return CallEvent(method, kind)
+
+    def finish(self, event, error=None):
+        event.elapsed = default_timer() - event._clock
+        if error is not None:
+            event.error = error.__class__.__name__
+        for sink in self.sinks:
+            try:
+                sink(event)
+            except Exception:
+                logging.exception('instrumentation sink %r failed', sink)
+
+
+class Histogram(object):
+    """
+    Cumulative-bucket histogram of durations, as used by Prometheus.
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Returns an estimate of the given percentile, as a fraction between 0
+        and 1, interpolating linearly within the bucket it falls in.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for (i, count) in enumerate(self.counts):
+            upper = self.bounds[i] if i < len(self.bounds) else self.max
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+
+class MethodStats(object):
+    """
+    Everything a HistogramSink knows about one method.
+    """
+
+    def __init__(self, bounds):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.elapsed = Histogram(bounds)
+        self.phases = dict((phase, Histogram(bounds)) for phase in PHASES)
+
+    def add(self, event):
+        self.calls += 1
+        if event.error is not None:
+            self.errors += 1
+        self.retries += event.retries
+        if event.cache == 'hit':
+            self.cache_hits += 1
+        elif event.cache == 'miss':
+            self.cache_misses += 1
+        if event.coalesced:
+            self.coalesced += 1
+        self.request_bytes += event.request_bytes
+        self.response_bytes += event.response_bytes
+        self.elapsed.observe(event.elapsed)
+        if event.cache != 'hit' and not event.coalesced:
+            for phase in PHASES:
+                self.phases[phase].observe(getattr(event, phase))
+
+
+class HistogramSink(object):
+    """
+    Keeps latency histograms of each method and phase in memory, with
+    counters of calls, errors, retries, cache hits, coalesced calls and
+    bytes. Phase histograms leave out cache hits and coalesced calls, which
+    have no phases of their own.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.methods = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            stats = self.methods.get(event.method)
+            if stats is None:
+                stats = self.methods[event.method] = MethodStats(
+                    self.buckets)
+            stats.add(event)
+
+    def percentile(self, method, fraction, phase=None):
+        """
+        Returns the estimated percentile of a method's call time, or of one
+        of its phases, in seconds, or None if there were no calls.
+        """
+        with self._lock:
+            stats = self.methods.get(method)
+            if stats is None:
+                return None
+            histogram = stats.elapsed if phase is None else \
+                stats.phases[phase]
+            return histogram.percentile(fraction)
+
+    def clear(self):
+        with self._lock:
+            self.methods = {}
+
+    def report(self):
+        """
+        Returns a text table of the calls, median and 99th percentile time
+        and mean time per phase of each method, in milliseconds.
+        """
+        lines = ['%-44s %7s %6s %8s %8s' % ('method', 'calls', 'errors',
+                                            'p50', 'p99') +
+                 ''.join(' %8s' % phase for phase in PHASES)]
+        with self._lock:
+            for (method, stats) in sorted(self.methods.items()):
+                lines.append('%-44s %7d %6d %8.2f %8.2f' % (
+                    method, stats.calls, stats.errors,
+                    stats.elapsed.percentile(0.5) * 1000.0,
+                    stats.elapsed.percentile(0.99) * 1000.0) + ''.join(
+                        ' %8.2f' % ((stats.phases[phase].mean or 0) * 1000.0)
+                        for phase in PHASES))
+        return '\n'.join(lines)
+
+
+class PrometheusSink(HistogramSink):
+    """
+    A HistogramSink that renders its contents in the Prometheus/OpenMetrics
+    text format, for scraping from exposition() or the wsgi_app method.
+    """
+    content_type = ('application/openmetrics-text; version=1.0.0; '
+                    'charset=utf-8')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='scormcloud'):
+        HistogramSink.__init__(self, buckets)
+        self.prefix = prefix
+
+    def exposition(self):
+        """
+        Returns the metrics as OpenMetrics text.
+        """
+        p = self.prefix
+        lines = []
+        with self._lock:
+            methods = sorted(self.methods.items())
+            self._histogram(lines, p + '_call_seconds',
+                            'Wall time of SCORM Cloud calls.',
+                            [({'method': method}, stats.elapsed)
+                             for (method, stats) in methods])
+            self._histogram(lines, p + '_call_phase_seconds',
+                            'Time spent in each phase of SCORM Cloud calls.',
+                            [({'method': method, 'phase': phase},
+                              stats.phases[phase])
+                             for (method, stats) in methods
+                             for phase in PHASES])
+            for (name, help, field) in (
+                    ('calls', 'SCORM Cloud calls.', 'calls'),
+                    ('call_errors', 'Failed SCORM Cloud calls.', 'errors'),
+                    ('call_retries', 'Retried attempts of SCORM Cloud calls.',
+                     'retries'),
+                    ('cache_hits', 'Calls answered from the response cache.',
+                     'cache_hits'),
+                    ('cache_misses', 'Cacheable calls sent to the service.',
+                     'cache_misses'),
+                    ('coalesced_calls', 'Calls that shared the request of an '
+                     'identical call in flight.', 'coalesced'),
+                    ('request_bytes', 'Bytes sent to the service.',
+                     'request_bytes'),
+                    ('response_bytes', 'Bytes received from the service.',
+                     'response_bytes')):
+                lines.append('# TYPE %s_%s counter' % (p, name))
+                lines.append('# HELP %s_%s %s' % (p, name, help))
+                for (method, stats) in methods:
+                    lines.append('%s_%s_total{method="%s"} %d' % (
+                        p, name, _escape(method), getattr(stats, field)))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def _histogram(self, lines, name, help, series):
+        lines.append('# TYPE %s histogram' % name)
+        lines.append('# HELP %s %s' % (name, help))
+        for (labels, histogram) in series:
+            base = ','.join('%s="%s"' % (key, _escape(value))
+                            for (key, value) in sorted(labels.items()))
+            cumulative = 0
+            for (bound, count) in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%r"} %d' % (
+                    name, base, bound, cumulative))
+            lines.append('%s_bucket{%s,le="+Inf"} %d' % (
+                name, base, histogram.count))
+            lines.append('%s_sum{%s} %r' % (name, base, histogram.sum))
+            lines.append('%s_count{%s} %d' % (name, base, histogram.count))
+
+    def wsgi_app(self, environ, start_response):
+        """
+        A WSGI application serving the metrics.
+        """
+        body = self.exposition().encode('utf8')
+        start_response('200 OK', [('Content-Type', self.content_type),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+class OpenTelemetrySink(object):
+    """
+    Records each call as an OpenTelemetry client span named after the
+    method, with the phase times in milliseconds, sizes, retries and cache
+    result as attributes. Requires the opentelemetry-api package.
+    """
+
+    def __init__(self, tracer=None):
+        """
+        Arguments:
+        tracer -- (optional) the tracer to create spans with. Defaults to
+            the global tracer provider's tracer for this library
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError('OpenTelemetrySink requires the '
+                              'opentelemetry-api package')
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer('scormcloud')
+
+    def __call__(self, event):
+        started = int(event.started * 1e9)
+        attributes = {
+            'scormcloud.method': event.method,
+            'scormcloud.kind': event.kind,
+            'scormcloud.retries': event.retries,
+            'scormcloud.request_bytes': event.request_bytes,
+            'scormcloud.response_bytes': event.response_bytes,
+        }
+        for phase in PHASES:
+            attributes['scormcloud.%s_ms' % phase] = \
+                getattr(event, phase) * 1000.0
+        if event.cache is not None:
+            attributes['scormcloud.cache'] = event.cache
+        if event.coalesced:
+            attributes['scormcloud.coalesced'] = True
+        span = self.tracer.start_span(event.method,
+                                      kind=self._trace.SpanKind.CLIENT,
+                                      start_time=started,
+                                      attributes=attributes)
+        if event.error is not None:
+            trace = self._trace
+            span.set_status(trace.Status(trace.StatusCode.ERROR,
+                                         event.error))
+        span.end(end_time=started + int(event.elapsed * 1e9))
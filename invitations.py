@@ -0,0 +1,351 @@
+"""
+Concurrent invitation creation, tracking and summaries.
+
+    engine = service.get_invitation_service().engine(max_workers=8)
+    futures = engine.create_many([{'courseid': 'c1', 'addresses': ...}, ...])
+    invitation_ids = engine.wait(futures)
+    summaries, courses = engine.aggregate(invitation_ids)
+
+Invitations are created on a thread pool with createInvitationAsync, and the
+background jobs are all polled from one PollScheduler. Invitation info is
+streamed and reduced to counts as it arrives, so the detail of only a few
+invitations is in memory at any time.
+"""
+
+import logging
+import time
+
+from .batch import Batch
+from .errors import ScormCloudError
+from .polling import PollJob, PollScheduler
+from .records import Record, parse_bool, parse_number
+from .results import root_of
+
+
+class _Counts(Record):
+    """
+    Learner counters shared by invitation and course summaries.
+    """
+    __slots__ = ()
+
+    def _reset_counts(self):
+        self.invited = 0
+        self.started = 0
+        self.complete = 0
+        self.passed = 0
+        self.failed = 0
+        self.scored = 0
+        self.score_total = 0.0
+
+    @property
+    def mean_score(self):
+        """
+        The mean score of the learners that have one, or None.
+        """
+        if not self.scored:
+            return None
+        return self.score_total / self.scored
+
+    @property
+    def completion_rate(self):
+        if not self.invited:
+            return 0.0
+        return float(self.complete) / self.invited
+
+
+_COUNT_FIELDS = ('invited', 'started', 'complete', 'passed', 'failed',
+                 'scored', 'score_total')
+
+
+class InvitationSummary(_Counts):
+    """
+    The fields of one invitation from getInvitationInfo, with counts of its
+    learner invitations instead of the learner invitations themselves.
+    Learners' completion and success are only counted when the info was
+    requested with detail.
+    """
+    __slots__ = _fields = ((
+        'id', 'courseId', 'subject', 'url', 'public', 'allowLaunch',
+        'allowNewRegistrations', 'created', 'createdDate') + _COUNT_FIELDS)
+
+    def __init__(self):
+        self.id = None
+        self.courseId = None
+        self.subject = None
+        self.url = None
+        self.public = False
+        self.allowLaunch = False
+        self.allowNewRegistrations = False
+        self.created = False
+        self.createdDate = None
+        self._reset_counts()
+
+    def _add_user(self, element):
+        self.invited += 1
+        if parse_bool(_text(element, 'isStarted')):
+            self.started += 1
+        report = element.find('registrationreport')
+        if report is None:
+            return
+        if _text(report, 'complete') == 'complete':
+            self.complete += 1
+        success = _text(report, 'success')
+        if success == 'passed':
+            self.passed += 1
+        elif success == 'failed':
+            self.failed += 1
+        score = parse_number(_text(report, 'score'))
+        if score is not None:
+            self.scored += 1
+            self.score_total += score
+
+    def _set_info(self, element):
+        self.id = _text(element, 'id')
+        self.courseId = _text(element, 'courseId')
+        self.subject = _text(element, 'subject')
+        self.url = _text(element, 'url')
+        self.public = parse_bool(_text(element, 'public'))
+        self.allowLaunch = parse_bool(_text(element, 'allowLaunch'))
+        self.allowNewRegistrations = parse_bool(
+            _text(element, 'allowNewRegistrations'))
+        self.created = parse_bool(_text(element, 'created'))
+        self.createdDate = _text(element, 'createdDate')
+
+    @classmethod
+    def from_elements(cls, elements):
+        """
+        Builds a summary from a stream of userInvitation elements followed by
+        the invitationInfo element, as yielded by
+        ServiceRequest.iter_elements.
+        """
+        return cls._from_etree(wrapper.element for wrapper in elements)
+
+    @classmethod
+    def from_xmldoc(cls, xmldoc):
+        """
+        Builds a summary from a parsed getInvitationInfo result.
+        """
+        root = root_of(xmldoc)
+        elements = list(root.iter('userInvitation'))
+        elements.extend(root.iter('invitationInfo'))
+        return cls._from_etree(elements)
+
+    @classmethod
+    def _from_etree(cls, elements):
+        summary = cls()
+        for element in elements:
+            summary._add_element(element)
+        return summary
+
+    def _add_element(self, element):
+        if element.tag == 'userInvitation':
+            self._add_user(element)
+        elif element.tag == 'invitationInfo':
+            self._set_info(element)
+
+
+class CourseInvitations(_Counts):
+    """
+    Totals over the invitations to one course.
+    """
+    __slots__ = _fields = ('courseId', 'invitations') + _COUNT_FIELDS
+
+    def __init__(self, courseId):
+        self.courseId = courseId
+        self.invitations = 0
+        self._reset_counts()
+
+    def add(self, summary):
+        self.invitations += 1
+        for name in _COUNT_FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(summary, name))
+
+
+class InvitationJob(PollJob):
+    """
+    Tracks one invitation being created by createInvitationAsync. The
+    delay between polls doubles from min_interval up to max_interval.
+    """
+
+    def __init__(self, invitation_service, invitation_id, min_interval,
+                 max_interval, max_errors, callback=None):
+        PollJob.__init__(self, callback)
+        self.invitation_service = invitation_service
+        self.invitation_id = invitation_id
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_errors = max_errors
+        self.errors = 0
+        self.delay = min_interval
+        self.status = None
+
+    def poll(self):
+        try:
+            xmldoc = self.invitation_service.get_invitation_status(
+                self.invitation_id)
+        except ScormCloudError as e:
+            self.errors += 1
+            if not e.retryable or self.errors >= self.max_errors:
+                raise
+            return self._backoff()
+        self.errors = 0
+        nodes = xmldoc.getElementsByTagName('status')
+        self.status = (nodes[0].firstChild.nodeValue
+                       if nodes and nodes[0].firstChild is not None else None)
+        if self.status in ('complete', 'finished'):
+            self.resolve(self.invitation_id)
+            return None
+        if self.status == 'error':
+            self.fail(ScormCloudError(
+                'Invitation %s failed' % self.invitation_id))
+            return None
+        return self._backoff()
+
+    def _backoff(self):
+        delay = self.delay
+        self.delay = min(self.max_interval, self.delay * 2)
+        return delay
+
+
+class InvitationEngine(object):
+    """
+    Creates, tracks and summarizes many invitations at once. Normally
+    obtained from InvitationService.engine.
+    """
+
+    def __init__(self, invitation_service, max_workers=8,
+                 max_polls_per_second=5.0, min_interval=1.0,
+                 max_interval=30.0, max_errors=5):
+        """
+        Arguments:
+        invitation_service -- the InvitationService to use
+        max_workers -- the number of calls made at once when creating
+            invitations or fetching their info
+        max_polls_per_second -- the maximum rate of status polls across all
+            background creations
+        min_interval -- the first delay before polling a creation
+        max_interval -- the longest delay between two polls of a creation
+        max_errors -- the number of consecutive failed polls after which a
+            creation's future raises the last error
+        """
+        self.invitation_service = invitation_service
+        self.max_workers = max_workers
+        self.scheduler = PollScheduler(max_polls_per_second)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_errors = max_errors
+
+    def _batch(self):
+        return Batch(self.max_workers, max_pending=self.max_workers * 4)
+
+    def track(self, invitation_id, callback=None):
+        """
+        Starts polling the background creation of an invitation and returns
+        a Future resolving to the invitation id once it is complete.
+        """
+        job = InvitationJob(self.invitation_service, invitation_id,
+                            self.min_interval, self.max_interval,
+                            self.max_errors, callback)
+        return self.scheduler.add(job, self.min_interval)
+
+    def create_many(self, invitations):
+        """
+        Starts creating each invitation with createInvitationAsync and
+        returns one Future per invitation, in input order, resolving to its
+        id when the invitation is complete. A creation that could not be
+        started has a Future that raises its error.
+
+        Arguments:
+        invitations -- an iterable of dictionaries of create_invitation
+            keyword arguments
+        """
+        service = self.invitation_service
+
+        def start(arguments):
+            arguments = dict(arguments)
+            arguments['async_'] = True
+            return service._id_from_result(
+                service.create_invitation(**arguments))
+
+        futures = []
+        for outcome in self._batch().run(start, invitations):
+            if outcome.ok:
+                futures.append(self.track(outcome.value))
+            else:
+                job = PollJob()
+                job.fail(outcome.error)
+                futures.append(job.future)
+        return futures
+
+    def wait(self, futures, timeout=None):
+        """
+        Waits for the given creations and returns their invitation ids in
+        order. Raises the first error, in order.
+
+        Arguments:
+        futures -- the futures returned by create_many or track
+        timeout -- (optional) the maximum number of seconds to wait in total
+        """
+        expires = None if timeout is None else time.time() + timeout
+        ids = []
+        for future in futures:
+            remaining = None if expires is None else max(0, expires -
+                                                         time.time())
+            ids.append(future.result(remaining))
+        return ids
+
+    def summaries(self, invitation_ids, detail='true', failures=None):
+        """
+        Fetches the info of every invitation concurrently and yields an
+        InvitationSummary for each one as it completes. Invitations whose
+        info could not be fetched are logged and left out, and added to
+        failures if it is given.
+
+        Arguments:
+        invitation_ids -- an iterable of invitation ids
+        detail -- 'true' to count learners' completion and success
+        failures -- (optional) a dictionary that receives the error of each
+            invitation whose info could not be fetched, by invitation id
+        """
+        service = self.invitation_service
+        for outcome in self._batch().map(service.iter_invitation_info,
+                                         invitation_ids, detail=detail):
+            if outcome.ok:
+                yield outcome.value
+                continue
+            invitation_id = outcome.args[0]
+            logging.warning('could not fetch the info of invitation %s: %s',
+                            invitation_id, outcome.error)
+            if failures is not None:
+                failures[invitation_id] = outcome.error
+
+    def aggregate(self, invitation_ids, detail='true', failures=None):
+        """
+        Returns a dictionary of InvitationSummary by invitation id and a
+        dictionary of CourseInvitations totals by course id. Invitations
+        whose info could not be fetched are not counted; see summaries.
+
+        Arguments:
+        invitation_ids -- an iterable of invitation ids
+        detail -- 'true' to count learners' completion and success
+        failures -- (optional) a dictionary that receives the error of each
+            invitation whose info could not be fetched, by invitation id
+        """
+        summaries = {}
+        courses = {}
+        for summary in self.summaries(invitation_ids, detail, failures):
+            summaries[summary.id] = summary
+            course = courses.get(summary.courseId)
+            if course is None:
+                course = courses[summary.courseId] = CourseInvitations(
+                    summary.courseId)
+            course.add(summary)
+        return summaries, courses
+
+
+def _text(element, tag):
+    child = element.find(tag)
+    if child is None:
+        return None
+    return child.text or ''
+
@@ -0,0 +1,66 @@
+"""
+Deferred imports of the heavier dependencies.
+
+Importing requests, lxml or even xml.dom.minidom takes longer than
+importing this whole library, and short-lived processes often only need
+part of it. Modules bound with LazyModule are imported the first time one
+of their attributes is used instead of when the library is imported.
+"""
+
+import importlib
+import sys
+
+
+class LazyModule(object):
+    """
+    Stands in for a module until it is first used.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = self.__dict__['_module'] = importlib.import_module(
+                self._name)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        if self._module is None:
+            return '<lazy module %r>' % self._name
+        return repr(self._module)
+
+
+def lazy_import(name):
+    """
+    Returns a LazyModule for an optional dependency, or None if it is not
+    installed, so that "module is None" checks keep working. Finding the
+    module imports its parent packages but not the module itself.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    try:
+        found = _find(name)
+    except ImportError:
+        found = False
+    return LazyModule(name) if found else None
+
+
+try:
+    from importlib.util import find_spec as _find_spec
+
+    def _find(name):
+        return _find_spec(name) is not None
+except ImportError:
+    import pkgutil
+
+    def _find(name):
+        return pkgutil.find_loader(name) is not None
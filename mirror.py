@@ -0,0 +1,426 @@
+"""
+Local SQLite mirror of an application's courses, registrations and
+registration results.
+
+    mirror = Mirror(service, 'scormcloud.db')
+    mirror.sync()
+    rows = mirror.registrations(course_id='course-1', learner_id='ann')
+
+sync streams the course and registration lists, and fetches results (and,
+optionally, tags) only for registrations that are new or whose activity
+dates have changed since the last sync. Changing a tag changes neither, so
+tags are also refreshed on their own schedule: those fetched more than
+tags_max_age seconds ago are fetched again by the next sync. Queries are
+answered from the local database without any API calls.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from .records import Record
+from .results import Node
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    course_id TEXT PRIMARY KEY,
+    title TEXT,
+    versions INTEGER,
+    registrations INTEGER,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS registrations (
+    registration_id TEXT PRIMARY KEY,
+    course_id TEXT NOT NULL,
+    learner_id TEXT,
+    learner_first_name TEXT,
+    learner_last_name TEXT,
+    email TEXT,
+    create_date TEXT,
+    first_access_date TEXT,
+    last_access_date TEXT,
+    completed_date TEXT,
+    fingerprint TEXT,
+    synced_at REAL
+);
+CREATE INDEX IF NOT EXISTS registrations_course
+    ON registrations (course_id, learner_id);
+CREATE INDEX IF NOT EXISTS registrations_learner
+    ON registrations (learner_id);
+CREATE TABLE IF NOT EXISTS results (
+    registration_id TEXT PRIMARY KEY,
+    complete TEXT,
+    success TEXT,
+    score REAL,
+    totaltime TEXT,
+    fingerprint TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    kind TEXT NOT NULL,
+    object_id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (kind, object_id, tag)
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (kind, tag);
+CREATE TABLE IF NOT EXISTS tag_sync (
+    kind TEXT NOT NULL,
+    object_id TEXT NOT NULL,
+    fetched_at REAL,
+    PRIMARY KEY (kind, object_id)
+);
+"""
+
+_REGISTRATION_FIELDS = (
+    ('learner_id', 'learnerId'),
+    ('learner_first_name', 'learnerFirstName'),
+    ('learner_last_name', 'learnerLastName'),
+    ('email', 'email'),
+    ('create_date', 'createDate'),
+    ('first_access_date', 'firstAccessDate'),
+    ('last_access_date', 'lastAccessDate'),
+    ('completed_date', 'completedDate'),
+)
+
+
+class SyncStats(Record):
+    __slots__ = _fields = ('courses', 'registrations', 'changed', 'removed',
+                           'results_fetched', 'tags_fetched', 'errors',
+                           'elapsed')
+
+    def __init__(self):
+        self.courses = 0
+        self.registrations = 0
+        self.changed = 0
+        self.removed = 0
+        self.results_fetched = 0
+        self.tags_fetched = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+
+class Mirror(object):
+    """
+    Keeps a SQLite database in step with one SCORM Cloud application. A
+    Mirror may be queried from several threads; sync should only run in one
+    at a time.
+    """
+
+    def __init__(self, service, path=':memory:', max_workers=8,
+                 resultsformat='course', tags=False, tags_max_age=86400):
+        """
+        Arguments:
+        service -- the ScormCloudService of the application to mirror
+        path -- the SQLite database file. Defaults to an in-memory database
+        max_workers -- the number of registration results fetched at once
+        resultsformat -- the results format requested for each
+            registration; only the top-level fields are stored
+        tags -- if True, also mirror course and registration tags, at the
+            cost of one extra call per new or changed course and
+            registration
+        tags_max_age -- the number of seconds after which the tags of a
+            course or registration are fetched again even if it has not
+            changed. 0 refreshes every tag on every sync; None only fetches
+            tags of new or changed objects, so tag-only edits are missed
+        """
+        self.service = service
+        self.path = path
+        self.max_workers = max_workers
+        self.resultsformat = resultsformat
+        self.tags = tags
+        self.tags_max_age = tags_max_age
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+            self._db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def sync(self):
+        """
+        Brings the mirror up to date and returns a SyncStats. Registrations
+        whose dates have not changed since the last sync keep their stored
+        results; removed courses and registrations are deleted.
+        """
+        stats = SyncStats()
+        started = time.time()
+        self._sync_courses(stats)
+        changed = self._sync_registrations(stats)
+        fetched = self._fetch_results(changed, stats)
+        if self.tags:
+            self._sync_tags('registration',
+                            'rustici.tagging.getRegistrationTags', 'regid',
+                            fetched, stats)
+        stats.elapsed = time.time() - started
+        logging.info('mirror sync: %r', stats)
+        return stats
+
+    def _sync_courses(self, stats):
+        now = time.time()
+        known = dict((row[0], tuple(row[1:])) for row in self._db.execute(
+            'SELECT course_id, title, versions, registrations FROM courses'))
+        seen = set()
+        changed = []
+        rows = []
+        courses = self.service.get_course_service()
+        for course in courses.iter_courses():
+            seen.add(course.courseId)
+            values = (course.title, course.numberOfVersions,
+                      course.numberOfRegistrations)
+            if known.get(course.courseId) != values:
+                changed.append(course.courseId)
+            rows.append((course.courseId,) + values + (now,))
+        stats.courses = len(seen)
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO courses VALUES (?, ?, ?, ?, ?)', rows)
+            self._delete_missing('courses', 'course_id', set(known) - seen)
+        if self.tags:
+            self._sync_tags('course', 'rustici.tagging.getCourseTags',
+                            'courseid', changed, stats)
+
+    def _sync_registrations(self, stats):
+        """
+        Stores the registration list and returns the ids of the
+        registrations whose results must be fetched.
+        """
+        now = time.time()
+        known = dict(self._db.execute(
+            'SELECT registration_id, fingerprint FROM results'))
+        registered = set(row[0] for row in self._db.execute(
+            'SELECT registration_id FROM registrations'))
+        seen = set()
+        changed = []
+        rows = []
+        request = self.service.request()
+        for element in request.iter_elements(
+                'rustici.registration.getRegistrationList', 'registration'):
+            node = Node(element.element)
+            regid = element.getAttribute('id')
+            fingerprint = _fingerprint(node)
+            seen.add(regid)
+            if known.get(regid) != fingerprint:
+                changed.append((regid, fingerprint))
+            rows.append((regid, element.getAttribute('courseid')) +
+                        tuple(node.get(tag) for (_, tag) in
+                              _REGISTRATION_FIELDS) + (fingerprint, now))
+            if len(rows) >= 1000:
+                self._store_registrations(rows)
+                rows = []
+        self._store_registrations(rows)
+        stats.registrations = len(seen)
+        stats.changed = len(changed)
+        removed = registered - seen
+        stats.removed = len(removed)
+        with self._lock, self._db:
+            self._delete_missing('registrations', 'registration_id', removed)
+            self._delete_missing('results', 'registration_id', removed)
+        return changed
+
+    def _store_registrations(self, rows):
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO registrations VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _delete_missing(self, table, column, ids):
+        if not ids:
+            return
+        self._db.executemany('DELETE FROM %s WHERE %s = ?' % (table, column),
+                             [(i,) for i in ids])
+        if table != 'results':
+            for tags_table in ('tags', 'tag_sync'):
+                self._db.executemany(
+                    'DELETE FROM %s WHERE kind = ? AND object_id = ?' %
+                    tags_table, [(table[:-1], i) for i in ids])
+
+    def _fetch_results(self, changed, stats):
+        """
+        Fetches and stores the results of the changed registrations and
+        returns the ids of those fetched.
+        """
+        if not changed:
+            return []
+        regsvc = self.service.get_registration_service()
+        resultsformat = self.resultsformat
+
+        def fetch(regid, fingerprint):
+            return regsvc.get_registration_result(regid, resultsformat,
+                                                  parsed=True)
+
+        batch = self.service.batch(self.max_workers,
+                                   max_pending=self.max_workers * 4)
+        rows = []
+        fetched = []
+        for outcome in batch.map(fetch, *zip(*changed)):
+            regid, fingerprint = outcome.args
+            if not outcome.ok:
+                stats.errors += 1
+                logging.warning('mirror: could not fetch result for %s: %s',
+                                regid, outcome.error)
+                continue
+            result = outcome.value
+            rows.append((regid, result.complete, result.success,
+                         result.score, result.totaltime, fingerprint,
+                         time.time()))
+            fetched.append(regid)
+            if len(rows) >= 500:
+                self._store_results(rows)
+                rows = []
+        self._store_results(rows)
+        stats.results_fetched = len(fetched)
+        return fetched
+
+    def _store_results(self, rows):
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows)
+
+    def _sync_tags(self, kind, method, parameter, ids, stats):
+        ids = set(ids)
+        ids.update(self._stale_tags(kind))
+        if not ids:
+            return
+
+        def fetch(object_id):
+            request = self.service.request()
+            request.parameters[parameter] = object_id
+            xmldoc = request.call_service(method)
+            return [tag.firstChild.nodeValue
+                    for tag in xmldoc.getElementsByTagName('tag')
+                    if tag.firstChild is not None]
+
+        for outcome in self.service.batch(self.max_workers).map(fetch, ids):
+            object_id = outcome.args[0]
+            if not outcome.ok:
+                stats.errors += 1
+                logging.warning('mirror: could not fetch tags for %s %s: %s',
+                                kind, object_id, outcome.error)
+                continue
+            stats.tags_fetched += 1
+            with self._lock, self._db:
+                self._db.execute(
+                    'DELETE FROM tags WHERE kind = ? AND object_id = ?',
+                    (kind, object_id))
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO tags VALUES (?, ?, ?)',
+                    [(kind, object_id, tag) for tag in outcome.value])
+                self._db.execute(
+                    'INSERT OR REPLACE INTO tag_sync VALUES (?, ?, ?)',
+                    (kind, object_id, time.time()))
+
+    def _stale_tags(self, kind):
+        """
+        Returns the ids of the stored objects of kind whose tags were never
+        fetched or are older than tags_max_age.
+        """
+        if self.tags_max_age is None:
+            return []
+        return [row[0] for row in self._db.execute(
+            'SELECT o.{0}_id FROM {0}s o LEFT JOIN tag_sync s '
+            'ON s.kind = ? AND s.object_id = o.{0}_id '
+            'WHERE s.fetched_at IS NULL OR s.fetched_at <= ?'.format(kind),
+            (kind, time.time() - self.tags_max_age))]
+
+    def query(self, sql, parameters=()):
+        """
+        Runs a read-only SQL query against the mirror and returns the rows
+        as dictionaries.
+
+        Arguments:
+        sql -- the SQL statement
+        parameters -- the values for its placeholders
+        """
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, parameters)]
+
+    def courses(self, tag=None):
+        """
+        Returns the mirrored courses as dictionaries, optionally only those
+        with the given tag.
+        """
+        if tag is None:
+            return self.query('SELECT * FROM courses ORDER BY course_id')
+        return self.query(
+            'SELECT c.* FROM courses c JOIN tags t ON t.kind = ? AND '
+            't.object_id = c.course_id WHERE t.tag = ? ORDER BY c.course_id',
+            ('course', tag))
+
+    def registrations(self, course_id=None, learner_id=None, tag=None,
+                      course_tag=None, complete=None, success=None):
+        """
+        Returns the mirrored registrations, joined with their stored
+        results, as dictionaries. Every given argument narrows the selection.
+
+        Arguments:
+        course_id -- (optional) only registrations for this course
+        learner_id -- (optional) only registrations of this learner
+        tag -- (optional) only registrations with this tag
+        course_tag -- (optional) only registrations for courses with this tag
+        complete -- (optional) only results with this completion status, for
+            example 'complete'
+        success -- (optional) only results with this success status, for
+            example 'passed'
+        """
+        where = []
+        parameters = []
+        joins = ''
+        for (column, value) in (('r.course_id', course_id),
+                                ('r.learner_id', learner_id),
+                                ('s.complete', complete),
+                                ('s.success', success)):
+            if value is not None:
+                where.append('%s = ?' % column)
+                parameters.append(value)
+        if tag is not None:
+            joins += (' JOIN tags rt ON rt.kind = \'registration\' AND '
+                      'rt.object_id = r.registration_id AND rt.tag = ?')
+            parameters.insert(0, tag)
+        if course_tag is not None:
+            joins += (' JOIN tags ct ON ct.kind = \'course\' AND '
+                      'ct.object_id = r.course_id AND ct.tag = ?')
+            parameters.insert(1 if tag is not None else 0, course_tag)
+        sql = ('SELECT r.*, s.complete, s.success, s.score, s.totaltime, '
+               's.fetched_at FROM registrations r LEFT JOIN results s ON '
+               's.registration_id = r.registration_id' + joins)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self.query(sql + ' ORDER BY r.registration_id', parameters)
+
+    def result(self, regid):
+        """
+        Returns the stored result of a registration as a dictionary, or None.
+        """
+        rows = self.query('SELECT * FROM results WHERE registration_id = ?',
+                          (regid,))
+        return rows[0] if rows else None
+
+
+def _fingerprint(node):
+    """
+    Summarizes the fields of a registration list entry that change when the
+    learner makes progress.
+    """
+    updates = [instance.findtext('updateDate') or '' for instance in
+               node.element.iterfind('instances/instance')]
+    return '|'.join([node.get('lastAccessDate') or '',
+                     node.get('completedDate') or '',
+                     str(len(updates)), max(updates) if updates else ''])
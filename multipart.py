@@ -0,0 +1,174 @@
+import os
+import time
+
+from .lazy import LazyModule
+
+uuid = LazyModule('uuid')
+
+
+class MultipartEncoder(object):
+    """
+    Streaming multipart/form-data request body. Files are read a chunk at a
+    time while the request is being sent, so memory use is bounded by
+    chunk_size no matter how large the files are.
+
+    The encoder is a file-like object (it has read) and an iterable of
+    chunks, and can be passed as the data of an HttpTransport request. When
+    the sizes of all files can be determined, len() gives the exact body
+    length and the request is sent with a Content-Length header; otherwise
+    use iter(encoder) as the body and it is sent with chunked transfer
+    encoding.
+    """
+
+    def __init__(self, fields=None, files=None, boundary=None,
+                 chunk_size=65536, progress=None, max_bytes_per_second=None):
+        """
+        Arguments:
+        fields -- (optional) a list of (name, value) pairs of plain form
+            fields
+        files -- (optional) a list of (name, file object, filename,
+            content type) tuples. filename and content type may be None
+        boundary -- (optional) the multipart boundary string
+        chunk_size -- the number of bytes read from a file at a time
+        progress -- (optional) callable invoked as progress(sent, total) after
+            each chunk is handed to the connection. total is None if the
+            body length is not known
+        max_bytes_per_second -- (optional) caps the upload bandwidth
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.max_bytes_per_second = max_bytes_per_second
+        self._parts = []
+        for (name, value) in fields or ():
+            if not isinstance(value, bytes):
+                value = value.encode('utf8')
+            self._parts.append((self._header(name), value))
+        for (name, fileobj, filename, content_type) in files or ():
+            if filename is None:
+                filename = _filename(fileobj)
+            self._parts.append((self._header(name, filename, content_type),
+                                fileobj))
+        self._closing = ('--%s--\r\n' % self.boundary).encode('ascii')
+        self.length = self._length()
+        self.sent = 0
+        self._chunks = None
+        self._buffer = b''
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def _header(self, name, filename=None, content_type=None):
+        disposition = 'form-data; name="%s"' % _quote(name)
+        if filename is not None:
+            disposition += '; filename="%s"' % _quote(filename)
+            content_type = content_type or 'application/octet-stream'
+        header = '--%s\r\nContent-Disposition: %s\r\n' % (self.boundary,
+                                                          disposition)
+        if content_type is not None:
+            header += 'Content-Type: %s\r\n' % content_type
+        return (header + '\r\n').encode('utf8')
+
+    def _length(self):
+        length = len(self._closing)
+        for (header, body) in self._parts:
+            length += len(header) + 2
+            if isinstance(body, bytes):
+                length += len(body)
+            else:
+                size = _remaining_size(body)
+                if size is None:
+                    return None
+                length += size
+        return length
+
+    def __len__(self):
+        if self.length is None:
+            raise TypeError('the size of a file in the body is unknown')
+        return self.length
+
+    def __iter__(self):
+        if self._chunks is None:
+            self._chunks = self._generate()
+        return self._chunks
+
+    def _generate(self):
+        started = time.time()
+        for (header, body) in self._parts:
+            yield self._sent(header, started)
+            if isinstance(body, bytes):
+                if body:
+                    yield self._sent(body, started)
+            else:
+                while True:
+                    chunk = body.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    if not isinstance(chunk, bytes):
+                        chunk = chunk.encode('utf8')
+                    yield self._sent(chunk, started)
+            yield self._sent(b'\r\n', started)
+        yield self._sent(self._closing, started)
+
+    def _sent(self, chunk, started):
+        self.sent += len(chunk)
+        if self.max_bytes_per_second:
+            ahead = (self.sent / float(self.max_bytes_per_second) -
+                     (time.time() - started))
+            if ahead > 0:
+                time.sleep(ahead)
+        if self.progress is not None:
+            self.progress(self.sent, self.length)
+        return chunk
+
+    def read(self, size=-1):
+        """
+        Returns up to size bytes of the encoded body, or the rest of it if
+        size is negative. Returns b'' at the end of the body.
+        """
+        chunks = iter(self)
+        buffer = self._buffer
+        while size < 0 or len(buffer) < size:
+            try:
+                buffer += next(chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            self._buffer = b''
+            return buffer
+        self._buffer = buffer[size:]
+        return buffer[:size]
+
+
+def _quote(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _filename(fileobj):
+    name = getattr(fileobj, 'name', None)
+    if isinstance(name, str):
+        return os.path.basename(name)
+    return 'file'
+
+
+def _remaining_size(fileobj):
+    """
+    Returns the number of bytes left to read from fileobj, or None if that
+    cannot be determined without reading it.
+    """
+    try:
+        position = fileobj.tell()
+    except (AttributeError, IOError, OSError):
+        return None
+    try:
+        return os.fstat(fileobj.fileno()).st_size - position
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+    try:
+        fileobj.seek(0, os.SEEK_END)
+        end = fileobj.tell()
+        fileobj.seek(position)
+        return end - position
+    except (AttributeError, IOError, OSError):
+        return None
@@ -0,0 +1,376 @@
+"""
+XML parser backends for SCORM Cloud responses.
+
+Every backend parses a response exactly once and returns a document that
+offers the subset of the xml.dom.minidom API used by the result classes in
+this library (getElementsByTagName, attributes, childNodes, firstChild,
+nodeValue and friends), so code written against minidom documents keeps
+working whichever backend is in use.
+"""
+
+import threading
+
+import six
+
+from .lazy import LazyModule, lazy_import
+
+lxml_etree = lazy_import('lxml.etree')
+std_etree = LazyModule('xml.etree.ElementTree')
+minidom = LazyModule('xml.dom.minidom')
+
+
+class NodeList(list):
+    """
+    List of nodes with the minidom NodeList extras.
+    """
+
+    @property
+    def length(self):
+        return len(self)
+
+    def item(self, index):
+        if 0 <= index < len(self):
+            return self[index]
+        return None
+
+
+class Attr(object):
+    __slots__ = ('name', 'value')
+
+    nodeType = 2
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    @property
+    def nodeName(self):
+        return self.name
+
+    @property
+    def nodeValue(self):
+        return self.value
+
+
+class AttributeMap(object):
+    """
+    Read-only view of an element's attributes that behaves like a minidom
+    NamedNodeMap: indexing by name returns an Attr with name and value.
+    """
+    __slots__ = ('_attrib',)
+
+    def __init__(self, attrib):
+        self._attrib = attrib
+
+    def __getitem__(self, name):
+        return Attr(name, self._attrib[name])
+
+    def __contains__(self, name):
+        return name in self._attrib
+
+    def __len__(self):
+        return len(self._attrib)
+
+    @property
+    def length(self):
+        return len(self._attrib)
+
+    def get(self, name, default=None):
+        if name in self._attrib:
+            return Attr(name, self._attrib[name])
+        return default
+
+    def keys(self):
+        return list(self._attrib.keys())
+
+    def items(self):
+        return list(self._attrib.items())
+
+    def values(self):
+        return [Attr(k, v) for k, v in self._attrib.items()]
+
+
+class Text(object):
+    __slots__ = ('data',)
+
+    nodeType = 3
+    nodeName = '#text'
+    attributes = None
+    childNodes = NodeList()
+    firstChild = None
+    lastChild = None
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def nodeValue(self):
+        return self.data
+
+    @property
+    def wholeText(self):
+        return self.data
+
+    def toxml(self):
+        return self.data
+
+    def __repr__(self):
+        return '<Text %r>' % self.data
+
+
+class Element(object):
+    """
+    minidom-compatible wrapper around an lxml or ElementTree element.
+    """
+    __slots__ = ('element', '_childNodes')
+
+    nodeType = 1
+    nodeValue = None
+
+    def __init__(self, element):
+        self.element = element
+        self._childNodes = None
+
+    def __repr__(self):
+        return '<Element %s>' % self.tagName
+
+    @property
+    def tagName(self):
+        return self.element.tag
+
+    nodeName = localName = tagName
+
+    @property
+    def attributes(self):
+        return AttributeMap(self.element.attrib)
+
+    def getAttribute(self, name):
+        return self.element.get(name, '')
+
+    def hasAttribute(self, name):
+        return name in self.element.attrib
+
+    @property
+    def childNodes(self):
+        if self._childNodes is None:
+            nodes = NodeList()
+            element = self.element
+            if element.text:
+                nodes.append(Text(element.text))
+            for child in element:
+                if isinstance(child.tag, six.string_types):
+                    nodes.append(Element(child))
+                if child.tail:
+                    nodes.append(Text(child.tail))
+            self._childNodes = nodes
+        return self._childNodes
+
+    @property
+    def firstChild(self):
+        nodes = self.childNodes
+        return nodes[0] if nodes else None
+
+    @property
+    def lastChild(self):
+        nodes = self.childNodes
+        return nodes[-1] if nodes else None
+
+    def hasChildNodes(self):
+        return bool(self.childNodes)
+
+    def getElementsByTagName(self, name):
+        element = self.element
+        if name == '*':
+            found = element.iter()
+        else:
+            found = element.iter(name)
+        return NodeList(Element(e) for e in found
+                        if e is not element and
+                        isinstance(e.tag, six.string_types))
+
+    def toxml(self, encoding=None):
+        return _tostring(self.element, encoding)
+
+    def toprettyxml(self, indent='  ', newl='\n', encoding=None):
+        return _toprettyxml(self.element, encoding)
+
+
+class Document(object):
+    """
+    minidom-compatible document wrapping the root element of a parsed
+    response.
+    """
+    __slots__ = ('documentElement',)
+
+    nodeType = 9
+    nodeName = '#document'
+    nodeValue = None
+    attributes = None
+
+    def __init__(self, root):
+        self.documentElement = Element(root)
+
+    @property
+    def root(self):
+        """
+        The underlying lxml or ElementTree root element.
+        """
+        return self.documentElement.element
+
+    @property
+    def childNodes(self):
+        return NodeList([self.documentElement])
+
+    @property
+    def firstChild(self):
+        return self.documentElement
+
+    lastChild = firstChild
+
+    def getElementsByTagName(self, name):
+        nodes = self.documentElement.getElementsByTagName(name)
+        if name == '*' or self.documentElement.tagName == name:
+            nodes.insert(0, self.documentElement)
+        return nodes
+
+    def toxml(self, encoding=None):
+        return self.documentElement.toxml(encoding)
+
+    def toprettyxml(self, indent='  ', newl='\n', encoding=None):
+        return self.documentElement.toprettyxml(indent, newl, encoding)
+
+    def unlink(self):
+        pass
+
+
+def _tostring(element, encoding=None):
+    if lxml_etree is not None and isinstance(element, lxml_etree._Element):
+        return lxml_etree.tostring(element, encoding=encoding or six.text_type)
+    return std_etree.tostring(element, encoding=encoding or 'unicode')
+
+
+def _toprettyxml(element, encoding=None):
+    if lxml_etree is not None and isinstance(element, lxml_etree._Element):
+        return lxml_etree.tostring(element, encoding=encoding or six.text_type,
+                                   pretty_print=True)
+    return minidom.parseString(std_etree.tostring(element)).toprettyxml(
+        encoding=encoding)
+
+
+class ElementStream(object):
+    """
+    Incremental parser that picks selected elements out of a response as it
+    arrives. Feed it the body a chunk at a time; each call returns the
+    matching elements completed by that chunk, as minidom-compatible
+    Element wrappers. Once the consumer moves on to the next element the
+    previous one is cleared and detached from the tree, so memory use does
+    not grow with the length of the response.
+    """
+
+    def __init__(self, pull_parser, tags):
+        """
+        Arguments:
+        pull_parser -- an lxml or ElementTree XMLPullParser reporting start
+            and end events
+        tags -- the tag names of the elements to return
+        """
+        self._parser = pull_parser
+        self._tags = frozenset(tags)
+        self._stack = []
+
+    def feed(self, data):
+        self._parser.feed(data)
+        return self._elements()
+
+    def close(self):
+        self._parser.close()
+        return self._elements()
+
+    def _elements(self):
+        stack = self._stack
+        for (event, element) in self._parser.read_events():
+            if event == 'start':
+                stack.append(element)
+                continue
+            stack.pop()
+            if element.tag in self._tags:
+                yield Element(element)
+                element.clear()
+                if stack:
+                    stack[-1].remove(element)
+
+
+class MinidomParser(object):
+    """
+    Parses responses into genuine xml.dom.minidom documents.
+    """
+    name = 'minidom'
+
+    def parse(self, raw):
+        return minidom.parseString(raw)
+
+    def stream(self, tags):
+        # minidom has no incremental mode; use the standard library's.
+        return ElementTreeParser().stream(tags)
+
+
+class LxmlParser(object):
+    """
+    Parses responses with lxml and wraps the result in a minidom-compatible
+    Document.
+    """
+    name = 'lxml'
+
+    def __init__(self):
+        if lxml_etree is None:
+            raise ImportError('LxmlParser requires the lxml package')
+        # An lxml parser serializes the threads that share it, so each
+        # thread gets its own.
+        self._local = threading.local()
+
+    def parse(self, raw):
+        if isinstance(raw, six.text_type):
+            raw = raw.encode('utf8')
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._local.parser = lxml_etree.XMLParser(
+                resolve_entities=False, huge_tree=True)
+        return Document(lxml_etree.fromstring(raw, parser))
+
+    def stream(self, tags):
+        """
+        Returns an ElementStream yielding the elements named in tags.
+        """
+        return ElementStream(lxml_etree.XMLPullParser(
+            events=('start', 'end'), resolve_entities=False, huge_tree=True),
+            tags)
+
+
+class ElementTreeParser(object):
+    """
+    Parses responses with the standard library's C-accelerated ElementTree
+    and wraps the result in a minidom-compatible Document.
+    """
+    name = 'etree'
+
+    def parse(self, raw):
+        if isinstance(raw, six.text_type):
+            raw = raw.encode('utf8')
+        return Document(std_etree.fromstring(raw))
+
+    def stream(self, tags):
+        """
+        Returns an ElementStream yielding the elements named in tags.
+        """
+        return ElementStream(std_etree.XMLPullParser(events=('start', 'end')),
+                             tags)
+
+
+def get_default_parser():
+    """
+    Returns the fastest parser available: lxml if it is installed, the
+    standard library ElementTree otherwise.
+    """
+    if lxml_etree is not None:
+        return LxmlParser()
+    return ElementTreeParser()
@@ -0,0 +1,271 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from .errors import ScormCloudError
+from .lazy import LazyModule
+
+futures = LazyModule('concurrent.futures')
+
+
+class PollJob(object):
+    """
+    A unit of background work for a PollScheduler. Subclasses implement
+    poll, which is called on the scheduler thread and either resolves
+    self.future or returns the number of seconds to wait before the next
+    poll.
+    """
+
+    def __init__(self, callback=None):
+        self.future = futures.Future()
+        if callback is not None:
+            self.future.add_done_callback(callback)
+
+    def poll(self):
+        raise NotImplementedError
+
+    def resolve(self, result):
+        """
+        Sets the result of the job's future, unless the future was
+        cancelled or resolved already. Returns True if the result was set.
+        """
+        return self._settle(self.future.set_result, result)
+
+    def fail(self, error):
+        """
+        Sets the exception of the job's future, unless the future was
+        cancelled or resolved already. Returns True if the exception was
+        set.
+        """
+        return self._settle(self.future.set_exception, error)
+
+    def _settle(self, setter, value):
+        if self.future.done():
+            return False
+        try:
+            setter(value)
+        except Exception:
+            # Cancelled between the check and the call.
+            if not self.future.done():
+                raise
+            return False
+        return True
+
+
+class PollScheduler(object):
+    """
+    Polls many jobs from a single background thread. Jobs are polled in the
+    order their next poll falls due, and polls are spaced so that no more
+    than max_polls_per_second are made in total, however many jobs are
+    being tracked. The thread starts when the first job is added and exits
+    when no jobs are left.
+    """
+
+    def __init__(self, max_polls_per_second=5.0):
+        self.max_polls_per_second = max_polls_per_second
+        self.polls = 0
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._last_poll = 0.0
+
+    def add(self, job, delay=0.0):
+        """
+        Schedules job to be polled after delay seconds and returns its
+        future.
+        """
+        with self._condition:
+            heapq.heappush(self._queue, (time.time() + delay,
+                                         next(self._counter), job))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='scormcloud-poller')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return job.future
+
+    @property
+    def pending(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # If the loop died, the next add starts a new thread.
+            with self._condition:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _loop(self):
+        spacing = 1.0 / self.max_polls_per_second
+        while True:
+            with self._condition:
+                while True:
+                    if not self._queue:
+                        self._thread = None
+                        return
+                    due, _, job = self._queue[0]
+                    due = max(due, self._last_poll + spacing)
+                    wait = due - time.time()
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        break
+                    self._condition.wait(wait)
+                self._last_poll = time.time()
+            if job.future.done():
+                continue
+            self.polls += 1
+            try:
+                delay = job.poll()
+            except Exception as e:
+                if not job.future.done():
+                    logging.exception('polling job failed')
+                job.fail(e)
+                continue
+            if delay is not None and not job.future.done():
+                self.add(job, delay)
+
+
+class AsyncImportJob(PollJob):
+    """
+    Tracks one import started with CourseService.import_course_async.
+
+    The delay before each poll adapts to the import: while the progress
+    value advances, the next poll is timed for about half of the estimated
+    time left; while it stalls, the delay doubles. Both are kept between
+    min_interval and max_interval.
+    """
+
+    def __init__(self, course_service, token, min_interval, max_interval,
+                 max_errors, callback=None):
+        PollJob.__init__(self, callback)
+        self.course_service = course_service
+        self.token = token
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_errors = max_errors
+        self.errors = 0
+        self.delay = min_interval
+        self.last = None
+        self.result = None
+
+    def poll(self):
+        try:
+            result = self.course_service.get_async_import_result(self.token)
+        except ScormCloudError as e:
+            self.errors += 1
+            if not e.retryable or self.errors >= self.max_errors:
+                raise
+            self.delay = min(self.max_interval, self.delay * 2)
+            return self.delay
+        self.errors = 0
+        self.result = result
+        if result.status == 'finished':
+            self.resolve(result.import_results)
+            return None
+        if result.status == 'error':
+            self.fail(ScormCloudError(
+                'Import %s failed: %s' % (self.token, result.message)))
+            return None
+        return self._next_delay(_progress(result.progress))
+
+    def _next_delay(self, progress):
+        now = time.time()
+        last, self.last = self.last, (now, progress)
+        if last is not None and progress is not None and last[1] is not None:
+            rate = (progress - last[1]) / (now - last[0])
+            if rate > 0:
+                self.delay = (100.0 - progress) / rate / 2
+                return max(self.min_interval, min(self.max_interval,
+                                                  self.delay))
+        self.delay = max(self.min_interval,
+                         min(self.max_interval, self.delay * 2))
+        return self.delay
+
+
+def _progress(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ImportTracker(object):
+    """
+    Tracks many asynchronous course imports at once on one PollScheduler.
+    For example:
+
+        tracker = course_service.import_tracker(max_polls_per_second=5)
+        tokens = [course_service.import_course_async(cid, f) for ...]
+        for results in tracker.wait(tokens):
+            ...
+
+    Each tracked token gets a concurrent.futures.Future that resolves to the
+    tuple of ImportResult objects of the finished import, or raises a
+    ScormCloudError if the import failed.
+    """
+
+    def __init__(self, course_service, max_polls_per_second=5.0,
+                 min_interval=1.0, max_interval=30.0, max_errors=5):
+        """
+        Arguments:
+        course_service -- the CourseService used to poll
+        max_polls_per_second -- the maximum poll rate across all imports
+        min_interval -- the shortest time between two polls of one import
+        max_interval -- the longest time between two polls of one import
+        max_errors -- the number of consecutive failed polls after which an
+            import's future raises the last error
+        """
+        self.course_service = course_service
+        self.scheduler = PollScheduler(max_polls_per_second)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_errors = max_errors
+        self._futures = {}
+
+    def track(self, token, callback=None):
+        """
+        Starts tracking the import with the given token and returns its
+        Future. Tracking the same token twice returns the same Future.
+
+        Arguments:
+        token -- the token returned by import_course_async
+        callback -- (optional) called with the Future when it resolves
+        """
+        future = self._futures.get(token)
+        if future is None:
+            job = AsyncImportJob(self.course_service, token,
+                                 self.min_interval, self.max_interval,
+                                 self.max_errors)
+            future = self._futures[token] = self.scheduler.add(job)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def track_many(self, tokens, callback=None):
+        return [self.track(token, callback) for token in tokens]
+
+    def wait(self, tokens, timeout=None):
+        """
+        Tracks the given tokens and waits for every import to finish.
+        Returns the list of ImportResult tuples, in the order of tokens.
+        Raises the error of the first failed import, in token order.
+
+        Arguments:
+        tokens -- the tokens returned by import_course_async
+        timeout -- (optional) the maximum number of seconds to wait in total
+        """
+        futures = self.track_many(tokens)
+        expires = None if timeout is None else time.time() + timeout
+        results = []
+        for future in futures:
+            remaining = None if expires is None else max(0, expires -
+                                                         time.time())
+            results.append(future.result(remaining))
+        return results
@@ -0,0 +1,335 @@
+"""
+Receiver for registration result postbacks.
+
+SCORM Cloud posts a registration's results to the URL set with
+RegistrationService.update_postback_info whenever they change, as a form
+with the results XML in the data field. A PostbackReceiver is a WSGI
+application that accepts those posts:
+
+    def handle(results):
+        for result in results:
+            print(result.regid, result.complete, result.success)
+
+    receiver = PostbackReceiver(handle, username='cloud', password='s3cret')
+    receiver.serve(port=8080)
+
+Posts are authenticated according to authtype, parsed into
+RegistrationResult objects, deduplicated, and handed to the handler in
+batches from a background thread. aio.PostbackASGIApp serves the same
+receiver to asyncio servers.
+"""
+
+import base64
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from six.moves import queue, urllib
+
+from .parsing import get_default_parser
+from .results import RegistrationResult
+
+AUTH_FORM = 'form'
+AUTH_HTTPBASIC = 'httpbasic'
+
+
+class PostbackStats(object):
+    """
+    Counters of a PostbackReceiver.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.overloaded = 0
+        self.delivered = 0
+        self.batches = 0
+
+    def __repr__(self):
+        return ('PostbackStats(received=%d, accepted=%d, duplicates=%d, '
+                'rejected=%d, overloaded=%d, delivered=%d)' % (
+                    self.received, self.accepted, self.duplicates,
+                    self.rejected, self.overloaded, self.delivered))
+
+
+class PostbackReceiver(object):
+    """
+    Accepts registration result postbacks and delivers them in batches.
+
+    Accepted results are placed on a bounded internal queue. When it is
+    full the receiver answers 503 with a Retry-After header, so SCORM Cloud
+    retries later instead of the receiver buffering without limit. A post
+    whose registration and content were already delivered recently is
+    acknowledged but not delivered again.
+    """
+
+    def __init__(self, handler=None, output=None, authtype=AUTH_FORM,
+                 username=None, password=None, batch_size=100,
+                 batch_interval=1.0, max_pending=10000, dedupe_size=100000,
+                 max_body_size=10 * 1024 * 1024, parser=None):
+        """
+        Arguments:
+        handler -- (optional) called on the delivery thread with each list
+            of RegistrationResult objects
+        output -- (optional) a queue.Queue that receives each list instead.
+            put blocks while the queue is full, which in turn makes the
+            receiver answer 503 once its own queue fills
+        authtype -- 'form' or 'httpbasic', as passed to
+            update_postback_info
+        username -- (optional) the expected user name. Posts are not
+            authenticated if it is None
+        password -- (optional) the expected password
+        batch_size -- the largest number of results delivered at once
+        batch_interval -- the longest time, in seconds, a result waits for
+            its batch to fill
+        max_pending -- the number of accepted results waiting for delivery
+            above which posts are refused with 503
+        dedupe_size -- the number of recent postbacks remembered to detect
+            repeats
+        max_body_size -- posts larger than this many bytes are refused
+        parser -- (optional) the XML parser backend
+        """
+        if (handler is None) == (output is None):
+            raise ValueError('exactly one of handler and output is required')
+        if authtype not in (AUTH_FORM, AUTH_HTTPBASIC):
+            raise ValueError('authtype must be %r or %r' % (AUTH_FORM,
+                                                            AUTH_HTTPBASIC))
+        self.handler = handler
+        self.output = output
+        self.authtype = authtype
+        self.username = username
+        self.password = password
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.dedupe_size = dedupe_size
+        self.max_body_size = max_body_size
+        self.parser = parser or get_default_parser()
+        self.stats = PostbackStats()
+        self._pending = queue.Queue(max_pending)
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._deliver,
+                                        name='scormcloud-postbacks')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @classmethod
+    def from_postback_data(cls, postback_data, handler=None, output=None,
+                           **options):
+        """
+        Creates a receiver that authenticates posts with the settings of a
+        PostbackData, as returned by PostbackService.get_postback_info.
+        """
+        return cls(handler, output,
+                   authtype=postback_data.authtype or AUTH_FORM,
+                   username=postback_data.login or None,
+                   password=postback_data.password or None, **options)
+
+    def handle(self, headers, body):
+        """
+        Processes one post and returns (status, headers, body) for the
+        response. Never blocks. Used by the WSGI and ASGI adapters.
+
+        Arguments:
+        headers -- a dictionary of the request headers, with lower-case
+            names
+        body -- the request body as bytes
+        """
+        with self._lock:
+            self.stats.received += 1
+        if self._closed:
+            return _response(503, 'closed')
+        if len(body) > self.max_body_size:
+            return self._reject(413, 'too large')
+        try:
+            form = urllib.parse.parse_qs(body.decode('utf8'))
+        except UnicodeDecodeError:
+            return self._reject(400, 'malformed body')
+        if not self._authenticated(headers, form):
+            return self._reject(401, 'unauthorized', [
+                ('WWW-Authenticate', 'Basic realm="postback"')]
+                if self.authtype == AUTH_HTTPBASIC else [])
+        data = form.get('data')
+        if not data:
+            return self._reject(400, 'missing data')
+        raw = data[0].encode('utf8')
+        try:
+            result = RegistrationResult(self.parser.parse(raw))
+        except Exception as e:
+            logging.warning('rejected malformed postback: %s', e)
+            return self._reject(400, 'malformed data')
+        key = (result.regid, hashlib.sha1(raw).digest())
+        with self._lock:
+            # Checked again under the lock that close takes, so that nothing
+            # is queued behind the sentinel that stops the delivery thread.
+            if self._closed:
+                return _response(503, 'closed')
+            if key in self._seen:
+                self.stats.duplicates += 1
+                return _response(200, 'duplicate')
+            try:
+                self._pending.put_nowait(result)
+            except queue.Full:
+                self.stats.overloaded += 1
+                return _response(503, 'busy', [
+                    ('Retry-After', str(max(1, int(self.batch_interval))))])
+            self._seen[key] = True
+            if len(self._seen) > self.dedupe_size:
+                self._seen.popitem(last=False)
+            self.stats.accepted += 1
+        return _response(200, 'ok')
+
+    def _reject(self, status, message, headers=None):
+        with self._lock:
+            self.stats.rejected += 1
+        return _response(status, message, headers)
+
+    def _authenticated(self, headers, form):
+        if self.username is None:
+            return True
+        if self.authtype == AUTH_HTTPBASIC:
+            header = headers.get('authorization', '')
+            if not header.lower().startswith('basic '):
+                return False
+            try:
+                decoded = base64.b64decode(header[6:].strip()).decode('utf8')
+            except (TypeError, ValueError):
+                return False
+            username, _, password = decoded.partition(':')
+        else:
+            username = form.get('username', [''])[0]
+            password = form.get('password', [''])[0]
+        return (_equal(username, self.username) &
+                _equal(password, self.password or ''))
+
+    def _deliver(self):
+        while True:
+            batch = []
+            try:
+                batch.append(self._pending.get(timeout=self.batch_interval))
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            if batch[0] is None:
+                return
+            expires = time.time() + self.batch_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = expires - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    result = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if result is None:
+                    stop = True
+                    break
+                batch.append(result)
+            try:
+                if self.output is not None:
+                    self.output.put(batch)
+                else:
+                    self.handler(batch)
+            except Exception:
+                logging.exception('postback handler failed')
+            with self._lock:
+                self.stats.delivered += len(batch)
+                self.stats.batches += 1
+            if stop:
+                return
+
+    def close(self, timeout=None):
+        """
+        Stops accepting posts, delivers the ones already accepted and stops
+        the delivery thread.
+        """
+        with self._lock:
+            closing = not self._closed
+            self._closed = True
+        if closing:
+            self._pending.put(None)
+        self._thread.join(timeout)
+
+    def __call__(self, environ, start_response):
+        """
+        The WSGI application.
+        """
+        if environ.get('REQUEST_METHOD') != 'POST':
+            status, headers, body = _response(405, 'method not allowed',
+                                              [('Allow', 'POST')])
+        else:
+            try:
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > self.max_body_size:
+                status, headers, body = self._reject(413, 'too large')
+            else:
+                body = environ['wsgi.input'].read(length) if length else b''
+                request_headers = dict(
+                    (key[5:].replace('_', '-').lower(), value)
+                    for (key, value) in environ.items()
+                    if key.startswith('HTTP_'))
+                status, headers, body = self.handle(request_headers, body)
+        start_response(_status_line(status), headers)
+        return [body]
+
+    wsgi_app = __call__
+
+    def serve(self, host='', port=8080):
+        """
+        Serves the receiver with the standard library's WSGI server, one
+        thread per connection, until interrupted.
+        """
+        server = make_server(self, host, port)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self.close()
+
+
+def make_server(receiver, host='', port=8080):
+    """
+    Returns a threaded wsgiref server for the receiver.
+    """
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+    from six.moves import socketserver
+
+    class Server(socketserver.ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    class Handler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            logging.debug('postback %s', format % args)
+
+    server = Server((host, port), Handler)
+    server.set_app(receiver)
+    return server
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized',
+            405: 'Method Not Allowed', 413: 'Payload Too Large',
+            503: 'Service Unavailable'}
+
+
+def _status_line(status):
+    return '%d %s' % (status, _REASONS.get(status, ''))
+
+
+def _response(status, message, headers=None):
+    body = message.encode('utf8')
+    return status, [('Content-Type', 'text/plain'),
+                    ('Content-Length', str(len(body)))] + (headers or []), body
+
+
+def _equal(a, b):
+    return hmac.compare_digest(a.encode('utf8'), b.encode('utf8'))
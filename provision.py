@@ -0,0 +1,326 @@
+"""
+Bulk registration provisioning.
+
+    stats = provision(service, read_csv('learners.csv'),
+                      checkpoint='learners.ckpt', results='learners.out.csv')
+
+Rows are streamed from a CSV file or any iterable of dictionaries and
+registrations are created concurrently. Registrations that already exist,
+according to one streamed getRegistrationList snapshot taken at the start,
+are skipped, so a run can be repeated safely. Progress is checkpointed so an
+interrupted run resumes after the last row that was fully processed. The
+results file is synced to disk before each checkpoint, and rows it already
+records are not processed again on resume.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import time
+import uuid
+
+import six
+
+from .records import Record
+
+if hasattr(os, 'replace'):
+    _replace = os.replace
+else:
+    _replace = os.rename
+
+# The create_registration argument each input column is passed as.
+COLUMNS = {
+    'regid': 'regid',
+    'registrationid': 'regid',
+    'courseid': 'courseid',
+    'userid': 'userid',
+    'learnerid': 'userid',
+    'fname': 'fname',
+    'lname': 'lname',
+    'email': 'email',
+    'postbackurl': 'postbackUrl',
+    'learnertags': 'learnerTags',
+    'coursetags': 'courseTags',
+    'registrationtags': 'registrationTags',
+}
+
+CREATED = 'created'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+RESULT_COLUMNS = ('row', 'regid', 'courseid', 'userid', 'status', 'error',
+                  'elapsed')
+
+
+class ProvisionStats(Record):
+    __slots__ = _fields = ('rows', 'created', 'skipped', 'failed', 'resumed',
+                           'elapsed')
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.skipped = 0
+        self.failed = 0
+        self.resumed = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """
+        Rows processed per second.
+        """
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def read_csv(path, **options):
+    """
+    Yields each row of a CSV file of learners as a dictionary, streaming the
+    file. The header names the columns; see COLUMNS for the accepted names
+    (case-insensitive). Other columns are ignored.
+
+    Arguments:
+    path -- the CSV file
+    options -- (optional) csv.DictReader formatting options
+    """
+    if six.PY2:
+        f = open(path, 'rb')
+    else:
+        f = io.open(path, newline='', encoding='utf-8-sig')
+    with f:
+        for row in csv.DictReader(f, **options):
+            yield row
+
+
+def registration_arguments(row):
+    """
+    Maps an input row to create_registration keyword arguments. A row without
+    a registration id gets one derived from its course and learner, so that
+    re-running the same input is still idempotent.
+    """
+    arguments = {}
+    for (key, value) in row.items():
+        name = COLUMNS.get((key or '').strip().lower())
+        if name is not None and value not in (None, ''):
+            arguments[name] = value
+    if 'courseid' not in arguments or 'userid' not in arguments:
+        raise ValueError('row needs a courseid and a learnerid')
+    if 'regid' not in arguments:
+        arguments['regid'] = str(uuid.uuid5(
+            uuid.NAMESPACE_URL, 'scormcloud:%s:%s' % (arguments['courseid'],
+                                                      arguments['userid'])))
+    arguments.setdefault('fname', None)
+    arguments.setdefault('lname', None)
+    return arguments
+
+
+class Provisioner(object):
+    """
+    Creates registrations for a stream of rows with bounded concurrency,
+    skipping registrations that already exist.
+    """
+
+    def __init__(self, service, max_workers=8, checkpoint=None, results=None,
+                 checkpoint_every=100, skip_existing=True):
+        """
+        Arguments:
+        service -- the ScormCloudService to create registrations with
+        max_workers -- the number of registrations created at once
+        checkpoint -- (optional) a file recording the number of input rows
+            fully processed. If it exists, that many rows are skipped
+        results -- (optional) a CSV file receiving one line per row with
+            its status. Appended to when resuming; rows it already records
+            are skipped then, as they were processed before the interruption
+        checkpoint_every -- rows processed between checkpoint writes
+        skip_existing -- if True, take a snapshot of the existing
+            registration ids first and skip rows whose id is in it
+        """
+        self.service = service
+        self.max_workers = max_workers
+        self.checkpoint = checkpoint
+        self.results = results
+        self.checkpoint_every = checkpoint_every
+        self.skip_existing = skip_existing
+
+    def existing_ids(self):
+        """
+        Returns the set of registration ids of the application, from one
+        streamed registration list.
+        """
+        regsvc = self.service.get_registration_service()
+        return set(reg.registrationId for reg in regsvc.iter_registrations())
+
+    def run(self, rows):
+        """
+        Provisions every row and returns a ProvisionStats.
+
+        Arguments:
+        rows -- an iterable of dictionaries, for example from read_csv
+        """
+        stats = ProvisionStats()
+        started = time.time()
+        start_row = self._load_checkpoint()
+        stats.resumed = start_row
+        existing = self.existing_ids() if self.skip_existing else set()
+        regsvc = self.service.get_registration_service()
+        recorded = self._recorded_rows(start_row)
+        out, writer = self._open_results(start_row)
+        progress = _Progress(start_row)
+
+        def record(index, arguments, status, error=None, elapsed=0.0):
+            stats.rows += 1
+            setattr(stats, status, getattr(stats, status) + 1)
+            if writer is not None:
+                writer.writerow([index, arguments.get('regid', ''),
+                                 arguments.get('courseid', ''),
+                                 arguments.get('userid', ''), status,
+                                 '' if error is None else str(error),
+                                 '%.3f' % elapsed])
+            progress.done(index)
+            if stats.rows % self.checkpoint_every == 0:
+                self._save_checkpoint(progress.watermark, out)
+
+        def pending():
+            # Runs on the caller's thread, as Batch.map pulls arguments.
+            for (index, row) in enumerate(rows):
+                if index < start_row:
+                    continue
+                if index in recorded:
+                    stats.resumed += 1
+                    progress.done(index)
+                    continue
+                try:
+                    arguments = registration_arguments(row)
+                except ValueError as e:
+                    record(index, {}, FAILED, e)
+                    continue
+                if arguments['regid'] in existing:
+                    record(index, arguments, SKIPPED)
+                    continue
+                existing.add(arguments['regid'])
+                yield index, arguments
+
+        def create(item):
+            return regsvc.create_registration(**item[1])
+
+        batch = self.service.batch(self.max_workers,
+                                   max_pending=self.max_workers * 4)
+        try:
+            for outcome in batch.map(create, pending()):
+                index, arguments = outcome.args[0]
+                if outcome.ok:
+                    record(index, arguments, CREATED, elapsed=outcome.elapsed)
+                else:
+                    logging.warning('provisioning row %d (%s) failed: %s',
+                                    index, arguments['regid'], outcome.error)
+                    record(index, arguments, FAILED, outcome.error,
+                           outcome.elapsed)
+        finally:
+            self._save_checkpoint(progress.watermark, out)
+            if out is not None:
+                out.close()
+            stats.elapsed = time.time() - started
+        return stats
+
+    def _load_checkpoint(self):
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as f:
+            return int(json.load(f)['rows'])
+
+    def _save_checkpoint(self, rows, out=None):
+        # The rows a checkpoint covers must be in the results file first,
+        # or a crash right after it would lose them.
+        if out is not None:
+            out.flush()
+            os.fsync(out.fileno())
+        if self.checkpoint is None:
+            return
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'rows': rows, 'time': time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(temporary, self.checkpoint)
+
+    def _recorded_rows(self, start_row):
+        """
+        Returns the indexes, from start_row on, of the rows that the results
+        file records as processed.
+        """
+        if self.results is None or start_row == 0 or \
+                not os.path.exists(self.results):
+            return set()
+        recorded = set()
+        for row in read_csv(self.results):
+            try:
+                index = int(row.get('row') or '')
+            except ValueError:
+                continue
+            if index >= start_row and row.get('status') in (CREATED, SKIPPED,
+                                                            FAILED):
+                recorded.add(index)
+        return recorded
+
+    def _open_results(self, start_row):
+        if self.results is None:
+            return None, None
+        append = start_row > 0 and os.path.exists(self.results)
+        if append:
+            _drop_partial_line(self.results)
+        mode = 'a' if append else 'w'
+        if six.PY2:
+            out = open(self.results, mode + 'b')
+        else:
+            out = io.open(self.results, mode, newline='', encoding='utf8')
+        writer = csv.writer(out)
+        if not append:
+            writer.writerow(RESULT_COLUMNS)
+        return out, writer
+
+
+def _drop_partial_line(path):
+    """
+    Truncates a file after its last newline, removing a line that was only
+    partly written when the process stopped.
+    """
+    with open(path, 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        end = size
+        while end > 0:
+            f.seek(max(0, end - 4096))
+            chunk = f.read(end - max(0, end - 4096))
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                end = end - len(chunk) + newline + 1
+                break
+            end -= len(chunk)
+        if end != size:
+            f.truncate(end)
+
+
+class _Progress(object):
+    """
+    Tracks the watermark below which every row index has been processed,
+    when rows complete out of order.
+    """
+
+    def __init__(self, start):
+        self.watermark = start
+        self._done = set()
+
+    def done(self, index):
+        self._done.add(index)
+        while self.watermark in self._done:
+            self._done.remove(self.watermark)
+            self.watermark += 1
+
+
+def provision(service, rows, **options):
+    """
+    Provisions registrations for rows and returns a ProvisionStats. See
+    Provisioner for the options.
+    """
+    return Provisioner(service, **options).run(rows)
@@ -0,0 +1,384 @@
+"""
+Client-side rate limiting of SCORM Cloud calls.
+
+A RateLimiter holds a token bucket for each application and method family.
+Every attempt ServiceRequest sends takes a token first, waiting for one if
+the bucket is empty, so that retries are paced as well:
+
+    limiter = RateLimiter({'rustici.registration.*': 20,
+                           'rustici.course.importCourse': (0.5, 2),
+                           '*': 10},
+                          apps={'bulk-app': {'*': 50}})
+    service = ScormCloudService(config, rate_limiter=limiter)
+
+Rates are in calls per second, optionally with a burst size. A family is
+matched by its exact method name, or else by the longest matching pattern
+ending in *. Calls to methods that match no pattern are not limited. Each
+application gets buckets of its own, with the rates given for it in apps
+if there are any.
+
+The limiter adapts the rate it allows each family. A throttling response
+(HTTP 429 or 503) brings the rate down to just under the rate of calls
+that the service was actually answering. Header latency rising well above
+its usual level lowers it a little. While calls succeed, the rate climbs
+back steadily, up to the configured rate. Decreases are at most one per
+cooldown period, so that one burst of throttled calls does not collapse
+the rate. The aggregate rate thus settles just under what the service
+allows instead of swinging between bursts and rounds of retries.
+
+Buckets are kept in memory by default, shared by the threads using the
+limiter. A FileBackend keeps them in a small memory-mapped file instead,
+shared by every process that uses the same file:
+
+    limiter = RateLimiter(rates, backend=FileBackend('/tmp/scormcloud.rates'))
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .errors import ScormCloudTimeoutError
+
+# HTTP statuses the SCORM Cloud answers with when a client sends too much.
+THROTTLE_STATUSES = frozenset([429, 503])
+
+# The fields of a bucket's state.
+(_TOKENS, _UPDATED, _ALLOWED, _LATENCY, _USUAL_LATENCY, _DECREASED,
+ _INCREASED, _WINDOW_START, _WINDOW_CALLS, _SERVED) = range(10)
+_STATE_FIELDS = 10
+
+
+class RateLimiter(object):
+    """
+    Token buckets per application and method family, shared by the threads
+    (and, with a FileBackend, the processes) that use the limiter.
+    """
+
+    def __init__(self, rates=None, apps=None, backend=None, adaptive=True,
+                 min_fraction=0.05, increase=0.05, decrease=0.9,
+                 latency_factor=2.0, latency_decrease=0.9, cooldown=1.0):
+        """
+        Arguments:
+        rates -- a dictionary of method name or pattern to calls per second,
+            or to a (calls per second, burst) tuple. Defaults to 10 calls
+            per second for every method
+        apps -- (optional) a dictionary of application id to a rates
+            dictionary used instead of rates for that application
+        backend -- (optional) where the buckets are kept: a MemoryBackend
+            (the default) or a FileBackend
+        adaptive -- whether to adapt the rates to throttling and latency
+        min_fraction -- the lowest fraction of its configured rate that a
+            family is slowed down to
+        increase -- the fraction of the configured rate that a family's
+            rate climbs back by per second while calls succeed
+        decrease -- the fraction of the rate the service was answering that
+            a family is slowed down to when a call is throttled
+        latency_factor -- how many times its usual header latency a
+            family's recent latency must reach to be slowed down
+        latency_decrease -- the factor a family's rate is multiplied by
+            when its latency is too high
+        cooldown -- the minimum number of seconds between two decreases of
+            a family's rate
+        """
+        if not 0 < min_fraction <= 1:
+            raise ValueError('min_fraction must be above 0 and at most 1')
+        self.rates = _limits(rates if rates is not None else {'*': 10})
+        self.apps = dict((appid, _limits(app_rates))
+                         for (appid, app_rates) in (apps or {}).items())
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.adaptive = adaptive
+        self.min_fraction = min_fraction
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency_decrease = latency_decrease
+        self.cooldown = cooldown
+        self._families = {}
+
+    def family(self, appid, method):
+        """
+        Returns the bucket key, rate and burst of the family of method for
+        the application, or None if its calls are not limited.
+        """
+        found = self._families.get((appid, method), False)
+        if found is not False:
+            return found
+        limits = self.apps.get(appid, self.rates)
+        pattern = _match(limits, method or '')
+        found = None
+        if pattern is not None:
+            (rate, burst) = limits[pattern]
+            found = ('%s|%s' % (appid, pattern), rate, burst)
+        self._families[(appid, method)] = found
+        return found
+
+    def reserve(self, appid, method, timeout=None):
+        """
+        Takes a token for a call and returns the number of seconds the call
+        must wait before it is sent. Raises ScormCloudTimeoutError, without
+        taking the token, if the wait would be longer than timeout.
+        """
+        family = self.family(appid, method)
+        if family is None:
+            return 0.0
+        (key, rate, burst) = family
+
+        def take(state):
+            state = _refill(state, time.time(), rate, burst)
+            wait = max(0.0, (1.0 - state[_TOKENS]) / state[_ALLOWED])
+            if timeout is not None and wait > timeout:
+                return state, None
+            state[_TOKENS] -= 1.0
+            return state, wait
+
+        wait = self.backend.update(key, take)
+        if wait is None:
+            raise ScormCloudTimeoutError('Waiting for the %s rate limit would '
+                                         'exceed the call deadline' % method)
+        return wait
+
+    def acquire(self, appid, method, timeout=None):
+        """
+        Takes a token for a call, sleeping until the call may be sent.
+        Returns the number of seconds waited.
+        """
+        wait = self.reserve(appid, method, timeout)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record(self, appid, method, latency=None, throttled=False):
+        """
+        Adapts the rate of a method's family to the outcome of a call.
+
+        Arguments:
+        appid -- the application id of the call
+        method -- the web service method called
+        latency -- (optional) the seconds until the response headers
+            arrived, for calls that got a response
+        throttled -- whether the service refused the call as too many
+        """
+        family = self.family(appid, method)
+        if family is None or not self.adaptive:
+            return
+        (key, rate, burst) = family
+
+        def adapt(state):
+            now = time.time()
+            state = _refill(state, now, rate, burst)
+            if throttled:
+                served = state[_SERVED] or state[_ALLOWED]
+                self._slow_down(state, now, rate, min(
+                    state[_ALLOWED], served * self.decrease))
+                return state, None
+            _count(state, now)
+            if latency is not None and self._slow(state, latency):
+                self._slow_down(state, now, rate,
+                                state[_ALLOWED] * self.latency_decrease)
+                return state, None
+            elapsed = min(1.0, max(0.0, now - state[_INCREASED]))
+            state[_ALLOWED] = min(rate, state[_ALLOWED] +
+                                  rate * self.increase * elapsed)
+            state[_INCREASED] = now
+            return state, None
+
+        self.backend.update(key, adapt)
+
+    def current_rate(self, appid, method):
+        """
+        Returns the calls per second currently allowed for a method's
+        family, or None if its calls are not limited.
+        """
+        family = self.family(appid, method)
+        if family is None:
+            return None
+        (key, rate, burst) = family
+
+        def read(state):
+            state = _refill(state, time.time(), rate, burst)
+            return state, state[_ALLOWED]
+
+        return self.backend.update(key, read)
+
+    def _slow(self, state, latency):
+        """
+        Adds latency to the family's recent and usual latency and returns
+        True if the recent latency is too far above the usual one.
+        """
+        recent = state[_LATENCY]
+        recent = latency if not recent else recent + (latency - recent) * 0.2
+        state[_LATENCY] = recent
+        # The usual latency follows drops at once and rises slowly, so that
+        # a lasting change becomes the new normal.
+        usual = state[_USUAL_LATENCY]
+        if not usual or recent < usual:
+            state[_USUAL_LATENCY] = recent
+        else:
+            state[_USUAL_LATENCY] = usual + (recent - usual) * 0.01
+        return recent > state[_USUAL_LATENCY] * self.latency_factor
+
+    def _slow_down(self, state, now, rate, allowed):
+        if now - state[_DECREASED] < self.cooldown:
+            return
+        state[_ALLOWED] = max(rate * self.min_fraction, allowed)
+        state[_DECREASED] = state[_INCREASED] = now
+
+
+def _refill(state, now, rate, burst):
+    if state is None:
+        state = [0.0] * _STATE_FIELDS
+        state[_TOKENS] = burst
+        state[_ALLOWED] = rate
+        state[_UPDATED] = state[_INCREASED] = state[_WINDOW_START] = now
+        return state
+    allowed = state[_ALLOWED] = min(state[_ALLOWED], rate)
+    # The burst shrinks with the allowed rate, so that a slowed down family
+    # does not send its full burst at once.
+    state[_TOKENS] = min(burst * allowed / rate, state[_TOKENS] + max(
+        0.0, now - state[_UPDATED]) * allowed)
+    state[_UPDATED] = now
+    return state
+
+
+def _count(state, now):
+    """
+    Counts a successful call towards the rate of calls the service
+    answers, measured over windows of at least a second.
+    """
+    state[_WINDOW_CALLS] += 1
+    elapsed = now - state[_WINDOW_START]
+    if elapsed >= 1.0:
+        state[_SERVED] = state[_WINDOW_CALLS] / elapsed
+        state[_WINDOW_START] = now
+        state[_WINDOW_CALLS] = 0
+
+
+class MemoryBackend(object):
+    """
+    Keeps the buckets in a dictionary, shared by the threads of a process.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, fn):
+        """
+        Replaces the state of a bucket with the state returned by fn, called
+        with the current state or None, and returns fn's result. Updates
+        are atomic.
+        """
+        with self._lock:
+            (state, result) = fn(self._states.get(key))
+            self._states[key] = state
+        return result
+
+
+class FileBackend(object):
+    """
+    Keeps the buckets in a memory-mapped file, shared by every process that
+    opens the same path. Updates are serialized with a lock on the file.
+    When every slot is taken, the bucket updated longest ago is dropped to
+    make room. Requires a POSIX system.
+    """
+    MAGIC = b'SCRATES2'
+    _SLOT = struct.Struct('=16s%dd' % _STATE_FIELDS)
+
+    def __init__(self, path, slots=256):
+        """
+        Arguments:
+        path -- the file to keep the buckets in. It is created if needed
+        slots -- the number of buckets the file holds, if it is created
+        """
+        import fcntl
+        self._fcntl = fcntl
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._fd).st_size
+            if size == 0:
+                size = len(self.MAGIC) + slots * self._SLOT.size
+                os.write(self._fd, self.MAGIC)
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        if self._map[:len(self.MAGIC)] != self.MAGIC:
+            self.close()
+            raise ValueError('%s is not a rate limiter file' % path)
+        self.slots = (size - len(self.MAGIC)) // self._SLOT.size
+        self._lock = threading.Lock()
+
+    def update(self, key, fn):
+        """
+        See MemoryBackend.update.
+        """
+        digest = hashlib.md5(key.encode('utf8')).digest()
+        fcntl = self._fcntl
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                offset = self._slot(digest)
+                fields = self._SLOT.unpack_from(self._map, offset)
+                (state, result) = fn(list(fields[1:]) if fields[0] == digest
+                                     else None)
+                self._SLOT.pack_into(self._map, offset, digest, *state)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return result
+
+    def _slot(self, digest):
+        size = self._SLOT.size
+        start = struct.unpack_from('=I', digest)[0] % self.slots
+        empty = b'\0' * 16
+        oldest = None
+        for i in range(self.slots):
+            offset = len(self.MAGIC) + (start + i) % self.slots * size
+            found = self._map[offset:offset + 16]
+            if found == digest or found == empty:
+                return offset
+            updated = struct.unpack_from('=d', self._map,
+                                         offset + 16 + 8 * _UPDATED)[0]
+            if oldest is None or updated < oldest[0]:
+                oldest = (updated, offset)
+        # Full: reuse the bucket updated longest ago. Its family starts over
+        # with a full bucket the next time it is used.
+        (updated, offset) = oldest
+        if time.time() - updated < 60:
+            logging.warning('Rate limiter file %s is full; dropping a bucket '
+                            'in use. Create it with more slots', self.path)
+        return offset
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+def _limits(rates):
+    limits = {}
+    for (pattern, limit) in rates.items():
+        if isinstance(limit, (tuple, list)):
+            (rate, burst) = limit
+        else:
+            (rate, burst) = (limit, max(1.0, limit))
+        if not rate > 0 or not burst > 0:
+            raise ValueError('the rate and burst of %s must be positive' %
+                             pattern)
+        limits[pattern] = (float(rate), float(burst))
+    return limits
+
+
+def _match(limits, method):
+    if method in limits:
+        return method
+    best = None
+    for pattern in limits:
+        if pattern.endswith('*') and method.startswith(pattern[:-1]) and \
+                (best is None or len(pattern) > len(best)):
+            best = pattern
+    return best
@@ -0,0 +1,90 @@
+"""
+Base class for the compact result objects returned by the services.
+"""
+
+
+class Record(object):
+    """
+    Slotted value object. Subclasses list their attributes in both
+    __slots__ and _fields, and set every one of them in __init__.
+
+    Records compare equal when they are of the same class and their fields
+    are equal, are hashable when their fields are, and convert cheaply to
+    and from tuples and dictionaries.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def as_tuple(self):
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self._fields)
+
+    @classmethod
+    def from_tuple(cls, values):
+        """
+        Builds a record from a tuple of field values in _fields order, as
+        returned by as_tuple, without parsing anything.
+        """
+        record = cls.__new__(cls)
+        for (name, value) in zip(cls._fields, values):
+            setattr(record, name, value)
+        return record
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self._fields))
+
+    def __getstate__(self):
+        return self.as_tuple()
+
+    def __setstate__(self, state):
+        for (name, value) in zip(self._fields, state):
+            setattr(self, name, value)
+
+
+def parse_int(value, default=None):
+    """
+    Returns value as an int, or default if it is missing or not a number.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_number(value, default=None):
+    """
+    Returns value as an int if it is integral and as a float otherwise, or
+    default if it is missing or not a number.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_bool(value):
+    """
+    Returns True for the API's 'true' (in any case), False otherwise.
+    """
+    return value is not None and value.strip().lower() == 'true'
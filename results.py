@@ -0,0 +1,527 @@
+"""
+Lazily parsed result objects for registration reports and launch history.
+
+The objects wrap the lxml or ElementTree element of the parsed response and
+read values out of it only when they are accessed. Top-level registration
+fields are read once, up front; activities, objectives, interactions and
+runtime data are wrapped on first access, so a large full-format report
+costs little until its detail is actually used.
+"""
+
+from . import parsing
+from .records import Record, parse_bool, parse_int, parse_number
+
+
+def root_of(xmldoc):
+    """
+    Returns the etree root element of a parsed response. Documents from the
+    minidom parser are re-parsed with ElementTree.
+    """
+    if isinstance(xmldoc, parsing.Document):
+        return xmldoc.root
+    return parsing.ElementTreeParser().parse(xmldoc.toxml('utf-8')).root
+
+
+def _score(value):
+    # 'unknown' and empty scores are reported as None.
+    return parse_number(value)
+
+
+class Node(object):
+    """
+    Base class of the lazy result objects: a wrapper around one element with
+    helpers to read the text of its children.
+    """
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    def get(self, tag, default=None):
+        """
+        Returns the text of the first child element named tag, or default if
+        there is no such child.
+        """
+        text = _child_text(self.element, tag)
+        return default if text is None else text
+
+    def _list(self, path, cls):
+        return [cls(element) for element in self.element.iterfind(path)]
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__,
+                            self.element.get('id', ''))
+
+
+class Objective(Node):
+    """
+    An objective of an activity, either from the sequencing data or from the
+    runtime data.
+    """
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self.element.get('id')
+
+    @property
+    def measurestatus(self):
+        return parse_bool(self.get('measurestatus'))
+
+    @property
+    def normalizedmeasure(self):
+        return parse_number(self.get('normalizedmeasure'))
+
+    @property
+    def progressstatus(self):
+        return parse_bool(self.get('progressstatus'))
+
+    @property
+    def satisfiedstatus(self):
+        return parse_bool(self.get('satisfiedstatus'))
+
+    @property
+    def success_status(self):
+        return self.get('success_status')
+
+    @property
+    def completion_status(self):
+        return self.get('completion_status')
+
+    @property
+    def score_scaled(self):
+        return _score(self.get('score_scaled'))
+
+    @property
+    def score_raw(self):
+        return _score(self.get('score_raw'))
+
+
+class Interaction(Node):
+    """
+    A learner interaction recorded in an activity's runtime data.
+    """
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self.element.get('id')
+
+    @property
+    def type(self):
+        return self.get('type')
+
+    @property
+    def timestamp(self):
+        return self.get('timestamp')
+
+    @property
+    def weighting(self):
+        return parse_number(self.get('weighting'))
+
+    @property
+    def learner_response(self):
+        return self.get('learner_response')
+
+    @property
+    def result(self):
+        return self.get('result')
+
+    @property
+    def latency(self):
+        return self.get('latency')
+
+    @property
+    def description(self):
+        return self.get('description')
+
+    @property
+    def objectives(self):
+        return tuple(e.get('id') for e in
+                     self.element.iterfind('objectives/objective'))
+
+    @property
+    def correct_responses(self):
+        return tuple(e.get('id') for e in
+                     self.element.iterfind('correct_responses/response'))
+
+
+class Runtime(Node):
+    """
+    The SCORM runtime data of an activity.
+    """
+    __slots__ = ('_interactions', '_objectives')
+
+    def __init__(self, element):
+        Node.__init__(self, element)
+        self._interactions = None
+        self._objectives = None
+
+    def __repr__(self):
+        return '<Runtime %s>' % self.completion_status
+
+    @property
+    def completion_status(self):
+        return self.get('completion_status')
+
+    @property
+    def success_status(self):
+        return self.get('success_status')
+
+    @property
+    def credit(self):
+        return self.get('credit')
+
+    @property
+    def entry(self):
+        return self.get('entry')
+
+    @property
+    def exit(self):
+        return self.get('exit')
+
+    @property
+    def location(self):
+        return self.get('location')
+
+    @property
+    def mode(self):
+        return self.get('mode')
+
+    @property
+    def progress_measure(self):
+        return parse_number(self.get('progress_measure'))
+
+    @property
+    def score_scaled(self):
+        return _score(self.get('score_scaled'))
+
+    @property
+    def score_raw(self):
+        return _score(self.get('score_raw'))
+
+    @property
+    def score_min(self):
+        return _score(self.get('score_min'))
+
+    @property
+    def score_max(self):
+        return _score(self.get('score_max'))
+
+    @property
+    def total_time(self):
+        return self.get('total_time')
+
+    @property
+    def timetracked(self):
+        return self.get('timetracked')
+
+    @property
+    def suspend_data(self):
+        return self.get('suspend_data')
+
+    @property
+    def interactions(self):
+        if self._interactions is None:
+            self._interactions = self._list('interactions/interaction',
+                                            Interaction)
+        return self._interactions
+
+    @property
+    def objectives(self):
+        if self._objectives is None:
+            self._objectives = self._list('objectives/objective', Objective)
+        return self._objectives
+
+
+class Activity(Node):
+    """
+    One activity of a registration report. Child activities, objectives and
+    runtime data are wrapped the first time they are accessed.
+    """
+    __slots__ = ('_children', '_objectives', '_runtime')
+
+    def __init__(self, element):
+        Node.__init__(self, element)
+        self._children = None
+        self._objectives = None
+        self._runtime = None
+
+    @property
+    def id(self):
+        return self.element.get('id')
+
+    @property
+    def title(self):
+        return self.get('title')
+
+    @property
+    def attempts(self):
+        return parse_int(self.get('attempts'))
+
+    @property
+    def complete(self):
+        return self.get('complete')
+
+    @property
+    def success(self):
+        return self.get('success')
+
+    @property
+    def time(self):
+        return self.get('time')
+
+    @property
+    def score(self):
+        return _score(self.get('score'))
+
+    @property
+    def satisfied(self):
+        return parse_bool(self.get('satisfied'))
+
+    @property
+    def completed(self):
+        return parse_bool(self.get('completed'))
+
+    @property
+    def suspended(self):
+        return parse_bool(self.get('suspended'))
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = self._list('children/activity', Activity)
+        return self._children
+
+    @property
+    def objectives(self):
+        if self._objectives is None:
+            self._objectives = self._list('objectives/objective', Objective)
+        return self._objectives
+
+    @property
+    def runtime(self):
+        """
+        The Runtime data of the activity, or None if the report does not
+        include it.
+        """
+        if self._runtime is None:
+            element = self.element.find('runtime')
+            if element is not None:
+                self._runtime = Runtime(element)
+        return self._runtime
+
+    def walk(self):
+        """
+        Yields this activity and all of its descendants, depth first.
+        """
+        yield self
+        for child in self.children:
+            for activity in child.walk():
+                yield activity
+
+
+class RegistrationResult(object):
+    """
+    The result of rustici.registration.getRegistrationResult in any results
+    format. complete, success, score and totaltime are read immediately;
+    for the activity and full formats the activity tree is available
+    through activity and find_activity.
+    """
+
+    def __init__(self, xmldoc):
+        """
+        Arguments:
+        xmldoc -- the parsed result of the API method
+        """
+        root = root_of(xmldoc)
+        report = root.find('registrationreport')
+        if report is None:
+            report = root
+        self.element = report
+        self.format = report.get('format')
+        self.regid = report.get('regid')
+        self.instanceid = parse_int(report.get('instanceid'))
+        self._activity = None
+        self._index = None
+        top = report.find('activity')
+        source = report if top is None else top
+        self.complete = _child_text(source, 'complete')
+        self.success = _child_text(source, 'success')
+        self.score = _score(_child_text(source, 'score'))
+        totaltime = _child_text(report, 'totaltime')
+        if totaltime is None and top is not None:
+            totaltime = _child_text(top, 'time')
+        self.totaltime = totaltime
+
+    def __repr__(self):
+        return ('RegistrationResult(regid=%r, complete=%r, success=%r, '
+                'score=%r)' % (self.regid, self.complete, self.success,
+                               self.score))
+
+    @property
+    def activity(self):
+        """
+        The root Activity, or None for the course results format.
+        """
+        if self._activity is None:
+            element = self.element.find('activity')
+            if element is not None:
+                self._activity = Activity(element)
+        return self._activity
+
+    def activities(self):
+        """
+        Returns an iterator over every activity in the report, depth first.
+        """
+        if self.activity is None:
+            return iter(())
+        return self.activity.walk()
+
+    def find_activity(self, activityid):
+        """
+        Returns the Activity with the given id, or None. The index of
+        activities by id is built on the first lookup.
+
+        Arguments:
+        activityid -- the identifier of the activity
+        """
+        if self._index is None:
+            self._index = dict((element.get('id'), element) for element in
+                               self.element.iter('activity'))
+        element = self._index.get(activityid)
+        if element is None:
+            return None
+        return Activity(element)
+
+
+class Instance(Record):
+    __slots__ = _fields = ('instanceId', 'courseVersion', 'updateDate')
+
+    def __init__(self, element):
+        self.instanceId = parse_int(_child_text(element, 'instanceId'))
+        self.courseVersion = parse_int(_child_text(element, 'courseVersion'))
+        self.updateDate = _child_text(element, 'updateDate')
+
+
+class RegistrationDetail(object):
+    """
+    The result of rustici.registration.getRegistrationDetail. The
+    registration's fields are read immediately; instances are built on
+    first access.
+    """
+
+    _fields = ('appId', 'registrationId', 'courseId', 'courseTitle',
+               'lastCourseVersionLaunched', 'learnerId', 'learnerFirstName',
+               'learnerLastName', 'email', 'createDate', 'firstAccessDate',
+               'lastAccessDate', 'completedDate')
+
+    def __init__(self, xmldoc):
+        """
+        Arguments:
+        xmldoc -- the parsed result of the API method
+        """
+        root = root_of(xmldoc)
+        registration = root.find('registration')
+        if registration is None:
+            registration = root
+        self.element = registration
+        for name in self._fields:
+            setattr(self, name, _child_text(registration, name))
+        if self.registrationId is None:
+            self.registrationId = registration.get('id')
+        if self.courseId is None:
+            self.courseId = registration.get('courseid')
+        self._instances = None
+
+    def __repr__(self):
+        return 'RegistrationDetail(registrationId=%r, courseId=%r)' % (
+            self.registrationId, self.courseId)
+
+    @property
+    def instances(self):
+        if self._instances is None:
+            self._instances = [Instance(element) for element in
+                               self.element.iterfind('instances/instance')]
+        return self._instances
+
+
+class LaunchInfo(Node):
+    """
+    One launch of a registration, from rustici.registration.getLaunchHistory
+    or rustici.registration.getLaunchInfo. Only the latter includes the log.
+    """
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self.element.get('id')
+
+    @property
+    def completion(self):
+        return self.get('completion')
+
+    @property
+    def satisfaction(self):
+        return self.get('satisfaction')
+
+    @property
+    def measure_status(self):
+        return parse_bool(self.get('measure_status'))
+
+    @property
+    def normalized_measure(self):
+        return parse_number(self.get('normalized_measure'))
+
+    @property
+    def experienced_duration_tracked(self):
+        return parse_int(self.get('experienced_duration_tracked'))
+
+    @property
+    def launch_time(self):
+        return self.get('launch_time')
+
+    @property
+    def exit_time(self):
+        return self.get('exit_time')
+
+    @property
+    def update_dt(self):
+        return self.get('update_dt')
+
+    @property
+    def log(self):
+        """
+        The launch log element, or None if the response has none.
+        """
+        return self.element.find('log')
+
+    @classmethod
+    def list_from_result(cls, xmldoc):
+        """
+        Returns a list of LaunchInfo objects for the launch elements of a
+        getLaunchHistory result.
+
+        Arguments:
+        xmldoc -- the parsed result of the API method
+        """
+        return [cls(element) for element in root_of(xmldoc).iter('launch')]
+
+    @classmethod
+    def result_from_xmldoc(cls, xmldoc):
+        """
+        Returns the LaunchInfo of a getLaunchInfo result.
+
+        Arguments:
+        xmldoc -- the parsed result of the API method
+        """
+        root = root_of(xmldoc)
+        element = root.find('launch')
+        return cls(root if element is None else element)
+
+
+def _child_text(element, tag):
+    child = element.find(tag)
+    if child is None:
+        return None
+    return child.text or ''
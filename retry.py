@@ -0,0 +1,231 @@
+import random
+import threading
+import time
+
+from .errors import (ScormCloudCircuitOpenError, ScormCloudConnectionError,
+                     ScormCloudHTTPError, ScormCloudTimeoutError,
+                     ScormCloudTransportError)
+from .lazy import LazyModule
+
+requests = LazyModule('requests')
+
+# Web service methods that change state in a way that repeating the call would
+# repeat the change (or fail because the first call already succeeded).
+# Methods whose name starts with one of NON_IDEMPOTENT_PREFIXES are included
+# as well.
+NON_IDEMPOTENT_METHODS = frozenset([
+    'rustici.lrsaccount.resetAppLrsAuthCallbackUrl',
+    'rustici.registration.testRegistrationPostUrl',
+])
+NON_IDEMPOTENT_PREFIXES = ('create', 'import', 'delete', 'upload', 'copy')
+
+
+def is_idempotent(method):
+    """
+    Returns True if the web service method can safely be sent again after a
+    failure that may have happened after the server received it.
+
+    Arguments:
+    method -- the full name of the web service method
+    """
+    if method is None or method in NON_IDEMPOTENT_METHODS:
+        return False
+    return not method.rsplit('.', 1)[-1].startswith(NON_IDEMPOTENT_PREFIXES)
+
+
+class Deadline(object):
+    """
+    A time budget for one service call, covering connecting, reading and all
+    retries.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.time() + seconds
+
+    def remaining(self):
+        return self.expires - time.time()
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def __repr__(self):
+        return 'Deadline(%.3fs remaining)' % self.remaining()
+
+
+class RetryPolicy(object):
+    """
+    Decides whether, and after how long, a failed call is retried. Retries
+    use exponential backoff with full jitter. Only retryable errors are
+    retried, and non-idempotent methods are only retried when the request
+    never reached the server.
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=0.5, backoff_max=30.0,
+                 jitter=True, deadline=None):
+        """
+        Arguments:
+        max_attempts -- the maximum number of attempts per call, including the
+            first. 1 disables retries
+        backoff_base -- the delay in seconds before the first retry; it
+            doubles with every further attempt
+        backoff_max -- the largest delay in seconds between two attempts
+        jitter -- if True, each delay is drawn uniformly between zero and the
+            exponential delay, so that many clients failing together do not
+            retry in lockstep
+        deadline -- (optional) the total number of seconds a call may take,
+            including every attempt and the delays between them
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def __repr__(self):
+        return ('RetryPolicy(max_attempts=%s, backoff_base=%s, '
+                'backoff_max=%s, deadline=%s)' % (
+                    self.max_attempts, self.backoff_base, self.backoff_max,
+                    self.deadline))
+
+    def start(self):
+        """
+        Returns the Deadline for a call starting now, or None if calls are
+        not time-limited.
+        """
+        if self.deadline is None:
+            return None
+        return Deadline(self.deadline)
+
+    def should_retry(self, method, error, attempts):
+        """
+        Returns True if a call to method that failed with error after the
+        given number of attempts should be tried again.
+        """
+        if attempts >= self.max_attempts or not error.retryable:
+            return False
+        if is_idempotent(method):
+            return True
+        return isinstance(error, ScormCloudTimeoutError) and error.connect
+
+    def backoff(self, attempts):
+        """
+        Returns the delay in seconds before the next attempt, after the given
+        number of failed attempts.
+        """
+        delay = min(self.backoff_max,
+                    self.backoff_base * (2 ** (attempts - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def timeout(self, transport, deadline):
+        """
+        Returns the (connect, read) timeout for the next attempt, shortened
+        to fit within the deadline.
+        """
+        connect, read = transport.connect_timeout, transport.read_timeout
+        if deadline is None:
+            return (connect, read)
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise ScormCloudTimeoutError('SCORM Cloud call deadline of %ss '
+                                         'exceeded' % deadline.seconds)
+        return (min(connect, remaining), min(read, remaining))
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class CircuitBreaker(object):
+    """
+    Stops sending calls for a while after repeated transport failures, so
+    that callers fail fast while the SCORM Cloud is unreachable or degraded.
+
+    After failure_threshold consecutive failures the circuit opens and every
+    call raises ScormCloudCircuitOpenError. Once reset_timeout seconds have
+    passed, a single trial call is let through: if it gets any response,
+    even an HTTP error, the circuit closes; if it fails to reach the service
+    it opens again. Every call let through by before_call must end in
+    record_success, record_failure or release.
+
+    A CircuitBreaker may be shared between threads and services.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'CircuitBreaker(state=%s, failures=%d)' % (self.state,
+                                                           self.failures)
+
+    def before_call(self):
+        """
+        Raises ScormCloudCircuitOpenError if calls are currently refused.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if (self.state == self.OPEN and
+                    time.time() - self.opened_at >= self.reset_timeout):
+                self.state = self.HALF_OPEN
+                return
+            raise ScormCloudCircuitOpenError(
+                'SCORM Cloud circuit breaker is open after %d failures' %
+                self.failures)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def release(self):
+        """
+        Ends a call let through by before_call that neither succeeded nor
+        failed, for example because it was interrupted before it reached
+        the network. If it was the trial call, the next call is let through
+        as a new trial.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if (self.state == self.HALF_OPEN or
+                    self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+
+def transport_error(e):
+    """
+    Converts an exception raised by the requests library into the matching
+    ScormCloudTransportError subclass.
+
+    Arguments:
+    e -- the requests exception
+    """
+    if isinstance(e, requests.ConnectTimeout):
+        return ScormCloudTimeoutError('Timed out connecting to the SCORM '
+                                      'Cloud: %s' % e, e, connect=True)
+    if isinstance(e, requests.Timeout):
+        return ScormCloudTimeoutError('Timed out waiting for the SCORM '
+                                      'Cloud: %s' % e, e)
+    if isinstance(e, requests.HTTPError):
+        status = e.response.status_code if e.response is not None else 0
+        return ScormCloudHTTPError('SCORM Cloud HTTP error: %s' % e, status, e)
+    if isinstance(e, requests.ConnectionError):
+        return ScormCloudConnectionError('Could not reach the SCORM Cloud: '
+                                         '%s' % e, e)
+    return ScormCloudTransportError('SCORM Cloud request failed: %s' % e, e)
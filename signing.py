@@ -0,0 +1,154 @@
+import time
+
+from six.moves import urllib
+
+# Smartly import hashlib and fall back on md5
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+
+class UrlSigner(object):
+    """
+    Builds signed SCORM Cloud URLs. The work that is the same for every URL
+    (hashing the secret, encoding and ordering the appid, origin and applib
+    parameters, formatting the timestamp) is done once, or once per second
+    for the timestamp, so signing many URLs in a row is cheap.
+
+    A UrlSigner is normally obtained from ScormCloudService.signer and may be
+    shared between threads.
+    """
+
+    def __init__(self, config):
+        """
+        Arguments:
+        config -- the Configuration holding the appid, secret and origin
+        """
+        self.appid = config.appid
+        self.secret = config.secret
+        self.origin = config.origin
+        self.serviceurl = config.serviceurl
+        self._secret_md5 = md5(self.secret.encode('utf8'))
+        # Parameters every call carries, in signing order. ts is filled in
+        # per call.
+        static = [('appid', self.appid), ('origin', self.origin),
+                  ('applib', 'python'), ('ts', None)]
+        static.sort(key=lambda kv: kv[0].lower())
+        self._static = [(key, key.lower(), value,
+                         None if value is None else
+                         key + '=' + urllib.parse.quote_plus(value))
+                        for (key, value) in static]
+        self._static_keys = frozenset(key for (key, value) in static)
+        self._ts_second = None
+        self._ts = None
+        self._base_urls = {}
+
+    def matches(self, config):
+        """
+        Returns True if this signer was built for the given configuration.
+        """
+        return (self.appid == config.appid and self.secret == config.secret and
+                self.origin == config.origin and
+                self.serviceurl == config.serviceurl)
+
+    def timestamp(self):
+        """
+        Returns the current UTC time formatted for the ts parameter.
+        """
+        now = int(time.time())
+        if now != self._ts_second:
+            self._ts = time.strftime('%Y%m%d%H%M%S', time.gmtime(now))
+            self._ts_second = now
+        return self._ts
+
+    def base_url(self, serviceurl=None):
+        """
+        Returns the cleaned-up API URL for the given service URL, or for the
+        configured one.
+        """
+        if serviceurl is None:
+            serviceurl = self.serviceurl
+        base = self._base_urls.get(serviceurl)
+        if base is None:
+            from .client import ScormCloudUtilities
+            base = ScormCloudUtilities.clean_cloud_host_url(serviceurl)
+            self._base_urls[serviceurl] = base
+        return base
+
+    def encode_and_sign(self, parameters, ts=None):
+        """
+        URL encodes the parameters together with appid, origin, applib and ts
+        and appends the signature. Returns the query string.
+
+        Arguments:
+        parameters -- the dictionary containing the key/value parameter pairs
+            of the call, including method
+        ts -- (optional) the timestamp to sign with. Defaults to now
+        """
+        if ts is None:
+            ts = self.timestamp()
+        static_keys = self._static_keys
+        dynamic = sorted(((key.lower(), key, value)
+                          for (key, value) in parameters.items()
+                          if key not in static_keys))
+        quote_plus = urllib.parse.quote_plus
+        signing = []
+        values = []
+        i = 0
+        count = len(dynamic)
+        for (key, lkey, value, encoded) in self._static:
+            while i < count and dynamic[i][0] < lkey:
+                _, dkey, dvalue = dynamic[i]
+                signing.append(dkey)
+                signing.append(dvalue)
+                values.append(dkey + '=' + quote_plus(dvalue))
+                i += 1
+            if value is None:
+                value = ts
+                encoded = key + '=' + ts
+            signing.append(key)
+            signing.append(value)
+            values.append(encoded)
+        for _, dkey, dvalue in dynamic[i:]:
+            signing.append(dkey)
+            signing.append(dvalue)
+            values.append(dkey + '=' + quote_plus(dvalue))
+
+        digest = self._secret_md5.copy()
+        digest.update(''.join(signing).encode('utf8'))
+        values.append('sig=' + digest.hexdigest())
+        return '&'.join(values)
+
+    def sign(self, method, parameters, serviceurl=None):
+        """
+        Returns the full signed URL for a call to method with parameters.
+
+        Arguments:
+        method -- the full name of the web service method
+        parameters -- the dictionary of parameters for the call
+        serviceurl -- (optional) overrides the configured service URL
+        """
+        params = dict(parameters)
+        params['method'] = method
+        return self.base_url(serviceurl) + '?' + self.encode_and_sign(params)
+
+    def sign_many(self, method, parameter_sets, serviceurl=None):
+        """
+        Returns a list with the full signed URL for a call to method with each
+        of the given parameter dictionaries, all signed with one timestamp.
+
+        Arguments:
+        method -- the full name of the web service method
+        parameter_sets -- an iterable of parameter dictionaries
+        serviceurl -- (optional) overrides the configured service URL
+        """
+        prefix = self.base_url(serviceurl) + '?'
+        ts = self.timestamp()
+        encode_and_sign = self.encode_and_sign
+        urls = []
+        for parameters in parameter_sets:
+            params = dict(parameters)
+            params['method'] = method
+            urls.append(prefix + encode_and_sign(params, ts))
+        return urls
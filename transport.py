@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+
+import six
+
+from .lazy import LazyModule
+
+requests = LazyModule('requests')
+email_message = LazyModule('email.message')
+http_cookiejar = LazyModule('http.cookiejar' if six.PY3 else 'cookielib')
+
+
+class HttpTransport(object):
+    """
+    Pooled keep-alive HTTP transport used by every ServiceRequest made through
+    a ScormCloudService. Connections are kept open and reused between calls,
+    so repeated calls to the same SCORM Cloud host only pay the TCP and TLS
+    handshake once per pooled connection.
+
+    A single HttpTransport may be shared between threads and between several
+    ScormCloudService objects.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 connect_timeout=10, read_timeout=120, verify=True):
+        """
+        Arguments:
+        pool_connections -- the number of distinct hosts to keep connection
+            pools for
+        pool_maxsize -- the maximum number of connections kept open per host.
+            Should be at least the number of threads making calls concurrently
+        pool_block -- if True, callers wait for a free connection once
+            pool_maxsize connections to a host are in use instead of opening
+            an extra, unpooled connection
+        connect_timeout -- seconds to wait for a connection to be established
+        read_timeout -- seconds to wait between bytes received from the server
+        verify -- whether to verify TLS certificates
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.verify = verify
+        self._session = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return ('HttpTransport(pool_connections=%s, pool_maxsize=%s, '
+                'timeout=%s)' % (self.pool_connections, self.pool_maxsize,
+                                 self.timeout))
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    @property
+    def session(self):
+        """
+        The underlying requests Session, created on first use.
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        session = requests.Session()
+        # SCORM Cloud authenticates every call by signature; never let cookies
+        # set by one caller leak into another caller's requests.
+        session.cookies.set_policy(
+            http_cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize, pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, method, url, data=None, files=None, headers=None,
+                stream=False, timeout=None, verify=None):
+        """
+        Sends an HTTP request over a pooled connection and returns the
+        requests Response. Raises requests.HTTPError for error statuses.
+
+        Arguments:
+        method -- the HTTP method, for example GET or POST
+        url -- the full URL to request
+        data -- (optional) the request body
+        files -- (optional) files to send as a multipart body
+        headers -- (optional) extra request headers
+        stream -- if True, the body is not read until the caller consumes it.
+            The caller must close the response to return the connection to
+            the pool
+        timeout -- (optional) overrides the transport timeouts for this call,
+            either a number or a (connect, read) tuple
+        verify -- (optional) overrides TLS certificate verification for this
+            call
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if verify is None:
+            verify = self.verify
+        logging.debug('%s %s', method, url)
+        response = self.session.request(method, url, data=data, files=files,
+                                        headers=headers, stream=stream,
+                                        timeout=timeout, verify=verify)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+    def close(self):
+        """
+        Closes all pooled connections. The transport may still be used
+        afterwards; new connections are opened as needed.
+        """
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport():
+    """
+    Returns the process-wide HttpTransport shared by every ScormCloudService
+    that was not given a transport of its own.
+    """
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = HttpTransport()
+    return _default_transport
+
+
+def filename_from_content_disposition(header):
+    """
+    Returns the filename parameter of a Content-Disposition header value, or
+    None if the header is missing or has no filename.
+
+    Arguments:
+    header -- the Content-Disposition header value
+    """
+    if not header:
+        return None
+    message = email_message.Message()
+    message['content-disposition'] = header
+    filename = message.get_filename()
+    if filename is None:
+        return None
+    return os.path.basename(filename)